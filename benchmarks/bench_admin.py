@@ -0,0 +1,189 @@
+"""Списки админки показаний и поливов на большой таблице (main.changelist).
+
+Запуск::
+
+    python benchmarks/bench_admin.py --readings 5000000
+
+В базу вставляется ``--readings`` показаний и ``--logs`` записей полива
+по ``--users`` x ``--zones`` зонам. Списки SensorReading и WateringLog
+открываются через тестовый клиент суперпользователем в нынешней админке
+и в прежней настройке (date_hierarchy, фильтр по времени,
+``search_fields=['zone__name']``, страницы через OFFSET), которая
+регистрируется на отдельном сайте админки. Сценарии: первая страница,
+глубокая страница (``--deep-page``; в нынешней админке - по курсору
+строки на той же глубине), месяц в ссылках по датам и поиск зоны по
+имени. Для каждого выводятся медиана времени ответа, число SQL-запросов
+и самый долгий из них. В конце проверяется, что курсорные страницы
+совпадают с выборкой по (время, id).
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import types
+from datetime import timedelta
+
+from common import create_user_with_zones, seed_readings, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readings', type=int, default=5000000)
+    parser.add_argument('--logs', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--zones', type=int, default=20, help='Зон у каждого пользователя')
+    parser.add_argument('--deep-page', type=int, default=10000, help='Номер глубокой страницы (по 100 строк; не дальше последней)')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--legacy-timeout', type=float, default=10, help='Не повторять сценарий прежней админки дольше стольких секунд')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.contrib import admin
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment
+    from django.urls import path
+    from django.utils import timezone
+
+    from main.models import GardenZone, SensorReading, WateringLog
+    from main.pagination import encode_cursor
+
+    setup_test_environment()
+    settings.ALLOWED_HOSTS = ['*']
+
+    started = time.perf_counter()
+    zone_ids = []
+    for index in range(args.users):
+        _, ids = create_user_with_zones(f'bench_admin_{index}', args.zones)
+        zone_ids += ids
+    searched_zone = zone_ids[len(zone_ids) // 2]
+    GardenZone.objects.filter(id=searched_zone).update(name='Грядка у забора')
+    seed_readings(zone_ids, args.readings)
+    now = timezone.now()
+    step = timedelta(days=365) / max(args.logs, 1)
+    WateringLog.objects.bulk_create(
+        (
+            WateringLog(zone_id=zone_ids[index % len(zone_ids)], started_at=now - step * index, duration=10, water_used=50)
+            for index in range(args.logs)
+        ),
+        batch_size=5000,
+    )
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    seed_seconds = time.perf_counter() - started
+
+    # Прежняя настройка списков - на отдельном сайте админки
+    legacy_site = admin.AdminSite(name='legacy_admin')
+
+    class LegacyReadingAdmin(admin.ModelAdmin):
+        list_display = ['zone', 'timestamp', 'soil_moisture', 'temperature', 'humidity']
+        list_filter = ['timestamp']
+        search_fields = ['zone__name']
+        date_hierarchy = 'timestamp'
+
+    class LegacyLogAdmin(admin.ModelAdmin):
+        list_display = ['zone', 'started_at', 'duration', 'water_used', 'is_manual']
+        list_filter = ['is_manual', 'started_at']
+        search_fields = ['zone__name']
+        date_hierarchy = 'started_at'
+
+    legacy_site.register(SensorReading, LegacyReadingAdmin)
+    legacy_site.register(WateringLog, LegacyLogAdmin)
+    urls = types.ModuleType('bench_admin_urls')
+    urls.urlpatterns = [path('admin/', admin.site.urls), path('legacy/', legacy_site.urls)]
+    sys.modules[urls.__name__] = urls
+
+    superuser = User.objects.create_superuser('bench_admin_root', password='bench-password')
+
+    from django.test import Client
+    client = Client()
+    client.force_login(superuser)
+
+    def deep_page(model):
+        return max(min(args.deep_page, model.objects.count() // 100), 2)
+
+    def deep_cursor(model, field):
+        # Курсор строки, на которой заканчивается страница перед глубокой
+        offset = (deep_page(model) - 1) * 100 - 1
+        row = model.objects.order_by(f'-{field}', '-id').values_list(field, 'id')[offset:offset + 1].first()
+        return encode_cursor(*row) if row else ''
+
+    def month_params(model, field):
+        moment = timezone.localtime(model.objects.order_by(f'-{field}').values_list(field, flat=True).first())
+        return f'{field}__year={moment.year}&{field}__month={moment.month}'
+
+    scenarios = {}
+    for model, field, name in ((SensorReading, 'timestamp', 'sensorreading'), (WateringLog, 'started_at', 'wateringlog')):
+        month = month_params(model, field)
+        scenarios[name] = {
+            'first_page': (f'/admin/main/{name}/', f'/legacy/main/{name}/'),
+            'deep_page': (f'/admin/main/{name}/?cursor={deep_cursor(model, field)}', f'/legacy/main/{name}/?p={deep_page(model)}'),
+            'month': (f'/admin/main/{name}/?{month}', f'/legacy/main/{name}/?{month}'),
+            'search_zone': (f'/admin/main/{name}/?q=забора', f'/legacy/main/{name}/?q=забора'),
+        }
+
+    def load(url):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - started
+        assert response.status_code == 200, (url, response.status_code)
+        slowest = max(queries.captured_queries, key=lambda query: float(query['time']))
+        return elapsed, len(queries), float(slowest['time']), slowest['sql'][:200], response
+
+    results = {}
+    failures = []
+    with override_settings(ROOT_URLCONF=urls.__name__):
+        for name, by_scenario in scenarios.items():
+            results[name] = {}
+            for scenario, (url, legacy_url) in by_scenario.items():
+                entry = {}
+                for mode, target in (('current', url), ('legacy', legacy_url)):
+                    timings = []
+                    for _ in range(args.rounds):
+                        elapsed, count, slowest, sql, response = load(target)
+                        timings.append(elapsed)
+                        if mode == 'legacy' and elapsed > args.legacy_timeout:
+                            break
+                    entry[mode] = {
+                        'median_ms': round(statistics.median(timings) * 1000, 1),
+                        'queries': count,
+                        'slowest_query_ms': round(slowest * 1000, 1),
+                        'slowest_sql': sql,
+                    }
+                entry['speedup'] = round(entry['legacy']['median_ms'] / entry['current']['median_ms'], 1)
+                results[name][scenario] = entry
+
+        # Курсорные страницы подряд совпадают с выборкой по (время, id)
+        for model, field, name in ((SensorReading, 'timestamp', 'sensorreading'), (WateringLog, 'started_at', 'wateringlog')):
+            expected = list(model.objects.order_by(f'-{field}', '-id').values_list('id', flat=True)[:300])
+            url, seen = f'/admin/main/{name}/', []
+            for _ in range(3):
+                response = client.get(url)
+                cl = response.context['cl']
+                seen += [obj.id for obj in cl.result_list]
+                url = f'/admin/main/{name}/{cl.next_page_url}'
+            if seen != expected:
+                failures.append(f'{name}: курсорные страницы не совпадают с выборкой')
+            searched = client.get(f'/admin/main/{name}/?q=забора').context['cl'].result_list
+            if not searched or any(obj.zone_id != searched_zone for obj in searched):
+                failures.append(f'{name}: поиск по имени зоны вернул чужие строки')
+
+    print(json.dumps({
+        'database': connection.vendor,
+        'readings': args.readings,
+        'logs': args.logs,
+        'zones': len(zone_ids),
+        'seed_seconds': round(seed_seconds, 1),
+        'changelists': results,
+        'failures': failures,
+    }, indent=2, ensure_ascii=False))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
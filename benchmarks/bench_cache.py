@@ -0,0 +1,76 @@
+"""Кэш пользователя (main.cache) при записи под параллельным чтением.
+
+Запуск::
+
+    python benchmarks/bench_cache.py --threads 8 --writes 300
+
+Писатель сохраняет ``--writes`` показаний одной зоны, а ``--threads``
+читателей в это время запрашивают статус зоны. Выводятся время записей,
+число ответов читателей в секунду и попадания в кэш. Сброс кэша после
+фиксации проверяет main.tests.test_cache.
+"""
+import argparse
+import json
+import threading
+import time
+
+from common import create_user_with_zones, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8, help='Потоков-читателей')
+    parser.add_argument('--writes', type=int, default=300)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.db import connections
+    from django.test import Client
+
+    from main.cache import cache_stats, reset_cache_stats
+    from main.models import SensorReading
+
+    settings.ALLOWED_HOSTS = ['*']
+    user, zone_ids = create_user_with_zones('cache_bench', 3)
+    zone_id = zone_ids[0]
+    stop = threading.Event()
+    responses = []
+    lock = threading.Lock()
+
+    def reader():
+        client = Client()
+        client.force_login(user)
+        count = 0
+        try:
+            while not stop.is_set():
+                client.get(f'/api/zone/{zone_id}/status/')
+                count += 1
+        finally:
+            connections.close_all()
+            with lock:
+                responses.append(count)
+
+    reset_cache_stats()
+    readers = [threading.Thread(target=reader) for _ in range(args.threads)]
+    for thread in readers:
+        thread.start()
+    started = time.perf_counter()
+    for value in range(1, args.writes + 1):
+        SensorReading.objects.create(zone_id=zone_id, soil_moisture=value % 101)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in readers:
+        thread.join()
+
+    print(json.dumps({
+        'writes_seconds': round(elapsed, 2),
+        'writes_per_sec': round(args.writes / elapsed),
+        'reads_per_sec': round(sum(responses) / elapsed),
+        'cache_stats': cache_stats(),
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Бенчмарк потоковой выгрузки показаний датчиков.
+
+Запуск::
+
+    python benchmarks/bench_export.py --rows 5000000
+
+Заполняет временную базу показаниями, затем выгружает их через
+``/api/export/readings/`` в форматах CSV, NDJSON и CSV+gzip и выводит
+скорость (строк/с), объём ответа и пиковый RSS процесса.
+"""
+import argparse
+import json
+import time
+
+from common import create_user_with_zones, peak_rss_mb, seed_readings, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000000)
+    parser.add_argument('--zones', type=int, default=50)
+    parser.add_argument('--db', default=None, help='Путь к временной базе SQLite')
+    args = parser.parse_args()
+
+    setup_django(args.db)
+
+    from django.conf import settings
+    from django.test import Client
+
+    # Журнал SQL-запросов в режиме DEBUG не нужен
+    settings.DEBUG = False
+
+    user, zone_ids = create_user_with_zones('bench_export', args.zones)
+    started = time.perf_counter()
+    seed_readings(zone_ids, args.rows)
+    seed_seconds = time.perf_counter() - started
+    rss_after_seed = peak_rss_mb()
+
+    client = Client()
+    client.force_login(user)
+
+    results = {
+        'rows': args.rows,
+        'seed_seconds': round(seed_seconds, 1),
+        'peak_rss_after_seed_mb': round(rss_after_seed, 1),
+        'exports': [],
+    }
+    for params in ({'format': 'csv'}, {'format': 'ndjson'}, {'format': 'csv', 'gzip': '1'}):
+        started = time.perf_counter()
+        response = client.get('/api/export/readings/', params)
+        size = 0
+        for part in response.streaming_content:
+            size += len(part)
+        elapsed = time.perf_counter() - started
+        results['exports'].append({
+            'params': params,
+            'seconds': round(elapsed, 2),
+            'rows_per_sec': round(args.rows / elapsed),
+            'bytes': size,
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+        })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
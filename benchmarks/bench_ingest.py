@@ -0,0 +1,79 @@
+"""Бенчмарк пакетной загрузки показаний датчиков.
+
+Запуск::
+
+    python benchmarks/bench_ingest.py
+    python benchmarks/bench_ingest.py --sizes 1000 10000 100000 --zones 200
+
+Измеряет скорость (строк/с) для ``ingest_readings`` и для эндпоинта
+``POST /api/readings/bulk/`` в форматах JSON и NDJSON.
+"""
+import argparse
+import json
+import random
+import time
+
+from common import create_user_with_zones, setup_django
+
+
+def make_records(zone_ids, count, seed=0):
+    rnd = random.Random(seed)
+    return [
+        {
+            'zone_id': rnd.choice(zone_ids),
+            'soil_moisture': rnd.randint(10, 90),
+            'temperature': round(rnd.uniform(5, 35), 1),
+            'humidity': rnd.randint(30, 95),
+        }
+        for _ in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--zones', type=int, default=200)
+    parser.add_argument('--db', default=None, help='Путь к временной базе SQLite')
+    args = parser.parse_args()
+
+    setup_django(args.db)
+
+    from django.test import Client
+    from main.ingest import ingest_readings
+
+    user, zone_ids = create_user_with_zones('bench_ingest', args.zones)
+    client = Client()
+    client.force_login(user)
+
+    results = []
+    for size in args.sizes:
+        records = make_records(zone_ids, size)
+
+        started = time.perf_counter()
+        ingest_readings(user.id, records)
+        direct = time.perf_counter() - started
+
+        body = json.dumps(records)
+        started = time.perf_counter()
+        response = client.post('/api/readings/bulk/', body, content_type='application/json')
+        via_json = time.perf_counter() - started
+        assert response.status_code == 201, response.content
+
+        body = '\n'.join(json.dumps(r) for r in records)
+        started = time.perf_counter()
+        response = client.post('/api/readings/bulk/', body, content_type='application/x-ndjson')
+        via_ndjson = time.perf_counter() - started
+        assert response.status_code == 201, response.content
+
+        results.append({
+            'rows': size,
+            'ingest_rows_per_sec': round(size / direct),
+            'api_json_rows_per_sec': round(size / via_json),
+            'api_ndjson_rows_per_sec': round(size / via_ndjson),
+        })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Накладные расходы метрик запросов (main.metrics).
+
+Запуск::
+
+    python benchmarks/bench_metrics.py --requests 300 --rounds 10
+
+Одни и те же запросы (``api_zone_status`` из кэша, ``watering_history``,
+сигнал присутствия контроллера) выполняются через тестовый клиент
+с ``RequestMetricsMiddleware`` и обёрткой SQL-запросов и без них;
+режимы чередуются по раундам, чтобы фоновые колебания делились
+поровну. Отдельно замеряется стоимость обёртки на один SQL-запрос
+(``SELECT 1``). Выводит медианы времени ответа в микросекундах и
+разницу.
+"""
+import argparse
+import io
+import json
+import statistics
+import time
+
+from common import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300, help='Запросов к каждому адресу за раунд')
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=20000, help='SQL-запросов для замера обёртки')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client, override_settings
+
+    from main.devices import create_device_token
+    from main.metrics import cancel_request, install_query_recorder, record_queries, start_request
+    from main.models import GardenZone
+
+    settings.ALLOWED_HOSTS = ['*']
+    call_command('seed_garden', users=1, zones=5, days=30, prefix='metrics', stdout=io.StringIO())
+    user = User.objects.get(username='metrics_0')
+    zone_id = GardenZone.objects.filter(user=user).values_list('id', flat=True).first()
+    _, token = create_device_token(user, 'Замер')
+
+    def set_recorder(enabled):
+        if enabled:
+            install_query_recorder(None, connection)
+        elif record_queries in connection.execute_wrappers:
+            connection.execute_wrappers.remove(record_queries)
+
+    without_metrics = [name for name in settings.MIDDLEWARE if name != 'main.middleware.RequestMetricsMiddleware']
+    clients = {}
+    for enabled in (True, False):
+        with override_settings(MIDDLEWARE=settings.MIDDLEWARE if enabled else without_metrics):
+            client = Client()
+            client.force_login(user)
+            # Цепочка middleware собирается при первом запросе
+            client.get('/')
+        clients[enabled] = client
+
+    requests = {
+        'api_zone_status': lambda client: client.get(f'/api/zone/{zone_id}/status/'),
+        'watering_history': lambda client: client.get('/history/'),
+        'api_device_heartbeat': lambda client: client.post(
+            '/api/device/heartbeat/', '{}', content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}',
+        ),
+    }
+    timings = {name: {True: [], False: []} for name in requests}
+    for index in range(args.rounds):
+        for enabled in ((True, False) if index % 2 == 0 else (False, True)):
+            set_recorder(enabled)
+            client = clients[enabled]
+            for name, request in requests.items():
+                for _ in range(args.requests):
+                    started = time.perf_counter()
+                    response = request(client)
+                    timings[name][enabled].append(time.perf_counter() - started)
+                    assert response.status_code in (200, 204), (name, response.status_code)
+                    assert ('Server-Timing' in response) == enabled
+
+    results = {}
+    for name, by_mode in timings.items():
+        with_metrics = statistics.median(by_mode[True]) * 1e6
+        without = statistics.median(by_mode[False]) * 1e6
+        results[name] = {
+            'with_metrics_us': round(with_metrics, 1),
+            'without_us': round(without, 1),
+            'overhead_us': round(with_metrics - without, 1),
+            'overhead_pct': round((with_metrics - without) / without * 100, 1),
+        }
+
+    def select_loop():
+        with connection.cursor() as cursor:
+            started = time.perf_counter()
+            for _ in range(args.queries):
+                cursor.execute('SELECT 1')
+            return (time.perf_counter() - started) / args.queries * 1e6
+
+    set_recorder(False)
+    bare = min(select_loop() for _ in range(3))
+    set_recorder(True)
+    idle = min(select_loop() for _ in range(3))
+    stats, context_token = start_request()
+    recorded = min(select_loop() for _ in range(3))
+    cancel_request(context_token)
+
+    print(json.dumps({
+        'requests_per_mode': args.requests * args.rounds,
+        'views': results,
+        'select_1_us': {
+            'without_wrapper': round(bare, 2),
+            'wrapper_outside_request': round(idle, 2),
+            'wrapper_in_request': round(recorded, 2),
+            'recorded_queries': stats.queries,
+        },
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
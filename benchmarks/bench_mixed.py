@@ -0,0 +1,148 @@
+"""Смешанная нагрузка чтение/запись на SQLite с разными настройками подключения.
+
+Запуск::
+
+    python benchmarks/bench_mixed.py --readers 8 --writers 4 --duration 10
+
+Для каждого профиля создаётся отдельная временная база с одинаковыми
+данными, затем в течение ``--duration`` секунд потоки-читатели
+запрашивают дашборд, статус зон и историю полива через тестовый клиент,
+а потоки-писатели загружают пакеты показаний через /api/readings/bulk/.
+
+Профили:
+
+* ``baseline`` - SQLite по умолчанию (журнал DELETE, без PRAGMA);
+* ``tuned`` - ``GARDEN_SQLITE_PRAGMAS`` из настроек (WAL и т.д.);
+* ``tuned-read`` - то же плюс подключение только для чтения.
+
+Каждый профиль выполняется в отдельном процессе.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+
+from common import create_user_with_zones, seed_readings, setup_django
+
+PROFILES = ('baseline', 'tuned', 'tuned-read')
+
+READ_URLS = ('/dashboard/', '/api/zones/status/', '/api/history/?limit=50')
+
+
+def run_profile(args):
+    setup_django(
+        pragmas={} if args.profile == 'baseline' else None,
+        read_database=args.profile == 'tuned-read',
+    )
+
+    from django.conf import settings
+    from django.db import connections
+    from django.test import Client
+
+    from main.models import WateringLog
+
+    settings.ALLOWED_HOSTS = ['*']
+
+    user, zone_ids = create_user_with_zones('bench_mixed', args.zones)
+    seed_readings(zone_ids, args.readings)
+    WateringLog.objects.bulk_create(
+        WateringLog(zone_id=zone_ids[i % len(zone_ids)], duration=10, water_used=50) for i in range(args.logs)
+    )
+    with connections['default'].cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        journal_mode = cursor.fetchone()[0]
+
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0}
+    latencies = {'reads': [], 'writes': []}
+    errors = []
+    lock = threading.Lock()
+    body = json.dumps([
+        {'zone_id': zone_ids[i % len(zone_ids)], 'soil_moisture': 40, 'temperature': 21.5, 'humidity': 60}
+        for i in range(args.batch)
+    ])
+
+    def worker(kind, index):
+        client = Client()
+        client.force_login(user)
+        i = index
+        try:
+            while not stop.is_set():
+                started = time.perf_counter()
+                if kind == 'writes':
+                    response = client.post('/api/readings/bulk/', body, content_type='application/json')
+                    ok = response.status_code == 201
+                else:
+                    response = client.get(READ_URLS[i % len(READ_URLS)])
+                    ok = response.status_code == 200
+                elapsed = time.perf_counter() - started
+                i += 1
+                with lock:
+                    if ok:
+                        counts[kind] += 1
+                        latencies[kind].append(elapsed)
+                    else:
+                        errors.append(f'{kind}: HTTP {response.status_code}')
+        except Exception as exc:
+            with lock:
+                errors.append(f'{kind}: {exc!r}')
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=('reads', i)) for i in range(args.readers)]
+    threads += [threading.Thread(target=worker, args=('writes', i)) for i in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    def p95(values):
+        values = sorted(values)
+        return round(values[int(len(values) * 0.95) - 1] * 1000, 1) if values else None
+
+    return {
+        'profile': args.profile,
+        'journal_mode': journal_mode,
+        'reads_per_sec': round(counts['reads'] / args.duration, 1),
+        'writes_per_sec': round(counts['writes'] / args.duration, 1),
+        'readings_per_sec': round(counts['writes'] * args.batch / args.duration),
+        'read_p95_ms': p95(latencies['reads']),
+        'write_p95_ms': p95(latencies['writes']),
+        'errors': len(errors),
+        'error_samples': sorted(set(errors))[:3],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profile', choices=PROFILES, help='Выполнить только один профиль (в текущем процессе)')
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES))
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--batch', type=int, default=100, help='Показаний в одном запросе записи')
+    parser.add_argument('--zones', type=int, default=20)
+    parser.add_argument('--readings', type=int, default=200000, help='Показаний в базе перед замером')
+    parser.add_argument('--logs', type=int, default=20000, help='Записей полива в базе перед замером')
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args)))
+        return
+
+    results = []
+    for profile in args.profiles:
+        command = [sys.executable, __file__, '--profile', profile] + [
+            f'--{name}={getattr(args, name)}' for name in ('readers', 'writers', 'duration', 'batch', 'zones', 'readings', 'logs')
+        ]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
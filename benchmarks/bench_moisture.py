@@ -0,0 +1,128 @@
+"""Скорость и детерминированность решения о поливе по влажности (main.moisture).
+
+Запуск::
+
+    python benchmarks/bench_moisture.py --zones 100000 --readings 12 --db-zones 2000
+
+Сначала на синтетических показаниях (без базы) проверяются граничные
+случаи ``decide_watering`` и замеряется расчёт по ``--zones`` зонам:
+средняя влажность, пороги по типам растений и длительности. Два прогона
+на одних данных должны дать одинаковый результат. Затем для
+``--db-zones`` зон во временной базе замеряется ``plan_watering`` с
+чтением пятиминутных агрегатов. Завершается с ненулевым кодом, если
+проверка не прошла.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from common import create_user_with_zones, seed_readings, setup_django
+
+PLANT_TYPES = ('', 'Газон', 'овощи', 'Цветы', 'кустарники', 'суккуленты', 'Клубника')
+
+
+def check_cases(failures):
+    from main.moisture import decide_watering, zone_moisture
+
+    # Зоны: сухая, между порогами, на пороге wet, влажная, без показаний
+    moisture = zone_moisture([0, 0, 1, 2, 3], [20, 30, 45, 60, 80], 5)
+    durations, water = decide_watering(
+        [10, 10, 10, 10, 10], moisture, 30, 60,
+        areas=[4, np.nan, 4, 4, 4], rates=(5, 0.5),
+    )
+    expected = ([10, 5, 0, 0, 10], [20, 25, 0, 0, 20])
+    for name, value, want in (('длительности', durations, expected[0]), ('расход', water, expected[1])):
+        ok = np.allclose(value, want)
+        if not ok:
+            failures.append(name)
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {value.tolist()}")
+
+
+def synthetic(zones, readings, seed):
+    rng = np.random.default_rng(seed)
+    zone_index = np.repeat(np.arange(zones), readings)
+    values = rng.integers(0, 101, size=zones * readings)
+    # Часть зон без показаний
+    keep = rng.random(zones * readings) > 0.05
+    return {
+        'zone_index': zone_index[keep],
+        'values': values[keep],
+        'durations': rng.integers(5, 31, size=zones),
+        'plant_types': [PLANT_TYPES[i] for i in rng.integers(0, len(PLANT_TYPES), size=zones)],
+        'areas': np.where(rng.random(zones) < 0.2, np.nan, rng.uniform(1, 50, size=zones).round(2)),
+    }
+
+
+def evaluate(data, zones):
+    from main.moisture import decide_watering, thresholds_for, zone_moisture
+
+    moisture = zone_moisture(data['zone_index'], data['values'], zones)
+    dry, wet = thresholds_for(data['plant_types'])
+    return decide_watering(data['durations'], moisture, dry, wet, data['areas'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--zones', type=int, default=100000)
+    parser.add_argument('--readings', type=int, default=12, help='Показаний на зону')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db-zones', type=int, default=2000, help='Зон во временной базе (0 - пропустить)')
+    args = parser.parse_args()
+
+    setup_django()
+    failures = []
+    check_cases(failures)
+
+    data = synthetic(args.zones, args.readings, args.seed)
+    timings = []
+    results = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        results.append(evaluate(data, args.zones))
+        timings.append(time.perf_counter() - started)
+    deterministic = all(
+        np.array_equal(result[0], results[0][0]) and np.array_equal(result[1], results[0][1])
+        for result in results
+    )
+    if not deterministic:
+        failures.append('детерминированность')
+    durations = results[0][0]
+    report = {
+        'zones': args.zones,
+        'readings': len(data['values']),
+        'evaluate_best_ms': round(min(timings) * 1000, 1),
+        'evaluate_max_ms': round(max(timings) * 1000, 1),
+        'deterministic': deterministic,
+        'skipped': int((durations == 0).sum()),
+        'shortened': int(((durations > 0) & (durations < data['durations'])).sum()),
+    }
+
+    if args.db_zones:
+        from main.moisture import plan_watering
+        from main.models import GardenZone
+        from main.rollups import backfill_rollups
+
+        _, zone_ids = create_user_with_zones('bench_moisture', args.db_zones)
+        seed_readings(zone_ids, args.db_zones * args.readings, step_seconds=300)
+        backfill_rollups(zone_ids)
+        zones = list(GardenZone.objects.filter(id__in=zone_ids).values_list(
+            'id', 'watering_duration', 'plant_type', 'area_size'
+        ))
+        started = time.perf_counter()
+        planned, _ = plan_watering(*(list(column) for column in zip(*zones)))
+        report['db_zones'] = len(zones)
+        report['plan_watering_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        report['db_skipped'] = int((planned == 0).sum())
+
+    report['failures'] = failures
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Скорость повторной выгрузки истории контроллера /api/device/replay/.
+
+Запуск::
+
+    python benchmarks/bench_replay.py --records 100000 --zones 50
+
+Контроллер выгружает ``--records`` записей (показания и поливы с
+исходным временем за последние ``--days`` суток и ключами) одним
+NDJSON-запросом, затем тот же пакет ещё раз и, наконец, один новый
+пакет одновременно из ``--threads`` потоков. Выводятся время и число
+записей в секунду для каждого прогона. Идемпотентность повтора
+проверяет main.tests.test_replay.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+from common import create_user_with_zones, setup_django
+
+
+def make_records(zone_ids, count, days, prefix, seed=0):
+    """Записи истории: каждая десятая - полив"""
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    rnd = random.Random(seed)
+    now = timezone.now()
+    records = []
+    for index in range(count):
+        moment = (now - timedelta(seconds=rnd.randrange(days * 86400))).isoformat()
+        if index % 10 == 9:
+            records.append({
+                'type': 'watering',
+                'key': f'{prefix}-{index}',
+                'zone_id': rnd.choice(zone_ids),
+                'started_at': moment,
+                'duration': rnd.randint(5, 30),
+                'is_manual': rnd.random() < 0.2,
+            })
+        else:
+            records.append({
+                'type': 'reading',
+                'key': f'{prefix}-{index}',
+                'zone_id': rnd.choice(zone_ids),
+                'timestamp': moment,
+                'soil_moisture': rnd.randint(10, 90),
+                'temperature': round(rnd.uniform(5, 35), 1),
+                'humidity': rnd.randint(30, 95),
+            })
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--zones', type=int, default=50)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--threads', type=int, default=4, help='Потоков при одновременной выгрузке')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.db import connections
+    from django.test import Client
+
+    from main.devices import create_device_token
+    from main.stats import rebuild_user_stats
+
+    settings.ALLOWED_HOSTS = ['*']
+    user, zone_ids = create_user_with_zones('bench_replay', args.zones)
+    rebuild_user_stats([user.id])
+    _, token = create_device_token(user, 'Замер')
+
+    def replay(records):
+        body = ''.join(json.dumps(record) + '\n' for record in records)
+        response = Client().post(
+            '/api/device/replay/', body,
+            content_type='application/x-ndjson',
+            HTTP_AUTHORIZATION=f'Bearer {token}',
+        )
+        assert response.status_code == 200, (response.status_code, response.content[:200])
+        return response.json()
+
+    def timed(records):
+        started = time.perf_counter()
+        counts = replay(records)
+        elapsed = time.perf_counter() - started
+        return {'seconds': round(elapsed, 2), 'rows_per_sec': round(len(records) / elapsed), 'counts': counts}
+
+    records = make_records(zone_ids, args.records, args.days, 'base')
+    first = timed(records)
+    second = timed(records)
+
+    # Одновременная выгрузка одного пакета
+    concurrent = make_records(zone_ids, min(args.records, 10000), args.days, 'concurrent', seed=3)
+    results = []
+
+    def worker():
+        try:
+            results.append(replay(concurrent))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        'records': args.records,
+        'first': first,
+        'second': second,
+        'concurrent': {
+            'threads': args.threads,
+            'records': len(concurrent),
+            'seconds': round(elapsed, 2),
+            'rows_per_sec': round(len(concurrent) * args.threads / elapsed),
+        },
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Время ответа /api/analytics/usage/ для большого аккаунта.
+
+Запуск::
+
+    python benchmarks/bench_usage.py --zones 200 --days 365 --per-day 3
+
+Создаётся пользователь с ``--zones`` зонами, расписаниями и историей
+полива за ``--days`` дней. Замеряется первый (без кэша) и повторный
+запрос за весь период, а также выгрузка всей истории для сравнения с
+прежним расчётом на клиенте. Суточный расход из API сверяется с
+подсчётом по всем записям на Python.
+"""
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+
+from common import create_user_with_zones, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--zones', type=int, default=200)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--per-day', type=int, default=3, help='Поливов зоны в день')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from datetime import datetime, time as dt_time, timedelta
+    from decimal import Decimal
+
+    from django.conf import settings
+    from django.db import connection, transaction
+    from django.test import Client
+    from django.utils import timezone
+
+    from main.models import WateringLog, WateringSchedule
+    from main.stats import rebuild_daily_usage
+
+    settings.ALLOWED_HOSTS = ['*']
+    user, zone_ids = create_user_with_zones('bench_usage', args.zones)
+    WateringSchedule.objects.bulk_create(
+        WateringSchedule(zone_id=zone_id, time='06:00', days_mask=0b0010101) for zone_id in zone_ids
+    )
+
+    today = timezone.localdate()
+    start = today - timedelta(days=args.days - 1)
+    table = WateringLog._meta.db_table
+    sql = f'INSERT INTO {table} (zone_id, started_at, duration, water_used, is_manual) VALUES (%s, %s, %s, %s, %s)'
+    first = timezone.make_aware(datetime.combine(start, dt_time.min))
+    started = time.perf_counter()
+    for day in range(args.days):
+        rows = [
+            (
+                zone_id,
+                connection.ops.adapt_datetimefield_value(first + timedelta(days=day, hours=6 + run * 4, minutes=index % 60)),
+                10,
+                str(Decimal(40 + (index + day + run) % 20)),
+                run == args.per_day - 1,
+            )
+            for index, zone_id in enumerate(zone_ids)
+            for run in range(args.per_day)
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+    # Записи вставлены в обход сигналов: расход по дням строится как после миграции
+    rebuild_daily_usage(zone_ids)
+    seeded = time.perf_counter() - started
+
+    client = Client()
+    client.force_login(user)
+    url = f'/api/analytics/usage/?start={start.isoformat()}&end={today.isoformat()}&forecast_days=30'
+    timings = {}
+    started = time.perf_counter()
+    report = client.get(url).json()
+    timings['cold_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    started = time.perf_counter()
+    client.get(url)
+    timings['cached_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    # Прежний способ: вся история полива и подсчёт на Python
+    started = time.perf_counter()
+    expected = defaultdict(Decimal)
+    for log in WateringLog.objects.filter(zone__user=user):
+        expected[(log.zone_id, timezone.localdate(log.started_at).isoformat())] += log.water_used
+    timings['full_history_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    mismatches = 0
+    for zone in report['zones']:
+        for day, value in zip(report['days'], zone['usage']):
+            if abs(float(expected.get((zone['zone_id'], day), 0)) - value) > 0.005:
+                mismatches += 1
+
+    print(json.dumps({
+        'logs': args.zones * args.days * args.per_day,
+        'seed_seconds': round(seeded, 1),
+        **timings,
+        'forecast_total': report['total']['forecast_total'],
+        'mismatches': mismatches,
+    }, indent=2))
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
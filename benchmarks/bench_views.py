@@ -0,0 +1,172 @@
+"""Бенчмарк основных страниц и API на синтетических данных.
+
+Запуск::
+
+    python benchmarks/bench_views.py
+    python benchmarks/bench_views.py --users 20 --days 730 --requests 500 --output before.json
+    python benchmarks/bench_views.py --baseline before.json     # сравнить с прошлым прогоном
+    python benchmarks/bench_views.py --db /tmp/seeded.sqlite3 --skip-seed
+
+Во временной базе ``manage.py seed_garden`` создаёт пользователей с
+историей, затем каждое представление (``home``, ``dashboard``,
+``watering_history``, ``api_zone_status``, ``api_toggle_schedule``)
+запрашивается ``--requests`` раз через тестовый клиент от имени
+пользователей по кругу. Для каждого выводятся p50/p95 времени ответа и
+число запросов к базе в JSON; с ``--cold`` кэш пользователя (main.cache)
+сбрасывается перед каждым запросом. ``--baseline`` добавляет изменение
+относительно сохранённого ранее результата.
+"""
+import argparse
+import io
+import json
+import random
+import statistics
+import subprocess
+import time
+
+from common import BASE_DIR, setup_django
+
+
+VIEWS = ('home', 'dashboard', 'watering_history', 'api_zone_status', 'api_toggle_schedule')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Изменение p50/p95 и числа запросов относительно ``baseline``, %"""
+    previous = baseline.get('views', {})
+    for name, current in results.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        current['change'] = {
+            metric: round((current[metric] - before[metric]) / before[metric] * 100, 1) if before[metric] else None
+            for metric in ('p50_ms', 'p95_ms', 'queries')
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--zones', type=int, default=5, help='Зон у каждого пользователя')
+    parser.add_argument('--schedules', type=int, default=2, help='Расписаний у каждой зоны')
+    parser.add_argument('--days', type=int, default=90, help='История, суток')
+    parser.add_argument('--reading-interval', type=int, default=30, help='Шаг показаний, минут')
+    parser.add_argument('--requests', type=int, default=200, help='Запросов к каждому представлению')
+    parser.add_argument('--warmup', type=int, default=10, help='Запросов до замера')
+    parser.add_argument('--cold', action='store_true', help='Сбрасывать кэш пользователя перед каждым запросом')
+    parser.add_argument('--db', default=None, help='Путь к базе SQLite (по умолчанию временная)')
+    parser.add_argument('--skip-seed', action='store_true', help='Не создавать данные: база из --db уже заполнена')
+    parser.add_argument('--prefix', default='bench')
+    parser.add_argument('--output', help='Сохранить результат в JSON-файл')
+    parser.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+    args = parser.parse_args()
+
+    setup_django(args.db)
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    from main.cache import invalidate_user
+    from main.models import GardenZone, SensorReading, WateringLog, WateringSchedule
+
+    settings.ALLOWED_HOSTS = ['*']
+    seed_seconds = None
+    if not args.skip_seed:
+        started = time.perf_counter()
+        call_command(
+            'seed_garden', users=args.users, zones=args.zones, schedules=args.schedules, days=args.days,
+            reading_interval=args.reading_interval, prefix=args.prefix, stdout=io.StringIO(),
+        )
+        seed_seconds = time.perf_counter() - started
+
+    users = list(User.objects.filter(username__startswith=f'{args.prefix}_').order_by('id'))
+    if not users:
+        parser.error(f'В базе нет пользователей {args.prefix}_*')
+    zones, schedules = {}, {}
+    for zone_id, user_id in GardenZone.objects.filter(user__in=users).values_list('id', 'user_id'):
+        zones.setdefault(user_id, []).append(zone_id)
+    for schedule_id, user_id in WateringSchedule.objects.filter(zone__user__in=users).values_list('id', 'zone__user_id'):
+        schedules.setdefault(user_id, []).append(schedule_id)
+    clients = []
+    for user in users:
+        client = Client()
+        client.force_login(user)
+        clients.append((user, client))
+
+    rnd = random.Random(0)
+
+    def request(name, user, client):
+        if name == 'api_zone_status':
+            return client.get(reverse(name, args=[rnd.choice(zones[user.id])]))
+        if name == 'api_toggle_schedule':
+            return client.post(reverse(name, args=[rnd.choice(schedules[user.id])]))
+        return client.get(reverse(name))
+
+    results = {}
+    for name in VIEWS:
+        if name == 'api_toggle_schedule' and not schedules:
+            continue
+        latencies, queries = [], []
+        for index in range(args.warmup + args.requests):
+            user, client = clients[index % len(clients)]
+            if args.cold:
+                invalidate_user(user.id)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request(name, user, client)
+                elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise SystemExit(f'{name}: HTTP {response.status_code}')
+            if index >= args.warmup:
+                latencies.append(elapsed * 1000)
+                queries.append(len(captured.captured_queries))
+        results[name] = {
+            'p50_ms': round(percentile(latencies, 0.5), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'queries': statistics.median(queries),
+            'max_queries': max(queries),
+        }
+
+    report = {
+        'revision': git_revision(),
+        'database': connection.vendor,
+        'cold_cache': args.cold,
+        'requests': args.requests,
+        'data': {
+            'users': len(users),
+            'zones': sum(len(ids) for ids in zones.values()),
+            'readings': SensorReading.objects.count(),
+            'waterings': WateringLog.objects.count(),
+            'seed_seconds': round(seed_seconds, 1) if seed_seconds is not None else None,
+        },
+        'views': results,
+    }
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            compare(results, json.load(baseline))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, ensure_ascii=False)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Удаление зоны с большой историей: каскадом и порциями (main.purge).
+
+Запуск::
+
+    python benchmarks/bench_zone_delete.py --readings 2000000
+
+У пользователя три зоны: две с одинаковой историей (``--readings``
+показаний и ``--logs`` записей полива у каждой) и третья, в которую
+во время удаления непрерывно пишет поток-писатель. Первая зона
+удаляется через ``delete_zone`` и ``purge_deleted_zones``, вторая -
+прежним ``zone.delete()`` одной транзакцией. Для каждого способа
+выводятся время, самый долгий DELETE (для каскада - вся транзакция),
+рост пикового RSS процесса и самая долгая вставка писателя - сколько
+запись в базу ждала удаления. В конце проверяется, что история удалена
+и агрегаты пользователя сходятся.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+from common import create_user_with_zones, peak_rss_mb, seed_readings, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readings', type=int, default=2000000, help='Показаний у каждой удаляемой зоны')
+    parser.add_argument('--logs', type=int, default=20000, help='Записей полива у каждой удаляемой зоны')
+    parser.add_argument('--max-lock-ms', type=int, default=None, help='Вместо GARDEN_ZONE_PURGE_MAX_LOCK_MS')
+    parser.add_argument('--pause', type=float, default=None, help='Пауза между порциями (секунды), вместо GARDEN_ZONE_PURGE_PAUSE')
+    parser.add_argument('--write-interval', type=float, default=0.01, help='Пауза писателя между вставками (секунды)')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connections
+    from django.db.models import Sum
+    from django.utils import timezone
+
+    from main.models import GardenZone, SensorReading, SystemStatus, WateringLog
+    from main.purge import delete_zone, purge_deleted_zones
+    from main.stats import check_user_stats, rebuild_user_stats
+
+    user, (purged_id, cascade_id, writer_id) = create_user_with_zones('bench_zone_delete', 3)
+    started = time.perf_counter()
+    seed_readings([purged_id, cascade_id], args.readings * 2)
+    now = timezone.now()
+    for zone_id in (purged_id, cascade_id):
+        WateringLog.objects.bulk_create(
+            (WateringLog(zone_id=zone_id, started_at=now, duration=10, water_used=50) for _ in range(args.logs)),
+            batch_size=5000,
+        )
+    rebuild_user_stats([user.id])
+    seed_seconds = time.perf_counter() - started
+
+    stop = threading.Event()
+    phase = {'latencies': []}
+
+    def writer():
+        try:
+            while not stop.is_set():
+                started = time.perf_counter()
+                SensorReading.objects.create(zone_id=writer_id, soil_moisture=50)
+                phase['latencies'].append(time.perf_counter() - started)
+                time.sleep(args.write_interval)
+        finally:
+            connections.close_all()
+
+    def measure(run):
+        phase['latencies'] = []
+        rss_before = peak_rss_mb()
+        started = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - started
+        latencies = phase['latencies']
+        return {
+            'seconds': round(elapsed, 2),
+            'peak_rss_growth_mb': round(peak_rss_mb() - rss_before, 1),
+            'writer_max_ms': round(max(latencies) * 1000, 1) if latencies else None,
+            'writer_inserts': len(latencies),
+            **result,
+        }
+
+    def batched():
+        started = time.perf_counter()
+        delete_zone(GardenZone.objects.get(id=purged_id))
+        mark_ms = (time.perf_counter() - started) * 1000
+        purged = purge_deleted_zones(max_lock_ms=args.max_lock_ms, pause=args.pause)
+        return {'mark_ms': round(mark_ms, 1), 'slowest_delete_ms': purged['slowest_delete_ms'], 'rows': purged['rows']}
+
+    def cascade():
+        started = time.perf_counter()
+        GardenZone.objects.get(id=cascade_id).delete()
+        return {'slowest_delete_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        # Сначала порциями: пиковый RSS процесса только растёт
+        results = {'batched': measure(batched), 'cascade': measure(cascade)}
+    finally:
+        stop.set()
+        thread.join()
+
+    failures = []
+    for zone_id in (purged_id, cascade_id):
+        if GardenZone.all_objects.filter(id=zone_id).exists():
+            failures.append(f'зона {zone_id} не удалена')
+        if SensorReading.objects.filter(zone_id=zone_id).exists() or WateringLog.objects.filter(zone_id=zone_id).exists():
+            failures.append(f'история зоны {zone_id} не удалена')
+    failures += [f'SystemStatus {mismatch}' for mismatch in check_user_stats([user.id])]
+    status = SystemStatus.objects.get(user=user)
+
+    print(json.dumps({
+        'database': connections['default'].vendor,
+        'readings_per_zone': args.readings,
+        'logs_per_zone': args.logs,
+        'seed_seconds': round(seed_seconds, 1),
+        **results,
+        'zones_count': status.zones_count,
+        'writer_readings': SensorReading.objects.filter(zone_id=writer_id).count(),
+        'water_left': str(WateringLog.objects.filter(zone__user=user).aggregate(total=Sum('water_used'))['total']),
+        'failures': failures,
+    }, indent=2, ensure_ascii=False))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Общие утилиты для бенчмарков.
+
+Каждый бенчмарк работает с отдельной временной базой SQLite, чтобы не
+затрагивать рабочую ``db.sqlite3``. Если задан ``POSTGRES_DB``, на том же
+сервере создаётся временная база ``test_<POSTGRES_DB>``, которая
+удаляется по завершении.
+"""
+import atexit
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(db_path=None, pragmas=None, read_database=False):
+    """Настроить Django на временную базу и применить миграции.
+
+    ``pragmas`` заменяет ``GARDEN_SQLITE_PRAGMAS``, ``read_database``
+    добавляет подключение только для чтения к той же базе.
+    """
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'garden_watering.settings')
+
+    from django.conf import settings
+
+    if settings.DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+        return _setup_postgres()
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='garden_bench_'), 'bench.sqlite3')
+    settings.DATABASES['default']['NAME'] = db_path
+    if pragmas is not None:
+        settings.GARDEN_SQLITE_PRAGMAS = pragmas
+    settings.DATABASES.pop('read', None)
+    if read_database:
+        settings.DATABASES['read'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': f'file:{db_path}?mode=ro',
+            'TEST': {'MIRROR': 'default'},
+        }
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def _setup_postgres():
+    import django
+    django.setup()
+
+    from django.db import connection
+    name = connection.settings_dict['NAME']
+    # Создаёт test_<имя> и применяет миграции
+    test_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    def destroy():
+        from django.db import connections
+        connections.close_all()
+        # Подключения других потоков (пул database_sync_to_async, потоки
+        # запросов ASGI) текущий поток закрыть не может
+        with connection._nodb_cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE datname = %s AND pid <> pg_backend_pid()',
+                [test_name],
+            )
+        connection.creation.destroy_test_db(name, verbosity=0)
+
+    atexit.register(destroy)
+    return test_name
+
+
+def create_user_with_zones(username, zones_count):
+    """Создать пользователя с заданным числом зон"""
+    from django.contrib.auth.models import User
+    from main.models import GardenZone
+
+    user = User.objects.create_user(username=username, password='bench-password')
+    GardenZone.objects.bulk_create(
+        GardenZone(user=user, name=f'Зона {i}') for i in range(zones_count)
+    )
+    zone_ids = list(GardenZone.objects.filter(user=user).values_list('id', flat=True))
+    return user, zone_ids
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса в мегабайтах"""
+    import resource
+    # ru_maxrss в килобайтах на Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed_readings(zone_ids, count, start=None, step_seconds=60, chunk=50000):
+    """Быстро вставить ``count`` показаний напрямую через executemany.
+
+    Используется для подготовки больших объёмов, где даже bulk_create
+    заметно медленнее. Показания распределяются по зонам по кругу с
+    шагом ``step_seconds``.
+    """
+    import random
+    from datetime import timedelta
+
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    from main.models import SensorReading
+
+    table = SensorReading._meta.db_table
+    if start is None:
+        start = timezone.now() - timedelta(seconds=step_seconds * count // max(len(zone_ids), 1))
+    rnd = random.Random(0)
+    sql = (
+        f'INSERT INTO {table} (zone_id, timestamp, soil_moisture, temperature, humidity) '
+        f'VALUES (%s, %s, %s, %s, %s)'
+    )
+    zones = len(zone_ids)
+    inserted = 0
+    while inserted < count:
+        size = min(chunk, count - inserted)
+        rows = []
+        for i in range(inserted, inserted + size):
+            moment = start + timedelta(seconds=step_seconds * (i // zones))
+            rows.append((
+                zone_ids[i % zones],
+                connection.ops.adapt_datetimefield_value(moment),
+                rnd.randint(10, 90),
+                str(round(rnd.uniform(5, 35), 1)),
+                rnd.randint(30, 95),
+            ))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+        inserted += size
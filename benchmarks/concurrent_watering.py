@@ -0,0 +1,78 @@
+"""Пропускная способность записи поливов при параллельных запусках.
+
+Запуск::
+
+    python benchmarks/concurrent_watering.py --threads 32 --iterations 50
+
+Потоки одновременно запускают поливы одного пользователя (одиночные
+через ``start_zone_watering`` и пакетные через ``create_watering_logs``);
+выводится время и число поливов в секунду. Сохранность счётчиков при
+гонке проверяет main.tests.test_watering.
+"""
+import argparse
+import json
+import threading
+import time
+
+from common import create_user_with_zones, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--batch', type=int, default=20, help='Размер пакета для пакетных потоков')
+    parser.add_argument('--db', default=None, help='Путь к временной базе SQLite')
+    args = parser.parse_args()
+
+    setup_django(args.db)
+
+    from django.db import connection
+    from main.models import GardenZone, WateringLog
+    from main.stats import get_user_stats, rebuild_user_stats
+    from main.watering import create_watering_logs, start_zone_watering, water_used_for
+
+    user, zone_ids = create_user_with_zones('bench_concurrency', 10)
+    rebuild_user_stats([user.id])
+    zones = list(GardenZone.objects.filter(id__in=zone_ids))
+    errors = []
+    barrier = threading.Barrier(args.threads)
+
+    def worker(index):
+        try:
+            barrier.wait()
+            for i in range(args.iterations):
+                zone = zones[(index + i) % len(zones)]
+                if index % 4 == 0:
+                    logs = [
+                        WateringLog(zone_id=zone.id, duration=3, is_manual=False, water_used=water_used_for(3))
+                        for _ in range(args.batch)
+                    ]
+                    create_watering_logs({user.id: logs})
+                else:
+                    start_zone_watering(zone, 1 + i % 7)
+        except Exception as exc:
+            errors.append(repr(exc))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    status = get_user_stats(user)
+    print(json.dumps({
+        'threads': args.threads,
+        'seconds': round(elapsed, 2),
+        'waterings_per_sec': round(status.waterings_count / elapsed),
+        'errors': errors[:5],
+        'waterings_count': status.waterings_count,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
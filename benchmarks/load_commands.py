@@ -0,0 +1,263 @@
+"""Нагрузочный тест долгого опроса команд /api/device/commands/.
+
+Запуск::
+
+    python benchmarks/load_commands.py --devices 2000 --commands 500
+
+Во временной базе создаются ``--devices`` пользователей с токеном
+контроллера у каждого, в том же процессе в отдельном потоке запускается
+uvicorn (ASGI), контроллеры работают в отдельном процессе. Все
+контроллеры открывают долгий опрос; пока они ждут,
+считаются запросы к базе. Затем ``--single`` раз по одной ставится
+команда остановки зоны (как при нажатии кнопки) и измеряется время от
+постановки до получения ответа контроллером, после чего ``--commands``
+контроллерам команды ставятся одной пачкой (как при срабатывании
+расписаний). Полученные команды подтверждаются.
+Проверяется также, что цепочка middleware под ASGI не переводится в
+синхронный режим.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+import random
+import threading
+import time
+from collections import Counter
+
+from common import setup_django
+
+
+class AdaptedMiddleware(logging.Handler):
+    """Считает сообщения Django о переводе middleware между sync и async"""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.messages = []
+
+    def emit(self, record):
+        message = record.getMessage()
+        if 'adapted' in message:
+            self.messages.append(message)
+
+
+async def request(port, method, path, token, body=None):
+    """HTTP/1.0-запрос (без keep-alive и chunked): (код ответа, тело)"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = json.dumps(body).encode() if body is not None else b''
+    writer.write(
+        f'{method} {path} HTTP/1.0\r\nHost: localhost\r\nAuthorization: Bearer {token}\r\n'
+        f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n'.encode() + data
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b'\r\n\r\n')
+    return int(head.split(None, 2)[1]), payload
+
+
+async def device(port, index, token, wait, receipts):
+    """Контроллер: долгий опрос до получения команды, затем подтверждение"""
+    while True:
+        try:
+            status, payload = await request(port, 'GET', f'/api/device/commands/?wait={wait}', token)
+        except OSError:
+            receipts.put(('error', index, 'connect'))
+            await asyncio.sleep(0.5)
+            continue
+        if status != 200:
+            receipts.put(('error', index, status))
+            return
+        commands = json.loads(payload)['commands']
+        if commands:
+            receipts.put(('received', index, time.monotonic()))
+            for command in commands:
+                status, _ = await request(port, 'POST', f"/api/device/commands/{command['id']}/ack/", token, {'status': 'done'})
+                if status != 200:
+                    receipts.put(('error', index, f'ack_{status}'))
+            return
+
+
+def run_devices(port, tokens, wait, receipts, stop):
+    """Процесс контроллеров: все опрашивают одновременно до сигнала ``stop``"""
+    async def run():
+        tasks = [asyncio.create_task(device(port, index, token, wait, receipts)) for index, token in enumerate(tokens)]
+        while not stop.is_set():
+            await asyncio.sleep(0.1)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=2000)
+    parser.add_argument('--single', type=int, default=20, help='Сколько команд отправить по одной')
+    parser.add_argument('--commands', type=int, default=500, help='Скольким контроллерам отправить команды пачкой')
+    parser.add_argument('--idle', type=float, default=12, help='Сколько секунд контроллеры ждут без команд')
+    parser.add_argument('--wait', type=float, default=30, help='Параметр wait долгого опроса')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    setup_django()
+
+    import secrets
+
+    import uvicorn
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+
+    from main.device_commands import enqueue_command, enqueue_commands
+    from main.devices import hash_token_secret
+    from main.events import get_backend
+    from main.models import DeviceCommand, DeviceToken, GardenZone
+
+    settings.ALLOWED_HOSTS = ['*']
+    adapted = AdaptedMiddleware()
+    logging.getLogger('django.request').addHandler(adapted)
+    logging.getLogger('django.request').setLevel(logging.DEBUG)
+
+    users = User.objects.bulk_create(User(username=f'controller_{i}') for i in range(args.devices))
+    zones = GardenZone.objects.bulk_create(GardenZone(user=user, name='Зона') for user in users)
+    tokens = []
+    device_tokens = []
+    for user in users:
+        prefix, secret = secrets.token_hex(6), secrets.token_urlsafe(32)
+        tokens.append(f'{prefix}.{secret}')
+        device_tokens.append(DeviceToken(user=user, name='Нагрузка', prefix=prefix, token_hash=hash_token_secret(secret)))
+    DeviceToken.objects.bulk_create(device_tokens)
+    connection.close()
+
+    queries = Counter()
+    lock = threading.Lock()
+
+    def count_query(execute, sql, params, many, context):
+        with lock:
+            queries[sql.lstrip().split(None, 1)[0].lower()] += 1
+        return execute(sql, params, many, context)
+
+    def add_counter(sender, connection, **kwargs):
+        # Сигнал приходит при каждом переподключении того же объекта
+        if count_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(count_query)
+
+    connection_created.connect(add_counter)
+
+    from garden_watering.asgi import application
+
+    server = uvicorn.Server(uvicorn.Config(
+        application, port=args.port, log_level='warning', lifespan='off', backlog=args.devices,
+    ))
+    server_thread = threading.Thread(target=server.run, daemon=True)
+    server_thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    backend = get_backend()
+    sent_at = {}
+    received = {}
+    errors = Counter()
+
+    def enqueue_one(index):
+        sent_at[index] = time.monotonic()
+        enqueue_command(users[index].id, DeviceCommand.KIND_STOP_ZONE, zones[index].id)
+
+    def enqueue_batch(targets):
+        started = time.monotonic()
+        for index in targets:
+            sent_at[index] = started
+        enqueue_commands({users[index].id: [(DeviceCommand.KIND_STOP_ZONE, zones[index].id, {})] for index in targets})
+
+    def collect(indexes, timeout):
+        """Дождаться получения команд контроллерами ``indexes``"""
+        waiting_for = set(indexes) - set(received)
+        deadline = time.monotonic() + timeout
+        while waiting_for and time.monotonic() < deadline:
+            try:
+                kind, index, value = receipts.get(timeout=max(deadline - time.monotonic(), 0.01))
+            except queue.Empty:
+                break
+            if kind == 'received':
+                received[index] = value
+                waiting_for.discard(index)
+            else:
+                errors[value] += 1
+
+    # Контроллеры - в отдельном процессе, чтобы не делить с сервером GIL
+    context = multiprocessing.get_context('spawn')
+    receipts = context.Queue()
+    stop = context.Event()
+    client = context.Process(target=run_devices, args=(args.port, tokens, args.wait, receipts, stop))
+    client.start()
+
+    started = time.monotonic()
+    while backend.subscribers_count() < args.devices and time.monotonic() - started < 120:
+        time.sleep(0.1)
+    waiting = backend.subscribers_count()
+    # Подписка - до первой выборки: дожидаемся, пока закончатся первые выборки
+    settled = -1
+    while settled != sum(queries.values()):
+        settled = sum(queries.values())
+        time.sleep(1)
+    connected = time.monotonic() - started
+
+    queries.clear()
+    time.sleep(args.idle)
+    idle_queries = dict(queries)
+    idle_threads = threading.active_count()
+
+    chosen = random.Random(0).sample(range(args.devices), min(args.single + args.commands, args.devices))
+    single, batch = chosen[:args.single], chosen[args.single:]
+    for index in single:
+        enqueue_one(index)
+        collect([index], args.wait)
+    queries.clear()
+    enqueue_batch(batch)
+    collect(batch, args.wait)
+    batch_queries = dict(queries)
+    # Подтверждения последних команд
+    time.sleep(1)
+    connection.close()
+
+    stop.set()
+    client.join(timeout=10)
+    if client.is_alive():
+        client.terminate()
+    server.should_exit = True
+    server_thread.join(timeout=args.wait + 5)
+
+    def percentiles(indexes):
+        latencies = sorted(received[index] - sent_at[index] for index in indexes if index in received)
+        if not latencies:
+            return {'delivered': 0}
+        return {
+            'delivered': len(latencies),
+            'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+            'p95_ms': round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000, 1),
+            'max_ms': round(latencies[-1] * 1000, 1),
+        }
+
+    acked = DeviceCommand.objects.filter(status=DeviceCommand.STATUS_DONE).count()
+    print(json.dumps({
+        'devices': args.devices,
+        'waiting': waiting,
+        'connect_seconds': round(connected, 1),
+        'idle_seconds': args.idle,
+        'idle_queries': idle_queries,
+        'idle_threads': idle_threads,
+        'single': {'commands': len(single), **percentiles(single)},
+        'batch': {'commands': len(batch), **percentiles(batch), 'queries': batch_queries},
+        'acked': acked,
+        'errors': dict(errors),
+        'adapted_middleware': adapted.messages,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
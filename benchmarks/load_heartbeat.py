@@ -0,0 +1,132 @@
+"""Нагрузочный тест сигналов присутствия контроллеров /api/device/heartbeat/.
+
+Запуск::
+
+    python benchmarks/load_heartbeat.py --devices 2000 --interval 10 --duration 30
+    python benchmarks/load_heartbeat.py --devices 2000 --flush-interval 0   # без объединения
+
+Во временной базе создаются ``--devices`` пользователей с токеном
+контроллера у каждого. Потоки отправляют сигналы через тестовый клиент
+(полный стек middleware), каждый контроллер - раз в ``--interval``
+секунд со сдвигом по фазе. Считаются запросы к базе по видам: UPDATE
+SystemStatus (записи), поиск токена, обращения к сессиям (должно быть 0).
+"""
+import argparse
+import heapq
+import json
+import threading
+import time
+from collections import Counter
+
+from common import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=2000)
+    parser.add_argument('--interval', type=float, default=10, help='Период сигналов одного контроллера, секунд')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--flush-interval', type=float, help='Заменяет GARDEN_HEARTBEAT_FLUSH_INTERVAL (0 - писать каждый сигнал)')
+    args = parser.parse_args()
+
+    setup_django()
+
+    import secrets
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.db import connection, connections
+    from django.test import Client
+
+    from main.devices import hash_token_secret, heartbeats
+    from main.models import DeviceToken, SystemStatus
+
+    settings.ALLOWED_HOSTS = ['*']
+    if args.flush_interval is not None:
+        settings.GARDEN_HEARTBEAT_FLUSH_INTERVAL = args.flush_interval
+
+    users = User.objects.bulk_create(User(username=f'device_{i}') for i in range(args.devices))
+    SystemStatus.objects.bulk_create(SystemStatus(user=user) for user in users)
+    tokens = []
+    device_tokens = []
+    for user in users:
+        prefix, secret = secrets.token_hex(6), secrets.token_urlsafe(32)
+        tokens.append(f'{prefix}.{secret}')
+        device_tokens.append(DeviceToken(user=user, name='Нагрузка', prefix=prefix, token_hash=hash_token_secret(secret)))
+    DeviceToken.objects.bulk_create(device_tokens)
+    connection.close()
+
+    queries = Counter()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    started = time.monotonic()
+    deadline = started + args.duration
+
+    def count_query(execute, sql, params, many, context):
+        head = sql.lstrip().split(None, 1)[0].upper()
+        if 'django_session' in sql:
+            kind = 'session'
+        elif 'main_devicetoken' in sql:
+            kind = 'token_lookup'
+        elif 'main_systemstatus' in sql:
+            kind = f'systemstatus_{head.lower()}'
+        else:
+            kind = head.lower()
+        with lock:
+            queries[kind] += 1
+        return execute(sql, params, many, context)
+
+    def worker(index):
+        client = Client()
+        # Контроллеры потока в порядке ближайшего сигнала; фаза - сдвиг внутри периода
+        schedule = [(started + args.interval * device / args.devices, device) for device in range(index, args.devices, args.threads)]
+        heapq.heapify(schedule)
+        with connections['default'].execute_wrapper(count_query):
+            try:
+                while schedule and schedule[0][0] < deadline:
+                    due, device = heapq.heappop(schedule)
+                    time.sleep(max(0, due - time.monotonic()))
+                    sent = time.perf_counter()
+                    response = client.post(
+                        '/api/device/heartbeat/',
+                        json.dumps({'water_pressure': 2.5}),
+                        content_type='application/json',
+                        HTTP_AUTHORIZATION=f'Bearer {tokens[device]}',
+                    )
+                    elapsed = time.perf_counter() - sent
+                    with lock:
+                        if response.status_code == 204:
+                            latencies.append(elapsed)
+                        else:
+                            errors.append(response.status_code)
+                    heapq.heappush(schedule, (due + args.interval, device))
+            finally:
+                connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    heartbeats.flush()
+
+    latencies.sort()
+    online = SystemStatus.objects.filter(is_online=True, last_connection__isnull=False).count()
+    print(json.dumps({
+        'devices': args.devices,
+        'flush_interval': settings.GARDEN_HEARTBEAT_FLUSH_INTERVAL,
+        'heartbeats': len(latencies),
+        'heartbeats_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2) if latencies else None,
+        'errors': len(errors),
+        'queries': dict(queries),
+        'online': online,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
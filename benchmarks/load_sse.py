@@ -0,0 +1,173 @@
+"""Нагрузочный тест потока событий /api/events/.
+
+Открывает N одновременных SSE-подключений к запущенному серверу,
+держит их заданное время и, если указана зона, публикует показание
+через /api/readings/bulk/ и измеряет время доставки во все потоки.
+
+Сервер должен работать под ASGI, например::
+
+    uvicorn garden_watering.asgi:application --port 8000
+    python benchmarks/load_sse.py --username demo --password secret \\
+        --connections 2000 --zone-id 1
+
+Для тысяч подключений может понадобиться ``ulimit -n``.
+"""
+import argparse
+import asyncio
+import http.cookiejar
+import json
+import statistics
+import time
+import urllib.parse
+import urllib.request
+
+
+def login(base_url, username, password):
+    """Войти через форму и вернуть (sessionid, csrftoken)"""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    opener.open(f'{base_url}/login/').read()
+    csrftoken = next(c.value for c in jar if c.name == 'csrftoken')
+    data = urllib.parse.urlencode({
+        'username': username,
+        'password': password,
+        'csrfmiddlewaretoken': csrftoken,
+    }).encode()
+    request = urllib.request.Request(f'{base_url}/login/', data=data, headers={'Referer': f'{base_url}/login/'})
+    opener.open(request).read()
+    cookies = {c.name: c.value for c in jar}
+    if 'sessionid' not in cookies:
+        raise SystemExit('Не удалось войти: проверьте логин и пароль')
+    return cookies['sessionid'], cookies['csrftoken']
+
+
+def publish_reading(base_url, sessionid, csrftoken, zone_id):
+    """Отправить одно показание через API пакетной загрузки"""
+    body = json.dumps([{'zone_id': zone_id, 'soil_moisture': 50}]).encode()
+    request = urllib.request.Request(
+        f'{base_url}/api/readings/bulk/',
+        data=body,
+        headers={
+            'Content-Type': 'application/json',
+            'Cookie': f'sessionid={sessionid}; csrftoken={csrftoken}',
+            'X-CSRFToken': csrftoken,
+            'Referer': f'{base_url}/',
+        },
+    )
+    urllib.request.urlopen(request).read()
+
+
+class Stream:
+    """Одно SSE-подключение"""
+
+    def __init__(self):
+        self.connected = False
+        self.error = None
+        self.events = 0
+        self.reading_received = asyncio.Event()
+        self.reading_at = None
+
+    async def run(self, host, port, sessionid, stop):
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError as exc:
+            self.error = str(exc)
+            return
+        writer.write(
+            f'GET /api/events/ HTTP/1.1\r\nHost: {host}:{port}\r\n'
+            f'Cookie: sessionid={sessionid}\r\nAccept: text/event-stream\r\n\r\n'.encode()
+        )
+        await writer.drain()
+        try:
+            status = await reader.readline()
+            if b' 200 ' not in status:
+                self.error = status.decode(errors='replace').strip()
+                return
+            self.connected = True
+            while not stop.is_set():
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.startswith(b'event: reading'):
+                    self.events += 1
+                    if not self.reading_received.is_set():
+                        self.reading_at = time.perf_counter()
+                        self.reading_received.set()
+        except (OSError, asyncio.CancelledError) as exc:
+            if not isinstance(exc, asyncio.CancelledError):
+                self.error = str(exc)
+        finally:
+            writer.close()
+
+
+async def run_load(args, sessionid, csrftoken):
+    url = urllib.parse.urlparse(args.url)
+    stop = asyncio.Event()
+    streams = [Stream() for _ in range(args.connections)]
+    tasks = []
+    started = time.perf_counter()
+    for stream in streams:
+        tasks.append(asyncio.create_task(stream.run(url.hostname, url.port or 80, sessionid, stop)))
+        # Не открываем все подключения одним залпом
+        await asyncio.sleep(0)
+
+    deadline = time.perf_counter() + args.connect_timeout
+    while time.perf_counter() < deadline:
+        if all(s.connected or s.error for s in streams):
+            break
+        await asyncio.sleep(0.1)
+    connect_time = time.perf_counter() - started
+
+    latencies = []
+    if args.zone_id:
+        published = time.perf_counter()
+        await asyncio.to_thread(publish_reading, args.url, sessionid, csrftoken, args.zone_id)
+        connected = [s for s in streams if s.connected]
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(s.reading_received.wait() for s in connected)),
+                args.duration,
+            )
+        except asyncio.TimeoutError:
+            pass
+        latencies = sorted(s.reading_at - published for s in connected if s.reading_at)
+
+    await asyncio.sleep(args.duration if not args.zone_id else 0)
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    result = {
+        'connections': args.connections,
+        'connected': sum(s.connected for s in streams),
+        'errors': sum(1 for s in streams if s.error),
+        'connect_seconds': round(connect_time, 3),
+    }
+    if args.zone_id:
+        result['delivered'] = len(latencies)
+        if latencies:
+            result['delivery_p50_ms'] = round(statistics.median(latencies) * 1000, 1)
+            result['delivery_p95_ms'] = round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1)
+            result['delivery_max_ms'] = round(latencies[-1] * 1000, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=10, help='Сколько секунд держать подключения')
+    parser.add_argument('--connect-timeout', type=float, default=30)
+    parser.add_argument('--zone-id', type=int, help='Зона для публикации тестового показания')
+    args = parser.parse_args()
+
+    sessionid, csrftoken = login(args.url, args.username, args.password)
+    result = asyncio.run(run_load(args, sessionid, csrftoken))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
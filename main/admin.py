@@ -1,5 +1,25 @@
 from django.contrib import admin
-from .models import UserProfile, GardenZone, WateringSchedule, WateringLog, SensorReading, SystemStatus
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+from .changelist import LargeTableAdmin
+from .purge import delete_zone
+from .stats import rebuild_user_stats
+from .models import UserProfile, GardenZone, WateringSchedule, WateringLog, SensorReading, SensorRollup, DailyWaterUsage, SystemStatus, DeviceToken, DeviceCommand, RequestProfile, WEEKDAY_NAMES
+
+
+class WeekdayListFilter(admin.SimpleListFilter):
+    """Фильтр расписаний по дню недели (побитовая проверка маски)"""
+    title = 'День недели'
+    parameter_name = 'weekday'
+    
+    def lookups(self, request, model_admin):
+        return [(str(day), name) for day, name in WEEKDAY_NAMES.items()]
+    
+    def queryset(self, request, queryset):
+        if self.value() in {str(day) for day in WEEKDAY_NAMES}:
+            return queryset.runs_on(int(self.value()))
+        return queryset
 
 
 @admin.register(UserProfile)
@@ -14,33 +34,184 @@ class GardenZoneAdmin(admin.ModelAdmin):
     list_display = ['name', 'user', 'plant_type', 'area_size', 'watering_duration', 'created_at']
     search_fields = ['name', 'user__username', 'plant_type']
     list_filter = ['created_at', 'plant_type']
+    
+    # История зоны удаляется в фоне порциями (main.purge), а не каскадом
+    def delete_model(self, request, obj):
+        delete_zone(obj)
+    
+    def delete_queryset(self, request, queryset):
+        for zone in queryset:
+            delete_zone(zone)
+    
+    def get_deleted_objects(self, objs, request):
+        # Страница подтверждения не перечисляет историю зон: её может быть миллионы строк
+        perms_needed = set() if self.has_delete_permission(request) else {self.opts.verbose_name}
+        return [str(zone) for zone in objs], {self.opts.verbose_name_plural: len(objs)}, perms_needed, []
 
 
 @admin.register(WateringSchedule)
 class WateringScheduleAdmin(admin.ModelAdmin):
-    list_display = ['zone', 'time', 'days_of_week', 'is_active']
-    list_filter = ['is_active', 'days_of_week']
+    list_display = ['zone', 'time', 'get_days_display', 'is_active']
+    list_filter = ['is_active', WeekdayListFilter]
     search_fields = ['zone__name']
 
 
 @admin.register(WateringLog)
-class WateringLogAdmin(admin.ModelAdmin):
+class WateringLogAdmin(LargeTableAdmin):
     list_display = ['zone', 'started_at', 'duration', 'water_used', 'is_manual']
-    list_filter = ['is_manual', 'started_at']
-    search_fields = ['zone__name']
+    list_filter = ['is_manual']
     date_hierarchy = 'started_at'
+    keyset_field = 'started_at'
+    
+    # Удаление записей полива не отправляет сигналов в main.stats,
+    # поэтому агрегаты затронутых пользователей пересчитываются здесь
+    def delete_model(self, request, obj):
+        user_id = obj.zone.user_id
+        super().delete_model(request, obj)
+        rebuild_user_stats([user_id])
+    
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('zone__user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        rebuild_user_stats(user_ids)
 
 
 @admin.register(SensorReading)
-class SensorReadingAdmin(admin.ModelAdmin):
+class SensorReadingAdmin(LargeTableAdmin):
     list_display = ['zone', 'timestamp', 'soil_moisture', 'temperature', 'humidity']
-    list_filter = ['timestamp']
-    search_fields = ['zone__name']
     date_hierarchy = 'timestamp'
+    keyset_field = 'timestamp'
+
+
+@admin.register(SensorRollup)
+class SensorRollupAdmin(admin.ModelAdmin):
+    list_display = ['zone', 'resolution', 'bucket_start', 'readings_count']
+    list_filter = ['resolution']
+    search_fields = ['zone__name']
+    list_select_related = ['zone__user']
+
+
+@admin.register(DailyWaterUsage)
+class DailyWaterUsageAdmin(admin.ModelAdmin):
+    list_display = ['zone', 'day', 'waterings_count', 'water_used', 'manual_count', 'manual_water_used']
+    date_hierarchy = 'day'
+    search_fields = ['zone__name']
+    list_select_related = ['zone__user']
 
 
 @admin.register(SystemStatus)
 class SystemStatusAdmin(admin.ModelAdmin):
-    list_display = ['user', 'is_online', 'last_connection', 'water_pressure', 'total_water_used']
+    list_display = ['user', 'is_online', 'last_connection', 'water_pressure', 'total_water_used', 'waterings_count']
     list_filter = ['is_online']
     search_fields = ['user__username']
+
+
+@admin.register(DeviceToken)
+class DeviceTokenAdmin(admin.ModelAdmin):
+    """Токены создаются командой create_device_token: здесь их можно только отозвать"""
+    list_display = ['name', 'user', 'prefix', 'is_active', 'created_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'prefix', 'user__username']
+    fields = ['user', 'name', 'prefix', 'is_active', 'created_at']
+    readonly_fields = ['user', 'prefix', 'created_at']
+    actions = ['revoke']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    @admin.action(description='Отозвать выбранные токены')
+    def revoke(self, request, queryset):
+        queryset.update(is_active=False)
+
+
+@admin.register(DeviceCommand)
+class DeviceCommandAdmin(admin.ModelAdmin):
+    """Команды ставятся в очередь приложением: здесь только просмотр"""
+    list_display = ['id', 'device', 'kind', 'zone_id', 'status', 'attempts', 'created_at', 'completed_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['device__name', 'device__prefix']
+    list_select_related = ['device__user']
+    readonly_fields = [field.name for field in DeviceCommand._meta.fields]
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Профили снимаются запросами с ?_profile=1 (main.profiling): здесь просмотр и скачивание"""
+    list_display = ['created_at', 'method', 'path', 'view_name', 'user', 'status_code', 'duration_ms', 'queries_count', 'sql_time_ms', 'downloads']
+    list_filter = ['view_name']
+    search_fields = ['path', 'view_name', 'user__username']
+    list_select_related = ['user']
+    fields = [
+        'created_at', 'user', 'method', 'path', 'view_name', 'status_code',
+        'duration_ms', 'sql_time_ms', 'queries_count', 'downloads', 'summary_display', 'queries_display',
+    ]
+    readonly_fields = fields
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def get_queryset(self, request):
+        # Профиль и SQL бывают большими, в списке они не нужны
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if match is not None and match.url_name == 'main_requestprofile_changelist':
+            queryset = queryset.defer('profile', 'queries', 'summary')
+        return queryset
+    
+    def get_urls(self):
+        return [
+            path('<int:object_id>/profile/', self.admin_site.admin_view(self.download_profile), name='main_requestprofile_profile'),
+            path('<int:object_id>/sql/', self.admin_site.admin_view(self.download_queries), name='main_requestprofile_sql'),
+        ] + super().get_urls()
+    
+    def _get_profile(self, request, object_id):
+        profile = self.get_object(request, object_id)
+        if profile is None or not self.has_view_permission(request, profile):
+            raise Http404
+        return profile
+    
+    def download_profile(self, request, object_id):
+        profile = self._get_profile(request, object_id)
+        response = HttpResponse(bytes(profile.profile), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.prof"'
+        return response
+    
+    def download_queries(self, request, object_id):
+        profile = self._get_profile(request, object_id)
+        response = JsonResponse(profile.queries, safe=False, json_dumps_params={'ensure_ascii': False, 'indent': 2})
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}-sql.json"'
+        return response
+    
+    @admin.display(description='Скачать')
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">.prof</a> | <a href="{}">SQL</a>',
+            reverse('admin:main_requestprofile_profile', args=[obj.pk]),
+            reverse('admin:main_requestprofile_sql', args=[obj.pk]),
+        )
+    
+    @admin.display(description='Самые долгие функции')
+    def summary_display(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto">{}</pre>', obj.summary)
+    
+    @admin.display(description='SQL-запросы')
+    def queries_display(self, obj):
+        return format_html_join(
+            '',
+            '<p><b>{} мс</b></p><pre style="white-space: pre-wrap">{}\n{}</pre>{}',
+            (
+                (
+                    query['duration_ms'],
+                    query['sql'],
+                    query['params'] if query['params'] is not None else '',
+                    format_html('<pre style="white-space: pre-wrap; color: #666">{}</pre>', query['explain']) if 'explain' in query else '',
+                )
+                for query in obj.queries
+            ),
+        )
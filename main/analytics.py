@@ -0,0 +1,153 @@
+"""Аналитика расхода воды: суточный расход за период и прогноз.
+
+Расход читается из суточных агрегатов ``DailyWaterUsage`` (main.stats),
+а не из истории полива: на зону приходится одна строка в сутки. Дальше
+всё считается матрицами NumPy «зоны × дни».
+
+Прогноз на каждый день - число запусков активных расписаний зоны в этот
+день недели, умноженное на средний расход одного полива по расписанию
+за последние ``USAGE_FORECAST_HISTORY_DAYS`` дней (без истории - расход
+по ``watering_duration`` и площади зоны), плюс средний суточный расход
+ручных поливов за то же время.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import CharField, FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import DailyWaterUsage, GardenZone, WateringSchedule
+from .watering import flow_rates
+
+
+# Период по умолчанию и наибольший период, дней
+USAGE_DEFAULT_DAYS = 30
+USAGE_MAX_DAYS = 366
+
+# Горизонт прогноза по умолчанию и наибольший, дней
+USAGE_FORECAST_DEFAULT_DAYS = 7
+USAGE_FORECAST_MAX_DAYS = 90
+
+# За сколько последних дней берётся история для прогноза
+USAGE_FORECAST_HISTORY_DAYS = 28
+
+
+def _zone_positions(zone_ids, ids):
+    return np.searchsorted(zone_ids, np.asarray(ids, dtype=np.int64))
+
+
+def _usage_rows(zone_ids, start, end, fields):
+    """Строки расхода по дням: (зона, номер дня от ``start``, значения ``fields``...)"""
+    # Дата и расход читаются строкой и числом: конвертеры Django в date и
+    # Decimal для десятков тысяч строк заметно дороже самого запроса
+    rows = list(
+        DailyWaterUsage.objects.filter(zone_id__in=zone_ids.tolist(), day__gte=start, day__lte=end)
+        .annotate(day_text=Cast('day', CharField()), **{
+            f'{field}_value': Cast(field, FloatField()) for field in fields
+        })
+        .values_list('zone_id', 'day_text', *(f'{field}_value' for field in fields))
+    )
+    if not rows:
+        return None
+    ids, days, *values = zip(*rows)
+    day_positions = (np.array(days, dtype='datetime64[D]') - np.datetime64(start, 'D')).astype(np.int64)
+    return _zone_positions(zone_ids, ids), day_positions, [np.array(value, dtype=np.float64) for value in values]
+
+
+def daily_usage(zone_ids, start, end):
+    """Матрица расхода (л) «зоны × дни» за локальные даты ``start``..``end`` включительно.
+
+    ``zone_ids`` должны быть отсортированы по возрастанию.
+    """
+    usage = np.zeros((len(zone_ids), (end - start).days + 1))
+    rows = _usage_rows(zone_ids, start, end, ['water_used'])
+    if rows:
+        zone_positions, day_positions, (water,) = rows
+        usage[zone_positions, day_positions] = water
+    return usage
+
+
+def _history(zone_ids, today):
+    """Сумма и число поливов по расписанию и сумма ручных поливов каждой зоны"""
+    fields = ['waterings_count', 'water_used', 'manual_count', 'manual_water_used']
+    rows = _usage_rows(zone_ids, today - timedelta(days=USAGE_FORECAST_HISTORY_DAYS), today - timedelta(days=1), fields)
+    totals = np.zeros((len(fields), len(zone_ids)))
+    if rows:
+        zone_positions, _, values = rows
+        for column, value in zip(totals, values):
+            np.add.at(column, zone_positions, value)
+    count, water, manual_count, manual_water = totals
+    return water - manual_water, count - manual_count, manual_water
+
+
+def forecast_usage(zone_ids, durations, areas, today, days):
+    """Матрица прогноза расхода (л) «зоны × дни» на ``days`` дней после ``today``"""
+    runs_by_weekday = np.zeros((len(zone_ids), 7))
+    schedules = list(
+        WateringSchedule.objects.filter(zone_id__in=zone_ids.tolist(), is_active=True)
+        .values_list('zone_id', 'days_mask')
+    )
+    if schedules:
+        ids, masks = zip(*schedules)
+        positions = _zone_positions(zone_ids, ids)
+        masks = np.array(masks, dtype=np.int64)
+        for weekday in range(7):
+            np.add.at(runs_by_weekday[:, weekday], positions, (masks >> weekday) & 1)
+
+    scheduled_water, scheduled_count, manual_water = _history(zone_ids, today)
+    per_zone, per_m2 = flow_rates()
+    nominal = durations * np.where(np.isnan(areas), float(per_zone), areas * float(per_m2))
+    per_run = np.where(scheduled_count > 0, scheduled_water / np.maximum(scheduled_count, 1), nominal)
+    manual_per_day = manual_water / USAGE_FORECAST_HISTORY_DAYS
+
+    weekdays = np.array([(today + timedelta(days=offset)).weekday() for offset in range(1, days + 1)], dtype=np.int64)
+    return runs_by_weekday[:, weekdays] * per_run[:, None] + manual_per_day[:, None]
+
+
+def _rounded(values):
+    return np.round(values, 2).tolist()
+
+
+def usage_report(user_id, start, end, forecast_days, today=None):
+    """Расход по зонам и в целом за период и прогноз для API"""
+    today = today or timezone.localdate()
+    zones = list(
+        GardenZone.objects.filter(user_id=user_id)
+        .order_by('id')
+        .values_list('id', 'name', 'watering_duration', 'area_size')
+    )
+    zone_ids = np.array([zone[0] for zone in zones], dtype=np.int64)
+    durations = np.array([zone[2] for zone in zones], dtype=np.float64)
+    areas = np.array([np.nan if zone[3] is None else float(zone[3]) for zone in zones], dtype=np.float64)
+
+    usage = daily_usage(zone_ids, start, end)
+    forecast = forecast_usage(zone_ids, durations, areas, today, forecast_days)
+    usage_totals = usage.sum(axis=1)
+    forecast_totals = forecast.sum(axis=1)
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': [(start + timedelta(days=offset)).isoformat() for offset in range(usage.shape[1])],
+        'forecast_days': [(today + timedelta(days=offset)).isoformat() for offset in range(1, forecast_days + 1)],
+        'zones': [
+            {
+                'zone_id': zone_id,
+                'zone_name': name,
+                'usage': zone_usage,
+                'total': total,
+                'forecast': zone_forecast,
+                'forecast_total': forecast_total,
+            }
+            for (zone_id, name, *_), zone_usage, total, zone_forecast, forecast_total in zip(
+                zones, _rounded(usage), _rounded(usage_totals), _rounded(forecast), _rounded(forecast_totals),
+            )
+        ],
+        'total': {
+            'usage': _rounded(usage.sum(axis=0)),
+            'total': round(float(usage_totals.sum()), 2),
+            'forecast': _rounded(forecast.sum(axis=0)),
+            'forecast_total': round(float(forecast_totals.sum()), 2),
+        },
+    }
@@ -0,0 +1,20 @@
+from django.apps import AppConfig
+
+
+class MainConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'main'
+    verbose_name = 'Умный полив'
+
+    def ready(self):
+        # Регистрация обработчиков сигналов
+        from . import signals  # noqa: F401
+        
+        from django.db.backends.signals import connection_created
+        from .db import apply_sqlite_pragmas
+        connection_created.connect(apply_sqlite_pragmas)
+        
+        # Учёт SQL-запросов для метрик (main.metrics)
+        from .metrics import install_query_recorder, metrics_enabled
+        if metrics_enabled():
+            connection_created.connect(install_query_recorder)
@@ -0,0 +1,109 @@
+"""Кэш данных страниц и API по пользователям.
+
+Ключ включает версию данных пользователя, которая увеличивается при
+каждом изменении его зон, расписаний, поливов и показаний
+(см. ``main.signals``). Старые записи после этого просто перестают
+читаться и вытесняются по таймауту, поэтому удалять их не нужно.
+
+Версия увеличивается после фиксации транзакции: запрос, прочитавший
+новую версию, гарантированно видит и новые данные.
+
+Пути записи, которые обходят сигналы (``bulk_create``, ``update``,
+массовое удаление), должны сами вызывать ``invalidate_user`` или
+``invalidate_all``.
+
+Бэкенд задаётся ``GARDEN_CACHE_ALIAS``. LocMemCache (по умолчанию)
+хранит кэш в памяти процесса, поэтому изменения из других процессов
+(другие воркеры, ``run_scheduler``) видны только по истечении
+``GARDEN_CACHE_TIMEOUT``; при нескольких процессах нужен общий бэкенд.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+GLOBAL_VERSION_KEY = 'garden:version'
+
+_MISSING = object()
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _cache():
+    return caches[getattr(settings, 'GARDEN_CACHE_ALIAS', 'default')]
+
+
+def _user_version_key(user_id):
+    return f'garden:user:{user_id}:version'
+
+
+def _initial_version():
+    # После вытеснения ключа версии новая версия не должна совпасть с прежними
+    return time.time_ns()
+
+
+def _versions(user_id):
+    cache = _cache()
+    keys = (GLOBAL_VERSION_KEY, _user_version_key(user_id))
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return versions[GLOBAL_VERSION_KEY], versions[keys[1]]
+
+
+def _bump(key):
+    cache = _cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+
+
+def invalidate_user(user_id):
+    """Сбросить кэш пользователя (после фиксации текущей транзакции)"""
+    transaction.on_commit(lambda: _bump(_user_version_key(user_id)))
+
+
+def invalidate_all():
+    """Сбросить кэш всех пользователей (после массовых изменений)"""
+    transaction.on_commit(lambda: _bump(GLOBAL_VERSION_KEY))
+
+
+def _count(name, outcome):
+    with _stats_lock:
+        counters = _stats.setdefault(name, {'hits': 0, 'misses': 0})
+        counters[outcome] += 1
+
+
+def cached_for_user(user_id, name, build, timeout=None):
+    """Значение ``build()`` из кэша пользователя под именем ``name``"""
+    # Версия читается до данных: значение, построенное по старым данным,
+    # может попасть только под старую версию
+    global_version, user_version = _versions(user_id)
+    key = f'garden:user:{user_id}:{global_version}:{user_version}:{name}'
+    cache = _cache()
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _count(name.split(':', 1)[0], 'hits')
+        return value
+    _count(name.split(':', 1)[0], 'misses')
+    value = build()
+    cache.set(key, value, timeout if timeout is not None else getattr(settings, 'GARDEN_CACHE_TIMEOUT', 300))
+    return value
+
+
+def cache_stats():
+    """Счётчики попаданий и промахов по видам данных (в пределах процесса)"""
+    with _stats_lock:
+        return {name: dict(counters) for name, counters in _stats.items()}
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
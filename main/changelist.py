@@ -0,0 +1,188 @@
+"""Списки админки для таблиц с миллионами строк.
+
+Стандартный список админки при каждой загрузке считает строки (COUNT(*)
+выборки и всей таблицы), выбирает страницу через OFFSET, строит ссылки
+date_hierarchy по SELECT DISTINCT дат и ищет соединением с LIKE - всё
+это полные проходы по таблице. ``LargeTableAdmin`` вместо этого:
+
+- показывает оценку числа строк: для всей таблицы - статистику
+  планировщика PostgreSQL (reltuples по всем секциям) или диапазон id в
+  SQLite, для отфильтрованной выборки - COUNT не дальше
+  ``GARDEN_ADMIN_COUNT_LIMIT`` строк;
+- листает страницы курсором по (время, id) (main.pagination), а не
+  OFFSET: страница по индексу стоит одинаково на любой глубине. Если
+  список отсортирован по столбцу, остаются обычные номера страниц;
+- строит ссылки по датам (шаблонный тег ``index_date_hierarchy``) из
+  первой и последней даты таблицы - два чтения по краям индекса;
+  месяцы и дни без строк тоже попадают в ссылки;
+- ищет зоны по имени, имени пользователя или id, а строки выбирает по
+  найденным id зон (индекс (зона, время)).
+"""
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .models import GardenZone
+from .pagination import InvalidCursor, keyset_paginate
+
+
+# Параметр строки запроса с курсором страницы
+CURSOR_VAR = 'cursor'
+
+# До скольких строк считается отфильтрованная выборка; больше -
+# показывается «больше N»
+ADMIN_COUNT_LIMIT = 10000
+
+# Сколько найденных зон подставляется в запрос списком id; если их
+# больше, зоны выбираются подзапросом
+ADMIN_SEARCH_ZONES = 500
+
+
+def count_limit():
+    return getattr(settings, 'GARDEN_ADMIN_COUNT_LIMIT', ADMIN_COUNT_LIMIT)
+
+
+def estimate_rows(model, using='default'):
+    """Примерное число строк таблицы без COUNT(*); None - оценки нет"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # У секционированной таблицы своей статистики нет - складываются
+            # секции; -1 - таблицу ещё не анализировали
+            cursor.execute(
+                'SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0) FROM pg_class c '
+                'WHERE c.oid = %s::regclass '
+                'OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)',
+                [table, table],
+            )
+        elif connection.vendor == 'sqlite':
+            # Края первичного ключа - два чтения по индексу (MIN и MAX в
+            # одном SELECT SQLite считает проходом по таблице); дыры от
+            # удалений завышают оценку
+            pk = connection.ops.quote_name(model._meta.pk.column)
+            table = connection.ops.quote_name(table)
+            cursor.execute(f'SELECT COALESCE((SELECT MAX({pk}) FROM {table}) - (SELECT MIN({pk}) FROM {table}) + 1, 0)')
+        else:
+            return None
+        return int(cursor.fetchone()[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, который не считает все строки выборки.
+
+    ``estimated`` - число взято из оценки размера таблицы, ``capped`` -
+    строк больше ``GARDEN_ADMIN_COUNT_LIMIT`` и показан сам предел.
+    """
+
+    estimated = False
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = count_limit()
+        if not queryset.query.where:
+            estimate = estimate_rows(queryset.model, queryset.db)
+            # Маленькую или ещё не анализированную таблицу дешевле посчитать
+            if estimate is not None and estimate >= limit:
+                self.estimated = True
+                return estimate
+        count = queryset.order_by()[:limit + 1].count()
+        if count > limit:
+            self.capped = True
+            return limit
+        return count
+
+
+class KeysetChangeList(ChangeList):
+    """Список, который листается курсором по (``keyset_field``, id)"""
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR) or None
+        self.keyset = False
+        self.next_cursor = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_queryset(self, request, exclude_parameters=None):
+        # Курсор - не фильтр: в ссылки фильтров, сортировки и поиска не переносится
+        self.params.pop(CURSOR_VAR, None)
+        self.filter_params.pop(CURSOR_VAR, None)
+        return super().get_queryset(request, exclude_parameters)
+
+    def get_results(self, request):
+        if ORDER_VAR in self.params:
+            # Сортировка по столбцу - обычные страницы с OFFSET
+            return super().get_results(request)
+        try:
+            page = keyset_paginate(self.queryset, self.model_admin.keyset_field, self.cursor, self.list_per_page)
+        except InvalidCursor:
+            raise IncorrectLookupParameters('Неверный курсор страницы')
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = page.items
+        self.can_show_all = False
+        self.multi_page = self.cursor is not None or page.has_next
+        self.keyset = True
+        self.next_cursor = page.next_cursor
+
+    @property
+    def first_page_url(self):
+        return self.get_query_string()
+
+    @property
+    def next_page_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Админка истории зоны: курсорные страницы, оценка числа строк, поиск по зонам.
+
+    ``keyset_field`` - поле времени; по (``keyset_field``, id) должен быть
+    индекс по убыванию.
+    """
+
+    keyset_field = None
+    change_list_template = 'admin/main/large_table_change_list.html'
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    list_select_related = ['zone__user']
+    autocomplete_fields = ['zone']
+    search_fields = ['zone__name']
+    search_help_text = 'Имя зоны, имя пользователя или id зоны'
+
+    def get_ordering(self, request):
+        return [f'-{self.keyset_field}', '-id']
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return EstimatedCountPaginator(queryset, per_page, orphans, allow_empty_first_page)
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        condition = Q(name__icontains=search_term) | Q(user__username__icontains=search_term)
+        if search_term.isdigit():
+            condition |= Q(id=int(search_term))
+        # Зон на порядки меньше, чем строк истории: сначала ищутся зоны
+        zones = GardenZone.all_objects.filter(condition).values_list('id', flat=True)
+        zone_ids = list(zones[:ADMIN_SEARCH_ZONES + 1])
+        if len(zone_ids) > ADMIN_SEARCH_ZONES:
+            return queryset.filter(zone_id__in=zones), False
+        return queryset.filter(zone_id__in=zone_ids), False
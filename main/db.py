@@ -0,0 +1,134 @@
+"""Настройка подключений к SQLite и маршрутизация чтения.
+
+При каждом подключении к SQLite выполняются PRAGMA из
+``settings.GARDEN_SQLITE_PRAGMAS`` (WAL, synchronous, busy_timeout, кэш,
+mmap). В режиме WAL читатели не блокируют запись, а busy_timeout
+заставляет конкурирующую запись ждать вместо ошибки "database is locked".
+
+Если в ``DATABASES`` задан псевдоним ``READ_DATABASE`` (подключение
+только для чтения к тому же файлу), представления, помеченные
+``@use_read_database``, читают через него (см. ``ReadDatabaseRouter``).
+
+Асинхронные представления с долгим ожиданием обращаются к базе через
+``database_sync_to_async``: запросы идут в общем пуле из
+``GARDEN_ASYNC_DB_THREADS`` потоков, а не в потоке запроса, поэтому
+тысячи ожидающих запросов не держат тысячи подключений к базе.
+Подключения пула постоянные (не больше одного на поток).
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+READ_DATABASE = 'read'
+
+# Потоков (и подключений к базе) в пуле database_sync_to_async
+ASYNC_DB_THREADS = 4
+
+_async_db_executor = None
+_async_db_lock = threading.Lock()
+
+_read_alias = ContextVar('garden_read_alias', default=None)
+
+
+def _is_read_only(connection):
+    return 'mode=ro' in str(connection.settings_dict['NAME'])
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Обработчик connection_created: выполнить PRAGMA для нового подключения"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'GARDEN_SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            # Режим журнала хранится в файле базы, менять его может только запись
+            if name == 'journal_mode' and _is_read_only(connection):
+                continue
+            cursor.execute(f'PRAGMA {name} = {value}')
+        if _is_read_only(connection):
+            cursor.execute('PRAGMA query_only = ON')
+
+
+def _executor():
+    global _async_db_executor
+    if _async_db_executor is None:
+        with _async_db_lock:
+            if _async_db_executor is None:
+                _async_db_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'GARDEN_ASYNC_DB_THREADS', ASYNC_DB_THREADS),
+                    thread_name_prefix='garden-db',
+                )
+    return _async_db_executor
+
+
+def _close_broken_connections():
+    """Закрыть подключения потока, ставшие непригодными после ошибки"""
+    for connection in connections.all(initialized_only=True):
+        if connection.connection is not None and connection.errors_occurred:
+            if connection.is_usable():
+                connection.errors_occurred = False
+            else:
+                connection.close()
+
+
+def database_sync_to_async(func):
+    """``sync_to_async`` для запросов к базе из асинхронного кода.
+
+    В отличие от ``sync_to_async`` по умолчанию функция выполняется не
+    в потоке запроса (ASGI держит его до конца запроса вместе с
+    подключением к базе), а в общем пуле потоков. Подключение потока
+    пула не закрывается после вызова (переподключение и PRAGMA дороже
+    самих коротких запросов), но закрывается после ошибки, если стало
+    непригодным.
+    """
+    @wraps(func)
+    def call(*args, **kwargs):
+        _close_broken_connections()
+        return func(*args, **kwargs)
+    return sync_to_async(call, thread_sensitive=False, executor=_executor())
+
+
+def read_database():
+    """Псевдоним подключения для чтения, если оно настроено"""
+    return READ_DATABASE if READ_DATABASE in connections.settings else None
+
+
+def use_read_database(view):
+    """Выполнять запросы чтения представления через подключение для чтения"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _read_alias.set(read_database())
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return wrapper
+
+
+class ReadDatabaseRouter:
+    """Направляет чтение в READ_DATABASE внутри ``use_read_database``"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # Объекты, прочитанные через READ_DATABASE, сохраняются в основную базу
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == READ_DATABASE:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Обе базы - один и тот же файл
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == READ_DATABASE:
+            return False
+        return None
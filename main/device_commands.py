@@ -0,0 +1,299 @@
+"""Очередь команд контроллерам: запуск и остановка полива, расписание.
+
+Команда ставится в очередь каждому активному токену пользователя
+(``DeviceCommand``) в той же транзакции, что и изменение, которое её
+вызвало, и после фиксации будит контроллер через канал событий
+``device:<id токена>`` (main.events).
+
+Контроллер забирает команды долгим опросом ``GET /api/device/commands/``
+(асинхронное представление: ожидающие контроллеры не занимают потоков)
+и подтверждает каждую ``POST /api/device/commands/<id>/ack/``. Доставка
+- не менее одного раза: команда без подтверждения за
+``GARDEN_COMMAND_ACK_TIMEOUT`` секунд выдаётся снова, после
+``GARDEN_COMMAND_MAX_ATTEMPTS`` попыток считается неудачной, а не
+доставленная за ``GARDEN_COMMAND_TTL`` секунд - просроченной. Повтор
+контроллер узнаёт по ``id`` команды.
+
+Команды из других процессов (``run_scheduler``) не видны бэкенду
+событий в памяти процесса, поэтому ``CommandWatcher`` раз в
+``GARDEN_COMMAND_POLL_INTERVAL`` секунд одним запросом на процесс ищет
+новые команды и будит их контроллеры.
+
+Расписание (``update_schedule``) контроллер хранит, чтобы поливать по
+нему при потере связи; пока связь есть, полив запускает сервер
+командами ``start_zone``.
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .events import get_backend
+from .models import DeviceCommand, DeviceToken, WateringSchedule
+
+
+# Срок ожидания долгого опроса по умолчанию и наибольший, секунд
+COMMAND_WAIT_DEFAULT = 25
+COMMAND_WAIT_MAX = 30
+
+# Сколько команд выдаётся за один ответ
+COMMAND_BATCH_SIZE = 20
+
+# Через сколько секунд без подтверждения команда выдаётся снова
+COMMAND_ACK_TIMEOUT = 60
+
+# Сколько раз команда выдаётся, прежде чем считается неудачной
+COMMAND_MAX_ATTEMPTS = 3
+
+# Через сколько секунд невыполненная команда просрочена
+COMMAND_TTL = 600
+
+# Как часто процесс проверяет команды, поставленные другими процессами, секунд
+COMMAND_POLL_INTERVAL = 5
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def poll_interval():
+    """Период проверки команд других процессов, секунд"""
+    return _setting('GARDEN_COMMAND_POLL_INTERVAL', COMMAND_POLL_INTERVAL)
+
+
+def device_channel(device_id):
+    """Имя канала событий токена контроллера"""
+    return f'device:{device_id}'
+
+
+def _notify_on_commit(device_ids):
+    device_ids = sorted(set(device_ids))
+    if not device_ids:
+        return
+
+    def send():
+        backend = get_backend()
+        for device_id in device_ids:
+            backend.publish(device_channel(device_id), {'type': 'command'})
+
+    transaction.on_commit(send)
+
+
+def enqueue_commands(commands_by_user):
+    """Поставить команды в очередь всех активных контроллеров пользователей.
+
+    ``commands_by_user`` - словарь {user_id: [(вид, id зоны, параметры)]}.
+    Незавершённые команды ``update_schedule`` той же зоны отменяются:
+    контроллеру нужно только последнее расписание. Возвращает число
+    созданных команд.
+    """
+    commands_by_user = {user_id: commands for user_id, commands in commands_by_user.items() if commands}
+    if not commands_by_user:
+        return 0
+    devices = defaultdict(list)
+    for device_id, user_id in DeviceToken.objects.filter(
+        user_id__in=list(commands_by_user), is_active=True,
+    ).values_list('id', 'user_id'):
+        devices[user_id].append(device_id)
+    if not devices:
+        return 0
+
+    rows = [
+        DeviceCommand(device_id=device_id, kind=kind, zone_id=zone_id, payload=payload)
+        for user_id, device_ids in devices.items()
+        for device_id in device_ids
+        for kind, zone_id, payload in commands_by_user[user_id]
+    ]
+    schedule_zones = {
+        zone_id
+        for user_id in devices
+        for kind, zone_id, _ in commands_by_user[user_id]
+        if kind == DeviceCommand.KIND_UPDATE_SCHEDULE
+    }
+    device_ids = [device_id for device_ids in devices.values() for device_id in device_ids]
+    with transaction.atomic():
+        if schedule_zones:
+            DeviceCommand.objects.filter(
+                device_id__in=device_ids,
+                kind=DeviceCommand.KIND_UPDATE_SCHEDULE,
+                zone_id__in=schedule_zones,
+                status__in=DeviceCommand.OPEN_STATUSES,
+            ).update(status=DeviceCommand.STATUS_CANCELLED, completed_at=timezone.now())
+        DeviceCommand.objects.bulk_create(rows)
+        _notify_on_commit(device_ids)
+    return len(rows)
+
+
+def enqueue_command(user_id, kind, zone_id=None, payload=None):
+    """Поставить одну команду в очередь контроллеров пользователя"""
+    return enqueue_commands({user_id: [(kind, zone_id, payload or {})]})
+
+
+def schedule_payload(zone_id):
+    """Параметры команды ``update_schedule``: активные расписания зоны"""
+    return {
+        'schedules': [
+            {'id': schedule_id, 'time': moment.strftime('%H:%M'), 'days_mask': days_mask}
+            for schedule_id, moment, days_mask in WateringSchedule.objects.filter(
+                zone_id=zone_id, is_active=True,
+            ).order_by('time', 'id').values_list('id', 'time', 'days_mask')
+        ],
+    }
+
+
+def _mark_delivered(command_ids, now, resend_before, max_attempts):
+    """Отметить выданными те из ``command_ids``, что всё ещё ждут выдачи.
+
+    Условие выдачи проверяется заново в самом UPDATE, поэтому из двух
+    одновременных опросов одного контроллера команду получает один, и
+    попытка засчитывается один раз. Возвращает {id: число попыток}
+    для изменённых строк.
+    """
+    db = connections[DEFAULT_DB_ALIAS]
+    qn = db.ops.quote_name
+    adapt = db.ops.adapt_datetimefield_value
+    sql = (
+        f'UPDATE {qn(DeviceCommand._meta.db_table)} '
+        f'SET {qn("status")} = %s, {qn("delivered_at")} = %s, {qn("attempts")} = {qn("attempts")} + 1 '
+        f'WHERE {qn("id")} IN ({", ".join(["%s"] * len(command_ids))}) AND {qn("attempts")} < %s '
+        f'AND ({qn("status")} = %s OR ({qn("status")} = %s AND {qn("delivered_at")} < %s)) '
+        f'RETURNING {qn("id")}, {qn("attempts")}'
+    )
+    params = [
+        DeviceCommand.STATUS_DELIVERED, adapt(now), *command_ids, max_attempts,
+        DeviceCommand.STATUS_PENDING, DeviceCommand.STATUS_DELIVERED, adapt(resend_before),
+    ]
+    with db.cursor() as cursor:
+        cursor.execute(sql, params)
+        return dict(cursor.fetchall())
+
+
+def claim_commands(device_id, now=None, limit=COMMAND_BATCH_SIZE):
+    """Выдать контроллеру команды, ожидающие доставки.
+
+    Без команд - один SELECT по индексу (device, status, id); запись в
+    базу только при выдаче, просрочке или исчерпании попыток.
+    Возвращает список словарей для ответа API.
+    """
+    now = now or timezone.now()
+    expired_before = now - timedelta(seconds=_setting('GARDEN_COMMAND_TTL', COMMAND_TTL))
+    resend_before = now - timedelta(seconds=_setting('GARDEN_COMMAND_ACK_TIMEOUT', COMMAND_ACK_TIMEOUT))
+    max_attempts = _setting('GARDEN_COMMAND_MAX_ATTEMPTS', COMMAND_MAX_ATTEMPTS)
+
+    open_commands = list(
+        DeviceCommand.objects.filter(device_id=device_id, status__in=DeviceCommand.OPEN_STATUSES)
+        .order_by('id')
+        .values_list('id', 'kind', 'zone_id', 'payload', 'status', 'attempts', 'created_at', 'delivered_at')
+    )
+    expired, exhausted, deliver = [], [], []
+    for command in open_commands:
+        command_id, _, _, _, status, attempts, created_at, delivered_at = command
+        if created_at < expired_before:
+            expired.append(command_id)
+        elif status == DeviceCommand.STATUS_PENDING or delivered_at < resend_before:
+            if attempts >= max_attempts:
+                exhausted.append(command_id)
+            elif len(deliver) < limit:
+                deliver.append(command)
+    if not (expired or exhausted or deliver):
+        return []
+
+    delivered = {}
+    with transaction.atomic():
+        # Команду мог тем временем подтвердить контроллер или выдать
+        # параллельный опрос: закрытые команды не трогаются
+        if expired:
+            DeviceCommand.objects.filter(id__in=expired, status__in=DeviceCommand.OPEN_STATUSES).update(
+                status=DeviceCommand.STATUS_EXPIRED, completed_at=now,
+            )
+        if exhausted:
+            DeviceCommand.objects.filter(id__in=exhausted, status__in=DeviceCommand.OPEN_STATUSES).update(
+                status=DeviceCommand.STATUS_FAILED, error='Нет подтверждения', completed_at=now,
+            )
+        if deliver:
+            delivered = _mark_delivered([command[0] for command in deliver], now, resend_before, max_attempts)
+    return [
+        {
+            'id': command_id,
+            'kind': kind,
+            'zone_id': zone_id,
+            'payload': payload,
+            'attempt': delivered[command_id],
+            'created_at': created_at.isoformat(),
+        }
+        for command_id, kind, zone_id, payload, _, _, created_at, _ in deliver
+        if command_id in delivered
+    ]
+
+
+def acknowledge_command(device_id, command_id, ok=True, error=''):
+    """Отметить команду выполненной или неудачной.
+
+    Повторное подтверждение ничего не меняет. Возвращает итоговое
+    состояние команды или None, если у контроллера нет такой команды.
+    """
+    updated = DeviceCommand.objects.filter(
+        id=command_id,
+        device_id=device_id,
+        status__in=DeviceCommand.OPEN_STATUSES + (DeviceCommand.STATUS_EXPIRED,),
+    ).update(
+        status=DeviceCommand.STATUS_DONE if ok else DeviceCommand.STATUS_FAILED,
+        error='' if ok else error[:200],
+        completed_at=timezone.now(),
+    )
+    if updated:
+        return DeviceCommand.STATUS_DONE if ok else DeviceCommand.STATUS_FAILED
+    return DeviceCommand.objects.filter(id=command_id, device_id=device_id).values_list('status', flat=True).first()
+
+
+def delete_finished_commands(cutoff):
+    """Удалить завершённые команды, созданные до ``cutoff``. Возвращает число строк."""
+    deleted, _ = DeviceCommand.objects.filter(created_at__lt=cutoff).exclude(
+        status__in=DeviceCommand.OPEN_STATUSES,
+    ).delete()
+    return deleted
+
+
+class CommandWatcher:
+    """Поиск команд, поставленных в очередь другими процессами.
+
+    Ожидающие запросы процесса вызывают ``check`` по таймауту; запрос к
+    базе выполняется не чаще раза в ``GARDEN_COMMAND_POLL_INTERVAL``
+    секунд на весь процесс, контроллеры с новыми командами будятся
+    через канал событий.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_id = None
+        self.checked_at = 0
+
+    def due(self):
+        return time.monotonic() - self.checked_at >= poll_interval()
+
+    def check(self):
+        with self.lock:
+            if not self.due():
+                return
+            self.checked_at = time.monotonic()
+            if self.last_id is None:
+                # Команды, созданные до запуска, подхватит первый же опрос
+                self.last_id = DeviceCommand.objects.order_by('-id').values_list('id', flat=True).first() or 0
+                return
+            rows = list(
+                DeviceCommand.objects.filter(id__gt=self.last_id, status=DeviceCommand.STATUS_PENDING)
+                .values_list('id', 'device_id')
+            )
+            if not rows:
+                return
+            self.last_id = max(command_id for command_id, _ in rows)
+        backend = get_backend()
+        for device_id in {device_id for _, device_id in rows}:
+            backend.publish(device_channel(device_id), {'type': 'command'})
+
+
+command_watcher = CommandWatcher()
@@ -0,0 +1,234 @@
+"""API контроллеров: токены устройств и сигнал присутствия (heartbeat).
+
+Контроллер передаёт токен в заголовке ``Authorization: Bearer <токен>``.
+Токен имеет вид ``<префикс>.<секрет>``: по префиксу запись находится
+одним запросом по уникальному индексу, секрет сверяется с SHA-256 хэшем.
+Медленный хэш не нужен - секрет случайный, 256 бит.
+
+Представления API устройств помечаются декоратором ``device_api`` и
+вызываются ``main.middleware.DeviceApiMiddleware`` в обход сессий, CSRF
+и сообщений.
+
+Сигналы присутствия объединяются в памяти процесса (``HeartbeatBuffer``):
+первый сигнал пользователя записывается сразу, остальные - одним UPDATE
+на всех пользователей раз в ``GARDEN_HEARTBEAT_FLUSH_INTERVAL`` секунд.
+Поэтому ``SystemStatus.last_connection`` отстаёт от реального не больше
+чем на этот интервал. Пользователи без сигналов дольше
+``GARDEN_DEVICE_OFFLINE_AFTER`` секунд помечаются офлайн
+(``expire_offline_devices``).
+"""
+import atexit
+import functools
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db.models import Case, F, Q, Value, When
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+
+from .db import database_sync_to_async
+from .models import DeviceToken, SystemStatus
+from .stats import rebuild_user_stats
+
+
+# Длина открытого префикса токена, байт (в hex - вдвое больше символов)
+TOKEN_PREFIX_BYTES = 6
+
+# Длина секретной части токена, байт
+TOKEN_SECRET_BYTES = 32
+
+# Интервал записи накопленных сигналов присутствия, секунд
+HEARTBEAT_FLUSH_INTERVAL = 30
+
+# Через сколько секунд без сигналов система считается офлайн
+DEVICE_OFFLINE_AFTER = 120
+
+# Сколько пользователей обновляется одним UPDATE
+HEARTBEAT_UPDATE_BATCH_SIZE = 500
+
+
+def hash_token_secret(secret):
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def create_device_token(user, name):
+    """Создать токен контроллера. Возвращает (DeviceToken, токен целиком).
+
+    Токен целиком нигде не хранится и показывается только один раз.
+    """
+    prefix = secrets.token_hex(TOKEN_PREFIX_BYTES)
+    secret = secrets.token_urlsafe(TOKEN_SECRET_BYTES)
+    device_token = DeviceToken.objects.create(
+        user=user,
+        name=name,
+        prefix=prefix,
+        token_hash=hash_token_secret(secret),
+    )
+    return device_token, f'{prefix}.{secret}'
+
+
+def authenticate_device(request):
+    """(id токена, id пользователя) по заголовку Authorization или None"""
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    prefix, _, secret = token.strip().partition('.')
+    if scheme.lower() != 'bearer' or not prefix or not secret:
+        return None
+    found = list(
+        DeviceToken.objects.filter(prefix=prefix, is_active=True)
+        .values_list('id', 'user_id', 'token_hash')[:1]
+    )
+    if not found or not hmac.compare_digest(found[0][2], hash_token_secret(secret)):
+        return None
+    return found[0][0], found[0][1]
+
+
+def _unauthorized():
+    response = JsonResponse({'error': 'Требуется действующий токен контроллера'}, status=401)
+    response['WWW-Authenticate'] = 'Bearer'
+    return response
+
+
+def device_api(view):
+    """Представление API устройств: доступ по токену контроллера.
+
+    Сохраняет в ``request.device_token_id`` и ``request.device_user_id``
+    данные токена; без действующего токена возвращает 401. Подходит и
+    для асинхронных представлений.
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            device = await database_sync_to_async(authenticate_device)(request)
+            if device is None:
+                return _unauthorized()
+            request.device_token_id, request.device_user_id = device
+            return await view(request, *args, **kwargs)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            device = authenticate_device(request)
+            if device is None:
+                return _unauthorized()
+            request.device_token_id, request.device_user_id = device
+            return view(request, *args, **kwargs)
+
+    wrapper.device_api = True
+    return csrf_exempt(wrapper)
+
+
+# Сигналы присутствия
+
+def _flush_interval():
+    return getattr(settings, 'GARDEN_HEARTBEAT_FLUSH_INTERVAL', HEARTBEAT_FLUSH_INTERVAL)
+
+
+def _write_heartbeats(heartbeats):
+    """Записать {user_id: (время, давление или None)} одним UPDATE на порцию"""
+    user_ids = list(heartbeats)
+    for start in range(0, len(user_ids), HEARTBEAT_UPDATE_BATCH_SIZE):
+        chunk = user_ids[start:start + HEARTBEAT_UPDATE_BATCH_SIZE]
+        if len(chunk) == 1:
+            moment, pressure = heartbeats[chunk[0]]
+            values = {'last_connection': moment}
+            if pressure is not None:
+                values['water_pressure'] = pressure
+        else:
+            values = {
+                'last_connection': Case(*[When(user_id=user_id, then=Value(heartbeats[user_id][0])) for user_id in chunk]),
+                'water_pressure': Case(
+                    *[
+                        When(user_id=user_id, then=Value(heartbeats[user_id][1]))
+                        for user_id in chunk
+                        if heartbeats[user_id][1] is not None
+                    ],
+                    default=F('water_pressure'),
+                ),
+            }
+        updated = SystemStatus.objects.filter(user_id__in=chunk).update(is_online=True, **values)
+        if updated < len(chunk):
+            # SystemStatus создаётся при первом обращении к главной странице
+            missing = set(chunk) - set(SystemStatus.objects.filter(user_id__in=chunk).values_list('user_id', flat=True))
+            if missing:
+                rebuild_user_stats(missing)
+                _write_heartbeats({user_id: heartbeats[user_id] for user_id in missing})
+
+
+def expire_offline_devices(now=None):
+    """Пометить офлайн системы без сигналов дольше ``GARDEN_DEVICE_OFFLINE_AFTER``"""
+    now = now or timezone.now()
+    offline_after = getattr(settings, 'GARDEN_DEVICE_OFFLINE_AFTER', DEVICE_OFFLINE_AFTER)
+    return SystemStatus.objects.filter(is_online=True).filter(
+        Q(last_connection__isnull=True) | Q(last_connection__lt=now - timedelta(seconds=offline_after))
+    ).update(is_online=False)
+
+
+class HeartbeatBuffer:
+    """Накопитель сигналов присутствия процесса.
+
+    ``add`` записывает первый сигнал пользователя сразу (система
+    становится онлайн без задержки), остальные копит и раз в
+    ``GARDEN_HEARTBEAT_FLUSH_INTERVAL`` секунд записывает все разом.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.seen = set()
+        self.last_flush = time.monotonic()
+
+    def add(self, user_id, water_pressure=None, now=None):
+        now = now or timezone.now()
+        batch = None
+        with self.lock:
+            if user_id not in self.seen:
+                self.seen.add(user_id)
+                write_now = {user_id: (now, water_pressure)}
+            else:
+                write_now = None
+                previous = self.pending.get(user_id)
+                if water_pressure is None and previous is not None:
+                    water_pressure = previous[1]
+                self.pending[user_id] = (now, water_pressure)
+            if time.monotonic() - self.last_flush >= _flush_interval():
+                batch = self._take()
+        if write_now:
+            _write_heartbeats(write_now)
+        if batch is not None:
+            self._write(batch, now)
+
+    def _take(self):
+        batch, self.pending = self.pending, {}
+        self.last_flush = time.monotonic()
+        # Кто молчал весь интервал, мог быть помечен офлайн: его следующий
+        # сигнал записывается сразу
+        self.seen = set(batch)
+        return batch
+
+    def _write(self, batch, now=None):
+        if batch:
+            _write_heartbeats(batch)
+        expire_offline_devices(now)
+
+    def flush(self, now=None):
+        """Записать накопленные сигналы и пометить офлайн молчащие системы"""
+        with self.lock:
+            batch = self._take()
+        self._write(batch, now)
+        return len(batch)
+
+
+heartbeats = HeartbeatBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    # Без накопленных сигналов к базе не обращаемся
+    if heartbeats.pending:
+        heartbeats.flush()
@@ -0,0 +1,163 @@
+"""Публикация событий зон для потоковой доставки в браузер (SSE).
+
+События публикуются в канал пользователя и рассылаются всем его
+открытым подключениям. Бэкенд выбирается настройкой
+``GARDEN_EVENTS_BACKEND``; по умолчанию используется
+``InProcessEventBackend``, который работает в пределах одного процесса.
+Для нескольких воркеров нужен бэкенд поверх внешнего брокера с тем же
+интерфейсом.
+"""
+import asyncio
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+# Размер очереди одного подписчика; при переполнении события отбрасываются
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def user_channel(user_id):
+    """Имя канала событий пользователя"""
+    return f'user:{user_id}'
+
+
+class BaseEventBackend:
+    """Интерфейс бэкенда публикации событий"""
+
+    def publish(self, channel, event):
+        """Отправить событие всем подписчикам канала.
+
+        Может вызываться из любого потока, в том числе из синхронных
+        представлений и обработчиков сигналов.
+        """
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        """Подписаться на канал; возвращает объект Subscription"""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        """Отменить подписку"""
+        raise NotImplementedError
+
+
+class Subscription:
+    """Подписка на канал: асинхронная очередь в цикле событий подписчика"""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Медленный клиент: он догонит состояние при переподключении
+            pass
+
+    async def get(self, timeout=None):
+        """Дождаться следующего события; None по истечении таймаута"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessEventBackend(BaseEventBackend):
+    """Рассылка событий внутри процесса.
+
+    Каждое подключение ждёт на своей asyncio-очереди, поэтому тысячи
+    простаивающих клиентов не занимают потоки.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Цикл событий подписчика уже закрыт
+                self.unsubscribe(subscription)
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def subscribers_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(s) for s in self._subscribers.values())
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Экземпляр бэкенда, заданного в GARDEN_EVENTS_BACKEND"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'GARDEN_EVENTS_BACKEND', 'main.events.InProcessEventBackend')
+                _backend = import_string(path)()
+    return _backend
+
+
+def reading_event(reading):
+    """Событие о новом показании датчика"""
+    return {
+        'type': 'reading',
+        'zone_id': reading.zone_id,
+        'soil_moisture': reading.soil_moisture,
+        'temperature': float(reading.temperature) if reading.temperature is not None else None,
+        'humidity': reading.humidity,
+        'timestamp': reading.timestamp.isoformat() if reading.timestamp else None,
+    }
+
+
+def watering_event(log):
+    """Событие о новой записи полива"""
+    return {
+        'type': 'watering',
+        'zone_id': log.zone_id,
+        'started_at': log.started_at.isoformat() if log.started_at else None,
+        'duration': log.duration,
+        'water_used': float(log.water_used) if log.water_used is not None else None,
+        'is_manual': log.is_manual,
+    }
+
+
+def publish_on_commit(user_id, events):
+    """Опубликовать события пользователя после фиксации транзакции"""
+    events = list(events)
+    if not events:
+        return
+    channel = user_channel(user_id)
+
+    def send():
+        backend = get_backend()
+        for event in events:
+            backend.publish(channel, event)
+
+    transaction.on_commit(send)
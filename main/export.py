@@ -0,0 +1,95 @@
+"""Потоковая выгрузка истории в CSV и NDJSON.
+
+Строки читаются через ``values_list(...).iterator(chunk_size=...)``
+и сразу кодируются порциями, поэтому потребление памяти не зависит от
+объёма выгрузки.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from decimal import Decimal
+
+from django.http import StreamingHttpResponse
+
+
+# Сколько строк читается из базы за один fetchmany
+EXPORT_CHUNK_SIZE = 5000
+
+# Сколько строк кодируется в один фрагмент ответа
+EXPORT_ROWS_PER_PART = 1000
+
+READING_EXPORT_FIELDS = ('id', 'zone_id', 'zone__name', 'timestamp', 'soil_moisture', 'temperature', 'humidity')
+READING_EXPORT_HEADER = ('id', 'zone_id', 'zone_name', 'timestamp', 'soil_moisture', 'temperature', 'humidity')
+
+LOG_EXPORT_FIELDS = ('id', 'zone_id', 'zone__name', 'started_at', 'duration', 'water_used', 'is_manual')
+LOG_EXPORT_HEADER = ('id', 'zone_id', 'zone_name', 'started_at', 'duration', 'water_used', 'is_manual')
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def iter_csv(header, rows):
+    """CSV-фрагменты: заголовок и строки порциями"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    count = 0
+    for row in rows:
+        writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+        count += 1
+        if count % EXPORT_ROWS_PER_PART == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(header, rows):
+    """NDJSON-фрагменты: по объекту на строку"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({key: _json_value(value) for key, value in zip(header, row)}, ensure_ascii=False))
+        if len(lines) == EXPORT_ROWS_PER_PART:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def iter_gzip(parts):
+    """Сжатие потока фрагментов в gzip на лету"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for part in parts:
+        data = compressor.compress(part.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(queryset, fields, header, filename, fmt='csv', compress=False):
+    """StreamingHttpResponse с выгрузкой queryset в CSV или NDJSON"""
+    rows = queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if fmt == 'ndjson':
+        parts = iter_ndjson(header, rows)
+        content_type = 'application/x-ndjson; charset=utf-8'
+        filename += '.ndjson'
+    else:
+        parts = iter_csv(header, rows)
+        content_type = 'text/csv; charset=utf-8'
+        filename += '.csv'
+
+    if compress:
+        parts = iter_gzip(parts)
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(parts, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -1,7 +1,11 @@
+from datetime import datetime, time, timedelta
 from django import forms
+from django.utils import timezone
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .models import UserProfile, GardenZone, WateringSchedule
+from .models import UserProfile, GardenZone, WateringSchedule, SensorRollup, DeviceCommand
+from .analytics import USAGE_DEFAULT_DAYS, USAGE_FORECAST_DEFAULT_DAYS, USAGE_FORECAST_MAX_DAYS, USAGE_MAX_DAYS
+from .device_commands import COMMAND_WAIT_DEFAULT, COMMAND_WAIT_MAX
 
 
 class UserRegistrationForm(UserCreationForm):
@@ -152,3 +156,139 @@ class ManualWateringForm(forms.Form):
         }),
         label='Длительность полива (минут)'
     )
+
+
+class ZoneDateRangeFilterForm(forms.Form):
+    """Фильтр по зоне и диапазону дат"""
+    zone = forms.ModelChoiceField(
+        queryset=GardenZone.objects.none(),
+        required=False,
+        empty_label='Все зоны',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label='Зона'
+    )
+    date_from = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+        label='С'
+    )
+    date_to = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+        label='По'
+    )
+    
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['zone'].queryset = GardenZone.objects.filter(user=user)
+    
+    def filter_range(self, queryset, field):
+        """Применить фильтр по зоне и датам к полю времени ``field``"""
+        data = self.cleaned_data
+        if data.get('zone'):
+            queryset = queryset.filter(zone=data['zone'])
+        # Границы дней в локальном времени, чтобы фильтр шёл по индексу
+        if data.get('date_from'):
+            start = timezone.make_aware(datetime.combine(data['date_from'], time.min))
+            queryset = queryset.filter(**{f'{field}__gte': start})
+        if data.get('date_to'):
+            end = timezone.make_aware(datetime.combine(data['date_to'] + timedelta(days=1), time.min))
+            queryset = queryset.filter(**{f'{field}__lt': end})
+        return queryset
+
+
+class WateringHistoryFilterForm(ZoneDateRangeFilterForm):
+    """Фильтры истории полива"""
+    TYPE_CHOICES = [
+        ('', 'Все'),
+        ('manual', 'Ручной'),
+        ('scheduled', 'Авто'),
+    ]
+    
+    type = forms.ChoiceField(
+        choices=TYPE_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label='Тип'
+    )
+    
+    def filter_logs(self, logs):
+        """Применить фильтры к queryset записей полива"""
+        logs = self.filter_range(logs, 'started_at')
+        if self.cleaned_data.get('type') == 'manual':
+            logs = logs.filter(is_manual=True)
+        elif self.cleaned_data.get('type') == 'scheduled':
+            logs = logs.filter(is_manual=False)
+        return logs
+
+
+class ExportFilterForm(ZoneDateRangeFilterForm):
+    """Параметры выгрузки данных"""
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+    ]
+    
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
+    gzip = forms.BooleanField(required=False)
+
+
+class ReadingRollupForm(forms.Form):
+    """Параметры запроса агрегатов показаний"""
+    start = forms.DateTimeField(required=False)
+    end = forms.DateTimeField(required=False)
+    points = forms.IntegerField(required=False, min_value=1, max_value=5000)
+    resolution = forms.TypedChoiceField(choices=SensorRollup.RESOLUTION_CHOICES, coerce=int, required=False, empty_value=None)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        # По умолчанию - последние сутки
+        if not cleaned_data.get('end'):
+            cleaned_data['end'] = timezone.now()
+        if not cleaned_data.get('start'):
+            cleaned_data['start'] = cleaned_data['end'] - timedelta(days=1)
+        if cleaned_data['start'] >= cleaned_data['end']:
+            raise forms.ValidationError('Начало диапазона должно быть раньше конца')
+        return cleaned_data
+
+
+class UsageAnalyticsForm(forms.Form):
+    """Параметры запроса аналитики расхода воды"""
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    forecast_days = forms.IntegerField(required=False, min_value=0, max_value=USAGE_FORECAST_MAX_DAYS)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        # По умолчанию - последние USAGE_DEFAULT_DAYS дней, включая сегодня
+        if not cleaned_data.get('end'):
+            cleaned_data['end'] = timezone.localdate()
+        if not cleaned_data.get('start'):
+            cleaned_data['start'] = cleaned_data['end'] - timedelta(days=USAGE_DEFAULT_DAYS - 1)
+        if cleaned_data.get('forecast_days') is None:
+            cleaned_data['forecast_days'] = USAGE_FORECAST_DEFAULT_DAYS
+        if cleaned_data['start'] > cleaned_data['end']:
+            raise forms.ValidationError('Начало диапазона должно быть не позже конца')
+        if (cleaned_data['end'] - cleaned_data['start']).days >= USAGE_MAX_DAYS:
+            raise forms.ValidationError(f'Диапазон не может быть больше {USAGE_MAX_DAYS} дней')
+        return cleaned_data
+
+
+class HeartbeatForm(forms.Form):
+    """Данные сигнала присутствия контроллера"""
+    water_pressure = forms.DecimalField(required=False, min_value=0, max_digits=5, decimal_places=2)
+
+
+class CommandPollForm(forms.Form):
+    """Параметры долгого опроса команд контроллером"""
+    wait = forms.FloatField(required=False, min_value=0, max_value=COMMAND_WAIT_MAX)
+    
+    def clean_wait(self):
+        wait = self.cleaned_data.get('wait')
+        return COMMAND_WAIT_DEFAULT if wait is None else wait
+
+
+class CommandAckForm(forms.Form):
+    """Подтверждение команды контроллером"""
+    status = forms.ChoiceField(choices=[(DeviceCommand.STATUS_DONE, 'Выполнена'), (DeviceCommand.STATUS_FAILED, 'Ошибка')])
+    error = forms.CharField(required=False, max_length=200)
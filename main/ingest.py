@@ -0,0 +1,393 @@
+"""Пакетный приём показаний датчиков и истории полива от контроллеров.
+
+Контроллер без связи копит записи и выгружает их потом одним пакетом
+(``replay_records``) с исходным временем и ключом записи
+(``idempotency_key``). Повтор пакета после обрыва не создаёт дублей:
+строки вставляются через ``INSERT ... ON CONFLICT DO NOTHING`` по
+уникальному индексу (зона, ключ, время), и база сама отбрасывает уже
+сохранённые. Счётчики, агрегаты и расход воды пополняются только
+вставленными строками - их возвращает ``RETURNING``.
+"""
+import json
+import math
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import invalidate_user
+from .events import publish_on_commit, reading_event, watering_event
+from .models import GardenZone, SensorReading, WateringLog
+from .rollups import RollupBuffer
+from .stats import add_daily_usage, add_waterings
+from .watering import liters, water_used_for
+
+
+# Сколько строк вставляется одним INSERT
+INGEST_BATCH_SIZE = 1000
+
+# Ограничение на количество записей в одном запросе
+INGEST_MAX_RECORDS = 200000
+
+# Максимальный размер тела запроса в формате JSON-массива (байт).
+# NDJSON читается построчно и этим ограничением не связан.
+INGEST_MAX_JSON_BODY_SIZE = 64 * 1024 * 1024
+
+# Насколько время записи может опережать часы сервера, секунд
+INGEST_MAX_CLOCK_SKEW = 300
+
+# Наибольшая длина ключа записи (WateringLog/SensorReading.idempotency_key)
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+
+# Допустимые значения полей в процентах (влажность почвы и воздуха)
+PERCENT_RANGE = (0, 100)
+
+# Границы IntegerField во всех поддерживаемых базах
+INTEGER_RANGE = (-2147483648, 2147483647)
+
+
+class IngestError(ValueError):
+    """Ошибка разбора или проверки пакета показаний"""
+
+    def __init__(self, message, line=None):
+        super().__init__(message)
+        self.line = line
+
+
+def iter_json_records(body):
+    """Записи из JSON-массива"""
+    try:
+        records = json.loads(body)
+    except ValueError:
+        raise IngestError('Некорректный JSON')
+    if not isinstance(records, list):
+        raise IngestError('Ожидается JSON-массив показаний')
+    yield from records
+
+
+def iter_ndjson_records(stream):
+    """Записи из потока NDJSON (по одному JSON-объекту в строке)"""
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise IngestError('Некорректный JSON', line=line_no)
+
+
+def _is_number(value):
+    # json.loads принимает NaN и Infinity
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _optional_int(record, key, value_range=INTEGER_RANGE):
+    value = record.get(key)
+    if value is None:
+        return None
+    if not _is_number(value):
+        raise IngestError(f'Некорректное значение поля {key}')
+    # 59.9 не обрезается молча до 59; 59.0 допустимо
+    if isinstance(value, float) and not value.is_integer():
+        raise IngestError(f'Поле {key} должно быть целым числом')
+    low, high = value_range
+    if not low <= value <= high:
+        raise IngestError(f'Значение поля {key} вне диапазона {low}..{high}')
+    return int(value)
+
+
+def _optional_temperature(record):
+    value = record.get('temperature')
+    if value is None:
+        return None
+    if not _is_number(value):
+        raise IngestError('Некорректное значение поля temperature')
+    try:
+        temperature = Decimal(str(value)).quantize(Decimal('0.1'))
+    except InvalidOperation:
+        raise IngestError('Некорректное значение поля temperature')
+    # DecimalField(max_digits=4, decimal_places=1)
+    if abs(temperature) >= 1000:
+        raise IngestError('Некорректное значение поля temperature')
+    return temperature
+
+
+def _optional_timestamp(record, key, now, required=False):
+    value = record.get(key)
+    if value is None:
+        if required:
+            raise IngestError(f'Запись с ключом должна содержать поле {key}')
+        return now
+    moment = parse_datetime(value) if isinstance(value, str) else None
+    if moment is None:
+        raise IngestError(f'Некорректное значение поля {key}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    skew = getattr(settings, 'GARDEN_INGEST_MAX_CLOCK_SKEW', INGEST_MAX_CLOCK_SKEW)
+    if moment > now + timedelta(seconds=skew):
+        raise IngestError(f'Время {value} в будущем')
+    return moment
+
+
+def _optional_key(record):
+    value = record.get('key')
+    if value is None:
+        return None
+    if not isinstance(value, str) or not 0 < len(value) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise IngestError('Некорректное значение поля key')
+    return value
+
+
+def _record_zone(record, zone_ids):
+    if not isinstance(record, dict):
+        raise IngestError('Запись должна быть объектом')
+    zone_id = record.get('zone_id')
+    if zone_id not in zone_ids:
+        raise IngestError(f'Зона {zone_id} не найдена')
+    return zone_id
+
+
+def build_reading(record, zone_ids, now=None):
+    """Проверить запись и построить несохранённый SensorReading.
+
+    ``timestamp`` (ISO 8601) и ``key`` необязательны: без времени
+    берётся ``now``, без ключа повтор записи не распознаётся. Запись с
+    ключом без времени отклоняется: повтор получил бы другое ``now`` и
+    не совпал бы с сохранённой строкой по (зона, ключ, время).
+    """
+    zone_id = _record_zone(record, zone_ids)
+    key = _optional_key(record)
+    return SensorReading(
+        zone_id=zone_id,
+        timestamp=_optional_timestamp(record, 'timestamp', now or timezone.now(), required=key is not None),
+        soil_moisture=_optional_int(record, 'soil_moisture', PERCENT_RANGE),
+        temperature=_optional_temperature(record),
+        humidity=_optional_int(record, 'humidity', PERCENT_RANGE),
+        idempotency_key=key,
+    )
+
+
+def build_watering_log(record, zones, now=None):
+    """Проверить запись и построить несохранённый WateringLog.
+
+    ``zones`` - словарь {id зоны: площадь}. Без ``water_used`` расход
+    считается по длительности, как при запуске полива сервером. Запись
+    с ключом должна содержать ``started_at`` (см. ``build_reading``).
+    """
+    zone_id = _record_zone(record, zones)
+    key = _optional_key(record)
+    duration = _optional_int(record, 'duration', (0, INTEGER_RANGE[1]))
+    if duration is None:
+        raise IngestError('Некорректное значение поля duration')
+    water_used = record.get('water_used')
+    if water_used is None:
+        water_used = water_used_for(duration, zones[zone_id])
+    elif not _is_number(water_used) or not 0 <= water_used < 10 ** 6:
+        # DecimalField(max_digits=8, decimal_places=2)
+        raise IngestError('Некорректное значение поля water_used')
+    else:
+        water_used = liters(water_used)
+    is_manual = record.get('is_manual', False)
+    if not isinstance(is_manual, bool):
+        raise IngestError('Некорректное значение поля is_manual')
+    return WateringLog(
+        zone_id=zone_id,
+        started_at=_optional_timestamp(record, 'started_at', now or timezone.now(), required=key is not None),
+        duration=duration,
+        water_used=water_used,
+        is_manual=is_manual,
+        idempotency_key=key,
+    )
+
+
+def _returned_datetime(value):
+    # SQLite возвращает время в UTC строкой или наивным datetime
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def insert_new(model, objs, time_field):
+    """Вставить строки одним INSERT, пропуская уже сохранённые.
+
+    ``bulk_create(ignore_conflicts=True)`` не сообщает, какие строки
+    вставлены, а агрегаты должны пополняться только новыми - в том числе
+    при одновременной выгрузке того же пакета двумя запросами. Поэтому
+    вставка делается через ``ON CONFLICT DO NOTHING RETURNING`` по
+    уникальному индексу (зона, ключ, время). Возвращает вставленные
+    объекты (без id); строки без ключа вставляются всегда.
+    """
+    if not objs:
+        return []
+    qn = connection.ops.quote_name
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    time_field = model._meta.get_field(time_field)
+    placeholders = '(%s)' % ', '.join(['%s'] * len(fields))
+    sql = (
+        f'INSERT INTO {qn(model._meta.db_table)} ({", ".join(qn(field.column) for field in fields)}) '
+        f'VALUES {", ".join([placeholders] * len(objs))} '
+        'ON CONFLICT DO NOTHING '
+        f'RETURNING {qn("zone_id")}, {qn("idempotency_key")}, {qn(time_field.column)}'
+    )
+    # Само подключение, а не прокси (см. main.rollups._upsert)
+    db = connections[DEFAULT_DB_ALIAS]
+    params = [
+        field.get_db_prep_save(field.pre_save(obj, True), db)
+        for obj in objs
+        for field in fields
+    ]
+    with db.cursor() as cursor:
+        cursor.execute(sql, params)
+        returned = cursor.fetchall()
+
+    keyed = {
+        (obj.zone_id, obj.idempotency_key, getattr(obj, time_field.attname)): obj
+        for obj in objs
+        if obj.idempotency_key is not None
+    }
+    inserted = [obj for obj in objs if obj.idempotency_key is None]
+    for zone_id, key, moment in returned:
+        if key is not None:
+            inserted.append(keyed[zone_id, key, _returned_datetime(moment)])
+    return inserted
+
+
+class _Batch:
+    """Накопитель записей пакета одного пользователя.
+
+    Записи сохраняются порциями по ``batch_size``; агрегаты, счётчики и
+    события собираются только по вставленным строкам.
+    """
+
+    def __init__(self, user_id, batch_size):
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.readings = []
+        self.logs = []
+        self.rollups = RollupBuffer()
+        self.latest_readings = {}
+        self.latest_logs = {}
+        self.counts = {
+            'readings': {'received': 0, 'created': 0},
+            'waterings': {'received': 0, 'created': 0},
+        }
+
+    def add_reading(self, reading):
+        self.readings.append(reading)
+        if len(self.readings) >= self.batch_size:
+            self._save_readings()
+
+    def add_log(self, log):
+        self.logs.append(log)
+        if len(self.logs) >= self.batch_size:
+            self._save_logs()
+
+    def _save_readings(self):
+        batch, self.readings = self.readings, []
+        inserted = insert_new(SensorReading, batch, 'timestamp')
+        for reading in inserted:
+            self.rollups.add_reading(reading)
+            latest = self.latest_readings.get(reading.zone_id)
+            if latest is None or reading.timestamp >= latest.timestamp:
+                self.latest_readings[reading.zone_id] = reading
+        self.counts['readings']['received'] += len(batch)
+        self.counts['readings']['created'] += len(inserted)
+
+    def _save_logs(self):
+        batch, self.logs = self.logs, []
+        inserted = insert_new(WateringLog, batch, 'started_at')
+        if inserted:
+            add_daily_usage(inserted)
+            add_waterings(self.user_id, len(inserted), sum(log.water_used or 0 for log in inserted))
+        for log in inserted:
+            latest = self.latest_logs.get(log.zone_id)
+            if latest is None or log.started_at >= latest.started_at:
+                self.latest_logs[log.zone_id] = log
+        self.counts['waterings']['received'] += len(batch)
+        self.counts['waterings']['created'] += len(inserted)
+
+    def finish(self):
+        """Сохранить остаток, дописать агрегаты и запланировать события"""
+        if self.readings:
+            self._save_readings()
+        if self.logs:
+            self._save_logs()
+        self.rollups.flush()
+        for counts in self.counts.values():
+            counts['duplicates'] = counts['received'] - counts['created']
+        if self.latest_readings or self.latest_logs:
+            # Вставка в обход ORM не отправляет сигналы
+            invalidate_user(self.user_id)
+            publish_on_commit(self.user_id, [
+                *(reading_event(reading) for reading in self.latest_readings.values()),
+                *(watering_event(log) for log in self.latest_logs.values()),
+            ])
+        return self.counts
+
+
+def _ingest(user_id, records, add, batch_size, max_records):
+    batch = _Batch(user_id, batch_size)
+    now = timezone.now()
+    with transaction.atomic():
+        for index, record in enumerate(records):
+            if index >= max_records:
+                raise IngestError(f'Слишком много записей (максимум {max_records})')
+            try:
+                add(batch, record, now)
+            except IngestError as exc:
+                if exc.line is None:
+                    exc.line = index + 1
+                raise
+        return batch.finish()
+
+
+def ingest_readings(user_id, records, batch_size=INGEST_BATCH_SIZE, max_records=INGEST_MAX_RECORDS):
+    """Сохранить показания пакетами в одной транзакции.
+
+    Принадлежность зон проверяется одним запросом, записи вставляются
+    порциями по ``batch_size``; уже сохранённые записи с тем же ключом
+    пропускаются. При любой ошибке транзакция откатывается целиком.
+    Возвращает число сохранённых строк.
+
+    Подписчикам отправляется по одному событию на зону - с последним
+    показанием из пакета. Агрегаты (main.rollups) дописываются в той же
+    транзакции, по одной строке на затронутый интервал.
+    """
+    zone_ids = set(GardenZone.objects.filter(user_id=user_id).values_list('id', flat=True))
+
+    def add(batch, record, now):
+        batch.add_reading(build_reading(record, zone_ids, now))
+
+    counts = _ingest(user_id, records, add, batch_size, max_records)
+    return counts['readings']['created']
+
+
+def replay_records(user_id, records, batch_size=INGEST_BATCH_SIZE, max_records=INGEST_MAX_RECORDS):
+    """Сохранить накопленную контроллером историю.
+
+    Запись - объект с полем ``type``: ``reading`` (поля как у
+    ``build_reading``) или ``watering`` (``build_watering_log``).
+    Повторно выгруженные записи отбрасываются базой по ключу. Всё
+    сохраняется в одной транзакции. Возвращает
+    {'readings'|'waterings': {'received', 'created', 'duplicates'}}.
+    """
+    zones = dict(GardenZone.objects.filter(user_id=user_id).values_list('id', 'area_size'))
+
+    def add(batch, record, now):
+        kind = record.get('type') if isinstance(record, dict) else None
+        if kind == 'reading':
+            batch.add_reading(build_reading(record, zones, now))
+        elif kind == 'watering':
+            batch.add_log(build_watering_log(record, zones, now))
+        else:
+            raise IngestError('Поле type должно быть reading или watering')
+
+    return _ingest(user_id, records, add, batch_size, max_records)
@@ -0,0 +1,46 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from main.models import SensorReading
+from main.rollups import backfill_rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает агрегаты показаний (5 минут, час, сутки) по сохранённым показаниям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zone', type=int, action='append', dest='zone_ids', help='ID зоны (можно несколько раз)')
+        period = parser.add_mutually_exclusive_group()
+        period.add_argument('--since', help='Пересчитать только начиная с даты ГГГГ-ММ-ДД (более ранние агрегаты сохраняются)')
+        period.add_argument(
+            '--all', action='store_true',
+            help='Удалить и пересчитать все агрегаты, в том числе за период, показания которого уже удалены',
+        )
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Сколько показаний читается за одну порцию')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = timezone.make_aware(datetime.combine(datetime.strptime(options['since'], '%Y-%m-%d').date(), time.min))
+            except ValueError:
+                raise CommandError('Дата --since должна быть в формате ГГГГ-ММ-ДД')
+        elif not options['all']:
+            # По умолчанию - с первого сохранённого показания: агрегаты
+            # более раннего периода (после compact_history) - единственная копия
+            readings = SensorReading.objects.all()
+            if options['zone_ids']:
+                readings = readings.filter(zone_id__in=options['zone_ids'])
+            since = readings.order_by('timestamp').values_list('timestamp', flat=True).first()
+            if since is None:
+                self.stdout.write('Показаний нет, агрегаты не изменены')
+                return
+            self.stdout.write(f'Пересчёт с {timezone.localtime(since):%Y-%m-%d %H:%M} (первое сохранённое показание)')
+
+        def progress(processed):
+            self.stdout.write(f'Обработано показаний: {processed}')
+
+        processed = backfill_rollups(options['zone_ids'], chunk_size=options['chunk_size'], progress=progress, since=since)
+        self.stdout.write(self.style.SUCCESS(f'Агрегаты пересчитаны, показаний: {processed}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main.stats import rebuild_daily_usage
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает расход воды по дням (DailyWaterUsage) по сохранённым записям полива'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zone', type=int, action='append', dest='zone_ids', help='ID зоны (можно несколько раз)')
+
+    def handle(self, *args, **options):
+        written = rebuild_daily_usage(options['zone_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Расход по дням пересчитан, строк: {written}'))
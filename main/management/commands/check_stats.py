@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.stats import check_user_stats, rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает сохранённые агрегаты (SystemStatus) с полным пересчётом'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='ID пользователя (можно несколько раз)')
+        parser.add_argument('--fix', action='store_true', help='Пересчитать агрегаты пользователей с расхождениями')
+
+    def handle(self, *args, **options):
+        mismatches = check_user_stats(options['user_ids'])
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+
+        for user_id, field, stored, expected in mismatches:
+            self.stdout.write(f'user={user_id} {field}: сохранено {stored}, должно быть {expected}')
+
+        if options['fix']:
+            count = rebuild_user_stats({user_id for user_id, *_ in mismatches})
+            self.stdout.write(self.style.SUCCESS(f'Пересчитано пользователей: {count}'))
+        else:
+            raise CommandError(f'Найдено расхождений: {len(mismatches)}')
@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.device_commands import delete_finished_commands
+from main.partitions import ensure_partitions
+from main.retention import (
+    RETENTION_BATCH_SIZE, count_expired, cutoff_for, database_size, delete_expired_logs,
+    delete_expired_readings, incremental_vacuum, retention_days,
+)
+
+
+def _megabytes(size):
+    return f'{size / 1024 / 1024:.1f} МБ'
+
+
+class Command(BaseCommand):
+    help = 'Удаляет показания, записи полива и завершённые команды контроллерам старше срока хранения (GARDEN_RETENTION_DAYS), создаёт секции PostgreSQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readings-days', type=int, help='Срок хранения показаний (дни), вместо настройки')
+        parser.add_argument('--logs-days', type=int, help='Срок хранения записей полива (дни), вместо настройки')
+        parser.add_argument('--batch-size', type=int, default=RETENTION_BATCH_SIZE, help='Сколько строк удаляется за одну транзакцию')
+        parser.add_argument('--pause', type=float, default=0, help='Пауза между порциями (секунды)')
+        parser.add_argument('--vacuum', action='store_true', help='После удаления вернуть свободное место (SQLite, incremental VACUUM)')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, сколько строк будет удалено')
+
+    def handle(self, *args, **options):
+        days = retention_days()
+        if options['readings_days'] is not None:
+            days['sensor_readings'] = options['readings_days']
+        if options['logs_days'] is not None:
+            days['watering_logs'] = options['logs_days']
+        if any(value is not None and value < 1 for value in days.values()):
+            raise CommandError('Срок хранения должен быть не меньше одного дня')
+
+        cutoffs = {table: cutoff_for(value) for table, value in days.items()}
+        for table, cutoff in cutoffs.items():
+            self.stdout.write(f'{table}: ' + (f'удаляются записи до {cutoff:%Y-%m-%d %H:%M}' if cutoff else 'хранятся всегда'))
+
+        if options['dry_run']:
+            for table, count in count_expired(cutoffs).items():
+                self.stdout.write(f'{table}: будет удалено {count}')
+            return
+
+        size_before = database_size()
+        started = time.monotonic()
+        # Секции на следующие месяцы (PostgreSQL), команда запускается регулярно
+        for name in ensure_partitions():
+            self.stdout.write(f'Создана секция {name}')
+        batch = {'batch_size': options['batch_size'], 'pause': options['pause']}
+        if cutoffs['sensor_readings'] is not None:
+            deleted = delete_expired_readings(cutoffs['sensor_readings'], **batch)
+            self.stdout.write(f'sensor_readings: удалено {deleted}')
+        if cutoffs['watering_logs'] is not None:
+            deleted = delete_expired_logs(cutoffs['watering_logs'], **batch)
+            self.stdout.write(f'watering_logs: удалено {deleted}')
+        if cutoffs['device_commands'] is not None:
+            deleted = delete_finished_commands(cutoffs['device_commands'])
+            self.stdout.write(f'device_commands: удалено {deleted}')
+
+        if options['vacuum']:
+            mode = incremental_vacuum(pause=options['pause'])
+            if mode == 'full':
+                self.stdout.write('Включён режим auto_vacuum = INCREMENTAL (выполнен полный VACUUM)')
+            elif mode is None:
+                self.stdout.write('VACUUM выполняется только для SQLite (в PostgreSQL место освобождают удаление секций и autovacuum)')
+
+        self.stdout.write(f'Время: {time.monotonic() - started:.1f} с')
+        size_after = database_size()
+        if size_before is not None:
+            self.stdout.write(
+                f'Размер базы: {_megabytes(size_before)} -> {_megabytes(size_after)} '
+                f'({_megabytes(size_after - size_before)})'
+            )
+        self.stdout.write(self.style.SUCCESS('Готово'))
@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from main.devices import create_device_token
+
+
+class Command(BaseCommand):
+    help = 'Создаёт токен контроллера для API устройств и выводит его (показывается один раз)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Пользователь-владелец контроллера')
+        parser.add_argument('--name', default='Контроллер', help='Название контроллера')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {options["username"]} не найден')
+
+        device_token, token = create_device_token(user, options['name'])
+        self.stdout.write(self.style.SUCCESS(f'Токен контроллера «{device_token.name}» создан, сохраните его:'))
+        self.stdout.write(token)
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import GardenZone
+from main.purge import ZONE_PURGE_BATCH_SIZE, purge_deleted_zones
+
+
+# Как часто (секунды) выводить прогресс
+PROGRESS_INTERVAL = 2
+
+
+class Command(BaseCommand):
+    help = 'Удаляет порциями историю зон, помеченных удалёнными, и сами зоны (то же делает run_scheduler в фоне)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ZONE_PURGE_BATCH_SIZE, help='Начальный размер порции (строк)')
+        parser.add_argument('--max-lock-ms', type=int, help='Сколько миллисекунд может длиться один DELETE, вместо GARDEN_ZONE_PURGE_MAX_LOCK_MS')
+        parser.add_argument('--pause', type=float, help='Пауза между порциями (секунды), вместо GARDEN_ZONE_PURGE_PAUSE')
+        parser.add_argument('--time-budget', type=float, help='Остановиться через столько секунд')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать зоны, ожидающие удаления')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or (options['max_lock_ms'] is not None and options['max_lock_ms'] < 1):
+            raise CommandError('--batch-size и --max-lock-ms должны быть не меньше 1')
+
+        zones = GardenZone.all_objects.filter(deleted_at__isnull=False).select_related('user').order_by('deleted_at')
+        if options['dry_run']:
+            for zone in zones:
+                self.stdout.write(f'{zone.id}: {zone} (помечена {zone.deleted_at:%Y-%m-%d %H:%M})')
+            self.stdout.write(f'Зон к удалению: {len(zones)}')
+            return
+
+        last_report = [time.monotonic()]
+
+        def progress(zone, table, deleted):
+            now = time.monotonic()
+            if now - last_report[0] >= PROGRESS_INTERVAL:
+                last_report[0] = now
+                self.stdout.write(f'Зона {zone.id}: {table}, удалено строк зоны {deleted}')
+
+        started = time.monotonic()
+        result = purge_deleted_zones(
+            batch_size=options['batch_size'],
+            max_lock_ms=options['max_lock_ms'],
+            pause=options['pause'],
+            time_budget=options['time_budget'],
+            progress=progress,
+        )
+        self.stdout.write(
+            f'Удалено зон: {result["zones"]}, строк истории: {result["rows"]}, '
+            f'самый долгий DELETE: {result["slowest_delete_ms"]} мс'
+        )
+        if result['pending']:
+            self.stdout.write(f'Осталось зон: {result["pending"]}')
+        self.stdout.write(self.style.SUCCESS(f'Готово за {time.monotonic() - started:.1f} с'))
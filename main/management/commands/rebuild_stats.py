@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main.stats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает агрегаты главной страницы (SystemStatus) по исходным таблицам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='ID пользователя (можно несколько раз)')
+
+    def handle(self, *args, **options):
+        count = rebuild_user_stats(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано пользователей: {count}'))
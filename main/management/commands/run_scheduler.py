@@ -0,0 +1,31 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from main.scheduler import Scheduler
+
+
+class Command(BaseCommand):
+    help = 'Запускает исполнитель расписаний полива'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reload-interval', type=int, default=30,
+            help='Как часто (сек) подгружать изменённые расписания',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько записей полива вставлять одним запросом',
+        )
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+        scheduler = Scheduler(batch_size=options['batch_size'])
+        scheduler.load()
+        self.stdout.write(self.style.SUCCESS(
+            f'Планировщик запущен, расписаний: {len(scheduler.entries)}. Ctrl+C для остановки.'
+        ))
+        try:
+            scheduler.run(reload_interval=options['reload_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Планировщик остановлен.')
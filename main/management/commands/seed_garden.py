@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.seed import SeedError, seed_garden
+
+
+class Command(BaseCommand):
+    help = 'Создаёт синтетических пользователей с зонами, расписаниями и историей показаний и поливов для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Сколько пользователей создать')
+        parser.add_argument('--zones', type=int, default=5, help='Зон у каждого пользователя')
+        parser.add_argument('--schedules', type=int, default=2, help='Расписаний у каждой зоны')
+        parser.add_argument('--days', type=int, default=365, help='За сколько суток создать историю')
+        parser.add_argument('--reading-interval', type=int, default=30, help='Шаг показаний датчиков (минуты)')
+        parser.add_argument('--prefix', default='seed', help='Префикс имён пользователей (<префикс>_<номер>)')
+        parser.add_argument('--password', default='garden', help='Пароль всех созданных пользователей')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора случайных чисел')
+
+    def handle(self, *args, **options):
+        for name in ('users', 'zones', 'reading_interval'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} должно быть не меньше 1')
+        if options['schedules'] < 0 or options['days'] < 0:
+            raise CommandError('--schedules и --days не могут быть отрицательными')
+
+        def progress(kind, inserted):
+            if inserted % 100000 == 0:
+                self.stdout.write(f'{kind}: {inserted}')
+
+        started = time.monotonic()
+        try:
+            counts = seed_garden(
+                users=options['users'],
+                zones_per_user=options['zones'],
+                schedules_per_zone=options['schedules'],
+                days=options['days'],
+                reading_interval=options['reading_interval'],
+                prefix=options['prefix'],
+                password=options['password'],
+                seed=options['seed'],
+                progress=progress,
+            )
+        except SeedError as exc:
+            raise CommandError(str(exc))
+        for kind, count in counts.items():
+            self.stdout.write(f'{kind}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Готово за {time.monotonic() - started:.1f} с'))
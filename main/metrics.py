@@ -0,0 +1,237 @@
+"""Метрики запросов: время ответа, число и время SQL-запросов по представлениям.
+
+``RequestMetricsMiddleware`` (main.middleware) заводит на запрос
+``RequestStats`` в контекстной переменной. Обёртка выполнения запросов
+(``connection.execute_wrapper``) ставится на каждое подключение при его
+создании (``install_query_recorder``, сигнал connection_created) и
+учитывает SQL текущего запроса; вне запроса она только вызывает
+следующий обработчик. Контекст переносится ``sync_to_async``, поэтому
+запросы к базе из пула потоков асинхронных представлений
+(``database_sync_to_async``) тоже учитываются.
+
+Гистограммы копятся в памяти процесса и отдаются эндпоинтом
+``/metrics`` в текстовом формате Prometheus: при нескольких воркерах
+каждый отдаёт свои, собирать нужно с каждого процесса. Для потоковых
+ответов (SSE, выгрузки) учитывается время до начала передачи.
+"""
+import heapq
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from .cache import cache_stats
+
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм времени (секунды) и числа запросов к базе
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Порог медленного запроса: время ответа (мс) и число запросов к базе
+SLOW_REQUEST_MS = 1000
+SLOW_REQUEST_QUERIES = 50
+
+# Сколько самых медленных SQL-запросов попадает в журнал
+SLOW_LOG_QUERIES = 3
+
+# Имя представления для запросов, не дошедших до URL-маршрута
+UNRESOLVED_VIEW = '<unresolved>'
+
+_current = ContextVar('garden_request_stats', default=None)
+
+
+class RequestStats:
+    """SQL-запросы одного HTTP-запроса"""
+    __slots__ = ('queries', 'sql_time', 'slowest')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        # Куча (время, номер, SQL) из SLOW_LOG_QUERIES самых медленных;
+        # номер не даёт сравнивать строки SQL при равном времени
+        self.slowest = []
+
+    def add(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        if len(self.slowest) < SLOW_LOG_QUERIES:
+            heapq.heappush(self.slowest, (duration, self.queries, sql))
+        elif duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (duration, self.queries, sql))
+
+    def slowest_queries(self):
+        return [(duration, sql) for duration, _, sql in sorted(self.slowest, reverse=True)]
+
+
+def record_queries(execute, sql, params, many, context):
+    """Обёртка выполнения запросов: учитывает SQL в статистике текущего запроса"""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """Обработчик connection_created: поставить ``record_queries`` на подключение"""
+    # Сигнал приходит и при переподключении того же объекта
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+def metrics_enabled():
+    return getattr(settings, 'GARDEN_METRICS_ENABLED', True)
+
+
+def long_running(view):
+    """Представление с долгим ожиданием (долгий опрос): не считать его медленным"""
+    view.long_running = True
+    return view
+
+
+def start_request():
+    """Начать учёт запроса. Возвращает (статистика, токен для ``finish_request``)."""
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def cancel_request(token):
+    """Прекратить учёт запроса, завершившегося исключением"""
+    _current.reset(token)
+
+
+def _histogram(buckets):
+    # Счётчики по корзинам (последняя - +Inf), сумма, количество
+    return [[0] * (len(buckets) + 1), 0, 0]
+
+
+def _observe(histogram, buckets, value):
+    counts = histogram[0]
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            counts[index] += 1
+            break
+    else:
+        counts[-1] += 1
+    histogram[1] += value
+    histogram[2] += 1
+
+
+class MetricsRegistry:
+    """Гистограммы и счётчики процесса по представлениям"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.durations = {}
+            self.sql_durations = {}
+            self.query_counts = {}
+            self.responses = {}
+
+    def observe(self, view, status, duration, stats):
+        status_class = f'{status // 100}xx'
+        with self.lock:
+            if view not in self.durations:
+                self.durations[view] = _histogram(DURATION_BUCKETS)
+                self.sql_durations[view] = _histogram(DURATION_BUCKETS)
+                self.query_counts[view] = _histogram(QUERY_COUNT_BUCKETS)
+            _observe(self.durations[view], DURATION_BUCKETS, duration)
+            _observe(self.sql_durations[view], DURATION_BUCKETS, stats.sql_time)
+            _observe(self.query_counts[view], QUERY_COUNT_BUCKETS, stats.queries)
+            key = (view, status_class)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus"""
+        with self.lock:
+            durations = {view: _copy(histogram) for view, histogram in self.durations.items()}
+            sql_durations = {view: _copy(histogram) for view, histogram in self.sql_durations.items()}
+            query_counts = {view: _copy(histogram) for view, histogram in self.query_counts.items()}
+            responses = dict(self.responses)
+
+        lines = []
+        _render_histogram(lines, 'garden_request_duration_seconds', 'Время ответа представления', DURATION_BUCKETS, durations)
+        _render_histogram(lines, 'garden_request_db_seconds', 'Время SQL-запросов за HTTP-запрос', DURATION_BUCKETS, sql_durations)
+        _render_histogram(lines, 'garden_request_db_queries', 'Число SQL-запросов за HTTP-запрос', QUERY_COUNT_BUCKETS, query_counts)
+        lines.append('# HELP garden_responses_total Ответы по представлениям и классам статуса')
+        lines.append('# TYPE garden_responses_total counter')
+        for (view, status_class), count in sorted(responses.items()):
+            lines.append(f'garden_responses_total{{view="{_label(view)}",status="{status_class}"}} {count}')
+        lines.append('# HELP garden_cache_requests_total Обращения к кэшу пользователя (main.cache)')
+        lines.append('# TYPE garden_cache_requests_total counter')
+        for name, counters in sorted(cache_stats().items()):
+            for outcome, count in sorted(counters.items()):
+                lines.append(f'garden_cache_requests_total{{name="{_label(name)}",outcome="{outcome}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _copy(histogram):
+    return [list(histogram[0]), histogram[1], histogram[2]]
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _render_histogram(lines, name, help_text, buckets, histograms):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for view, (counts, total, count) in sorted(histograms.items()):
+        label = _label(view)
+        cumulative = 0
+        for bound, bucket_count in zip((*buckets, '+Inf'), counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{view="{label}"}} {_number(total)}')
+        lines.append(f'{name}_count{{view="{label}"}} {count}')
+
+
+registry = MetricsRegistry()
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNRESOLVED_VIEW
+
+
+def server_timing(duration, stats):
+    """Значение заголовка Server-Timing"""
+    return (
+        f'total;dur={duration * 1000:.1f}, '
+        f'db;dur={stats.sql_time * 1000:.1f};desc="{stats.queries} queries"'
+    )
+
+
+def finish_request(request, response, stats, token, duration):
+    """Завершить учёт запроса: гистограммы, Server-Timing, журнал медленных"""
+    _current.reset(token)
+    view = _view_name(request)
+    registry.observe(view, response.status_code, duration, stats)
+    response['Server-Timing'] = server_timing(duration, stats)
+
+    match = getattr(request, 'resolver_match', None)
+    if match is not None and getattr(match.func, 'long_running', False):
+        return
+    slow_ms = getattr(settings, 'GARDEN_SLOW_REQUEST_MS', SLOW_REQUEST_MS)
+    slow_queries = getattr(settings, 'GARDEN_SLOW_REQUEST_QUERIES', SLOW_REQUEST_QUERIES)
+    if duration * 1000 >= slow_ms or stats.queries >= slow_queries:
+        logger.warning(
+            'Медленный запрос %s %s (%s): %.1f мс, статус %s, SQL: %s запросов за %.1f мс; самые долгие:%s',
+            request.method, request.path, view, duration * 1000, response.status_code,
+            stats.queries, stats.sql_time * 1000,
+            ''.join(f'\n  {seconds * 1000:.1f} мс: {sql[:500]}' for seconds, sql in stats.slowest_queries()),
+        )
@@ -0,0 +1,175 @@
+"""Middleware приложения."""
+import time
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from .db import database_sync_to_async
+from .metrics import cancel_request, finish_request, install_query_recorder, metrics_enabled, start_request
+from .profiling import ProfileSession, profile_requested, profiling_enabled
+
+
+# Пути API устройств (main.devices)
+DEVICE_API_PREFIX = '/api/device/'
+
+
+class DeviceApiMiddleware:
+    """Запросы контроллеров обрабатываются в обход остальных middleware.
+
+    Для путей ``DEVICE_API_PREFIX``, ведущих к представлениям с
+    декоратором ``device_api``, представление вызывается сразу: сессия,
+    CSRF, аутентификация по сессии и сообщения таким запросам не нужны.
+    Должен стоять в ``MIDDLEWARE`` сразу после ``SecurityMiddleware``.
+
+    Работает и в синхронной, и в асинхронной цепочке: под ASGI остальные
+    middleware и асинхронные представления (``/api/events/``, ожидание
+    команд) не переводятся в поток. Синхронные представления API
+    устройств под ASGI выполняются в общем пуле потоков
+    (``database_sync_to_async``), а не в отдельном потоке на запрос, так
+    что число подключений к базе не растёт с числом контроллеров.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _device_view(self, request):
+        """Представление API устройств для запроса или None"""
+        if not request.path_info.startswith(DEVICE_API_PREFIX):
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if not getattr(match.func, 'device_api', False):
+            return None
+        request.resolver_match = match
+        return match
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        match = self._device_view(request)
+        if match is None:
+            return self.get_response(request)
+        view = match.func
+        if iscoroutinefunction(view):
+            view = async_to_sync(view)
+        return view(request, *match.args, **match.kwargs)
+
+    async def __acall__(self, request):
+        match = self._device_view(request)
+        if match is None:
+            return await self.get_response(request)
+        view = match.func
+        if not iscoroutinefunction(view):
+            view = database_sync_to_async(view)
+        return await view(request, *match.args, **match.kwargs)
+
+
+class RequestMetricsMiddleware:
+    """Время ответа и SQL-запросы каждого запроса (см. main.metrics).
+
+    Добавляет заголовок ``Server-Timing``, копит гистограммы для
+    ``/metrics`` и пишет в журнал ``main.metrics`` запросы дольше
+    ``GARDEN_SLOW_REQUEST_MS`` или с ``GARDEN_SLOW_REQUEST_QUERIES`` и
+    более SQL-запросами. Должен стоять в ``MIDDLEWARE`` перед
+    ``DeviceApiMiddleware``, чтобы учитывать и API устройств.
+    Отключается настройкой ``GARDEN_METRICS_ENABLED``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        # Новые подключения получают обёртку через connection_created
+        # (MainConfig.ready); уже открытые в этом потоке - здесь
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(None, connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        stats, token = start_request()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            cancel_request(token)
+            raise
+        finish_request(request, response, stats, token, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        stats, token = start_request()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            cancel_request(token)
+            raise
+        finish_request(request, response, stats, token, time.perf_counter() - started)
+        return response
+
+
+class RequestProfilingMiddleware:
+    """Профилирование запроса сотрудника по требованию (см. main.profiling).
+
+    Включается параметром ``?_profile=1`` или заголовком
+    ``X-Garden-Profile``; запросы остальных пользователей выполняются как
+    обычно. Должен стоять в ``MIDDLEWARE`` после
+    ``AuthenticationMiddleware``. Отключается настройкой
+    ``GARDEN_PROFILING_ENABLED``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not profiling_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not (profile_requested(request) and request.user.is_staff):
+            return self.get_response(request)
+        session = ProfileSession()
+        session.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            session.stop()
+        session.save(request, response, request.user.pk)
+        return response
+
+    async def __acall__(self, request):
+        if not profile_requested(request):
+            return await self.get_response(request)
+        user = await request.auser()
+        if not user.is_staff:
+            return await self.get_response(request)
+        # Синхронное представление выполнится в потоке этого запроса
+        # (sync_to_async с thread_sensitive): профилировщик включается в нём
+        session = ProfileSession()
+        await sync_to_async(session.start)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(session.stop)()
+        await sync_to_async(session.save)(request, response, user.pk)
+        return response
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.14 on 2026-10-17 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['zone', '-timestamp'], name='sensorreading_zone_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wateringlog',
+            index=models.Index(fields=['zone', '-started_at'], name='wateringlog_zone_started_idx'),
+        ),
+    ]
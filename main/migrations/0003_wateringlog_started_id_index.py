@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-17 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_reading_log_zone_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wateringlog',
+            index=models.Index(fields=['-started_at', '-id'], name='wateringlog_started_id_idx'),
+        ),
+    ]
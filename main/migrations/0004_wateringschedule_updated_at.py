@@ -0,0 +1,20 @@
+# Generated by Django 5.0.14 on 2026-10-17 18:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_wateringlog_started_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wateringschedule',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Изменено'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.14 on 2026-10-17 18:20
+
+from django.db import migrations, models
+
+
+def csv_to_mask(apps, schema_editor):
+    WateringSchedule = apps.get_model('main', 'WateringSchedule')
+    schedules = list(WateringSchedule.objects.only('id', 'days_of_week'))
+    for schedule in schedules:
+        mask = 0
+        for day in schedule.days_of_week.split(','):
+            day = day.strip()
+            if day.isdigit() and 1 <= int(day) <= 7:
+                mask |= 1 << (int(day) - 1)
+        schedule.days_mask = mask
+    WateringSchedule.objects.bulk_update(schedules, ['days_mask'], batch_size=1000)
+
+
+def mask_to_csv(apps, schema_editor):
+    WateringSchedule = apps.get_model('main', 'WateringSchedule')
+    schedules = list(WateringSchedule.objects.only('id', 'days_mask'))
+    for schedule in schedules:
+        schedule.days_of_week = ','.join(
+            str(day) for day in range(1, 8) if schedule.days_mask & (1 << (day - 1))
+        )
+    WateringSchedule.objects.bulk_update(schedules, ['days_of_week'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_wateringschedule_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wateringschedule',
+            name='days_mask',
+            field=models.PositiveSmallIntegerField(default=127, verbose_name='Дни недели (битовая маска)'),
+        ),
+        migrations.RunPython(csv_to_mask, mask_to_csv),
+        migrations.RemoveField(
+            model_name='wateringschedule',
+            name='days_of_week',
+        ),
+        migrations.AddIndex(
+            model_name='wateringschedule',
+            index=models.Index(fields=['is_active', 'time'], name='schedule_active_time_idx'),
+        ),
+    ]
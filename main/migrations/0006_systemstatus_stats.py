@@ -0,0 +1,48 @@
+# Generated by Django 5.0.14 on 2026-10-17 17:43
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_stats(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    GardenZone = apps.get_model('main', 'GardenZone')
+    WateringSchedule = apps.get_model('main', 'WateringSchedule')
+    WateringLog = apps.get_model('main', 'WateringLog')
+    SystemStatus = apps.get_model('main', 'SystemStatus')
+    for user_id in User.objects.values_list('id', flat=True).iterator():
+        logs = WateringLog.objects.filter(zone__user_id=user_id).aggregate(count=Count('id'), water=Sum('water_used'))
+        SystemStatus.objects.update_or_create(user_id=user_id, defaults={
+            'zones_count': GardenZone.objects.filter(user_id=user_id).count(),
+            'active_schedules_count': WateringSchedule.objects.filter(zone__user_id=user_id, is_active=True).count(),
+            'waterings_count': logs['count'],
+            'total_water_used': logs['water'] or Decimal('0'),
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_wateringschedule_days_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='systemstatus',
+            name='active_schedules_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Активных расписаний'),
+        ),
+        migrations.AddField(
+            model_name='systemstatus',
+            name='waterings_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Всего поливов'),
+        ),
+        migrations.AddField(
+            model_name='systemstatus',
+            name='zones_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Зон полива'),
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.14 on 2026-10-17 17:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_systemstatus_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField(choices=[(300, '5 минут'), (3600, 'Час'), (86400, 'Сутки')], verbose_name='Интервал')),
+                ('bucket_start', models.DateTimeField(verbose_name='Начало интервала')),
+                ('readings_count', models.PositiveIntegerField(default=0, verbose_name='Показаний')),
+                ('soil_moisture_min', models.IntegerField(blank=True, null=True)),
+                ('soil_moisture_max', models.IntegerField(blank=True, null=True)),
+                ('soil_moisture_sum', models.BigIntegerField(default=0)),
+                ('soil_moisture_count', models.PositiveIntegerField(default=0)),
+                ('temperature_min', models.DecimalField(blank=True, decimal_places=1, max_digits=4, null=True)),
+                ('temperature_max', models.DecimalField(blank=True, decimal_places=1, max_digits=4, null=True)),
+                ('temperature_sum', models.DecimalField(decimal_places=1, default=0, max_digits=14)),
+                ('temperature_count', models.PositiveIntegerField(default=0)),
+                ('humidity_min', models.IntegerField(blank=True, null=True)),
+                ('humidity_max', models.IntegerField(blank=True, null=True)),
+                ('humidity_sum', models.BigIntegerField(default=0)),
+                ('humidity_count', models.PositiveIntegerField(default=0)),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='main.gardenzone')),
+            ],
+            options={
+                'verbose_name': 'Агрегат показаний',
+                'verbose_name_plural': 'Агрегаты показаний',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='sensorrollup',
+            constraint=models.UniqueConstraint(fields=('zone', 'resolution', 'bucket_start'), name='sensorrollup_bucket_uniq'),
+        ),
+    ]
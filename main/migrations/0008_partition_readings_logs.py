@@ -0,0 +1,113 @@
+"""Помесячное секционирование SensorReading и WateringLog в PostgreSQL.
+
+Таблица пересоздаётся как секционированная по столбцу времени, данные
+переносятся в секции по месяцам. На SQLite миграция ничего не делает.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations
+
+
+PARTITIONED = (
+    ('SensorReading', 'timestamp'),
+    ('WateringLog', 'started_at'),
+)
+
+MONTHS_AHEAD = 2
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _month_start(moment):
+    moment = moment.astimezone(dt_timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _create_constraints(schema_editor, model, primary_key):
+    """Первичный ключ, внешний ключ на зону и индексы, как их создаёт Django"""
+    qn = schema_editor.quote_name
+    table = model._meta.db_table
+    schema_editor.execute(f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(table + "_pkey")} PRIMARY KEY ({primary_key})')
+    zone = model._meta.get_field('zone')
+    schema_editor.execute(schema_editor._create_fk_sql(model, zone, '_fk_%(to_table)s_%(to_column)s'))
+    schema_editor.execute(schema_editor._create_index_sql(model, fields=[zone]))
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+
+
+def partition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    qn = schema_editor.quote_name
+    for model_name, column in PARTITIONED:
+        model = apps.get_model('main', model_name)
+        table = model._meta.db_table
+        old = f'{table}_unpartitioned'
+
+        schema_editor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(old)}')
+        # Без INCLUDING IDENTITY: столбцы идентичности секционированным таблицам недоступны
+        schema_editor.execute(
+            f'CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS) PARTITION BY RANGE ({qn(column)})'
+        )
+        schema_editor.execute(f'CREATE TABLE {qn(table + "_default")} PARTITION OF {qn(table)} DEFAULT')
+
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'SELECT MIN({qn(column)}) FROM {qn(old)}')
+            oldest = cursor.fetchone()[0]
+        month = _month_start(oldest or datetime.now(dt_timezone.utc))
+        last = _add_months(_month_start(datetime.now(dt_timezone.utc)), MONTHS_AHEAD)
+        while month <= last:
+            end = _add_months(month, 1)
+            schema_editor.execute(
+                f'CREATE TABLE {qn(f"{table}_p{month:%Y%m}")} PARTITION OF {qn(table)} '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+            )
+            month = end
+
+        schema_editor.execute(f'INSERT INTO {qn(table)} SELECT * FROM {qn(old)}')
+        schema_editor.execute(f'DROP TABLE {qn(old)}')
+
+        sequence = qn(f'{table}_id_seq')
+        schema_editor.execute(f'CREATE SEQUENCE {sequence} OWNED BY {qn(table)}.{qn("id")}')
+        schema_editor.execute(
+            f"SELECT setval('{sequence}', COALESCE((SELECT MAX({qn('id')}) FROM {qn(table)}), 0) + 1, false)"
+        )
+        schema_editor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN {qn('id')} SET DEFAULT nextval('{sequence}')")
+        # Ключ секционированной таблицы обязан включать столбец секционирования
+        _create_constraints(schema_editor, model, f'{qn("id")}, {qn(column)}')
+
+
+def unpartition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    qn = schema_editor.quote_name
+    for model_name, column in PARTITIONED:
+        model = apps.get_model('main', model_name)
+        table = model._meta.db_table
+        old = f'{table}_partitioned'
+
+        schema_editor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(old)}')
+        schema_editor.execute(f'CREATE TABLE {qn(table)} (LIKE {qn(old)})')
+        schema_editor.execute(f'INSERT INTO {qn(table)} SELECT * FROM {qn(old)}')
+        schema_editor.execute(f'DROP TABLE {qn(old)} CASCADE')
+
+        schema_editor.execute(f'ALTER TABLE {qn(table)} ALTER COLUMN {qn("id")} ADD GENERATED BY DEFAULT AS IDENTITY')
+        schema_editor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE((SELECT MAX({qn('id')}) FROM {qn(table)}), 0) + 1, false)"
+        )
+        _create_constraints(schema_editor, model, qn('id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_sensorrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.14 on 2026-10-17 18:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_partition_readings_logs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyWaterUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Дата')),
+                ('waterings_count', models.PositiveIntegerField(default=0, verbose_name='Поливов')),
+                ('water_used', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Использовано воды (л)')),
+                ('manual_count', models.PositiveIntegerField(default=0, verbose_name='Ручных поливов')),
+                ('manual_water_used', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Из них вручную (л)')),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_usage', to='main.gardenzone')),
+            ],
+            options={
+                'verbose_name': 'Расход воды за сутки',
+                'verbose_name_plural': 'Расход воды по дням',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailywaterusage',
+            constraint=models.UniqueConstraint(fields=('zone', 'day'), name='dailywaterusage_zone_day_uniq'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-17 18:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_devicetoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceCommand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('start_zone', 'Запустить полив зоны'), ('stop_zone', 'Остановить полив зоны'), ('update_schedule', 'Обновить расписание зоны')], max_length=20, verbose_name='Команда')),
+                ('zone_id', models.BigIntegerField(blank=True, null=True, verbose_name='Зона')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Параметры')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает доставки'), ('delivered', 'Доставлена'), ('done', 'Выполнена'), ('failed', 'Ошибка'), ('expired', 'Просрочена'), ('cancelled', 'Заменена новой')], default='pending', max_length=10, verbose_name='Состояние')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток доставки')),
+                ('error', models.CharField(blank=True, max_length=200, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='Доставлена')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='commands', to='main.devicetoken', verbose_name='Контроллер')),
+            ],
+            options={
+                'verbose_name': 'Команда контроллеру',
+                'verbose_name_plural': 'Команды контроллерам',
+                'indexes': [models.Index(fields=['device', 'status', 'id'], name='devicecommand_device_status'), models.Index(fields=['created_at'], name='devicecommand_created_idx')],
+            },
+        ),
+    ]
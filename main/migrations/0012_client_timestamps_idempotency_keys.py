@@ -0,0 +1,42 @@
+# Generated by Django 5.0.14 on 2026-10-17 18:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_devicecommand'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensorreading',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='Ключ записи контроллера'),
+        ),
+        migrations.AddField(
+            model_name='wateringlog',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='Ключ записи контроллера'),
+        ),
+        migrations.AlterField(
+            model_name='sensorreading',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время измерения'),
+        ),
+        migrations.AlterField(
+            model_name='wateringlog',
+            name='started_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время начала'),
+        ),
+        migrations.AddConstraint(
+            model_name='sensorreading',
+            constraint=models.UniqueConstraint(condition=models.Q(('idempotency_key__isnull', False)), fields=('zone', 'idempotency_key', 'timestamp'), name='sensorreading_zone_key_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='wateringlog',
+            constraint=models.UniqueConstraint(condition=models.Q(('idempotency_key__isnull', False)), fields=('zone', 'idempotency_key', 'started_at'), name='wateringlog_zone_key_uniq'),
+        ),
+    ]
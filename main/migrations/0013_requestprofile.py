@@ -0,0 +1,38 @@
+# Generated by Django 5.0.14 on 2026-10-17 19:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_client_timestamps_idempotency_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('path', models.CharField(max_length=2000, verbose_name='Адрес')),
+                ('view_name', models.CharField(blank=True, max_length=200, verbose_name='Представление')),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='Статус ответа')),
+                ('duration_ms', models.FloatField(verbose_name='Время ответа (мс)')),
+                ('sql_time_ms', models.FloatField(verbose_name='Время SQL (мс)')),
+                ('queries_count', models.PositiveIntegerField(verbose_name='SQL-запросов')),
+                ('summary', models.TextField(blank=True, verbose_name='Самые долгие функции')),
+                ('profile', models.BinaryField(verbose_name='Профиль (pstats)')),
+                ('queries', models.JSONField(blank=True, default=list, verbose_name='SQL-запросы')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Снят')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-17 19:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_requestprofile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gardenzone',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Удалена'),
+        ),
+        migrations.AddIndex(
+            model_name='gardenzone',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='gardenzone_deleted_idx'),
+        ),
+    ]
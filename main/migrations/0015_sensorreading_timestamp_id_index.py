@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-17 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_gardenzone_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['-timestamp', '-id'], name='sensorreading_ts_id_idx'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models import Count, F, OuterRef, Q, Subquery
 from django.contrib.auth.models import User
+from django.utils import timezone
 import json
 
 
@@ -18,8 +20,49 @@ class UserProfile(models.Model):
         verbose_name_plural = 'Профили пользователей'
 
 
+class GardenZoneQuerySet(models.QuerySet):
+    """Выборки зон с данными из связанных таблиц за один запрос"""
+    
+    def with_latest_reading(self):
+        """Добавить последнее показание датчиков каждой зоны.
+        
+        Коррелированные подзапросы используют индекс (zone, -timestamp),
+        поэтому стоимость не зависит от размера таблицы показаний.
+        """
+        latest = SensorReading.objects.filter(zone=OuterRef('pk')).order_by('-timestamp', '-id')
+        return self.annotate(
+            latest_reading_at=Subquery(latest.values('timestamp')[:1]),
+            latest_soil_moisture=Subquery(latest.values('soil_moisture')[:1]),
+            latest_temperature=Subquery(latest.values('temperature')[:1]),
+            latest_humidity=Subquery(latest.values('humidity')[:1]),
+        )
+    
+    def with_last_watering(self):
+        """Добавить время последнего полива каждой зоны"""
+        last = WateringLog.objects.filter(zone=OuterRef('pk')).order_by('-started_at', '-id')
+        return self.annotate(last_watering_at=Subquery(last.values('started_at')[:1]))
+    
+    def with_active_schedules_count(self):
+        """Добавить количество активных расписаний каждой зоны"""
+        return self.annotate(
+            active_schedules_count=Count('schedules', filter=Q(schedules__is_active=True))
+        )
+
+
+class GardenZoneManager(models.Manager.from_queryset(GardenZoneQuerySet)):
+    """Зоны без помеченных удалёнными (см. main.purge)"""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class GardenZone(models.Model):
-    """Зона полива на участке"""
+    """Зона полива на участке.
+    
+    Удаляемая зона сначала только помечается (``deleted_at``), её история
+    удаляется в фоне порциями (main.purge). ``objects`` помеченных зон не
+    возвращает, ``all_objects`` - возвращает.
+    """
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='garden_zones')
     name = models.CharField(max_length=100, verbose_name='Название зоны')
     description = models.TextField(blank=True, verbose_name='Описание')
@@ -31,26 +74,85 @@ class GardenZone(models.Model):
     watering_duration = models.IntegerField(default=10, verbose_name='Длительность полива (мин)')
     watering_frequency = models.IntegerField(default=1, verbose_name='Частота полива (раз в день)')
     
+    deleted_at = models.DateTimeField(null=True, blank=True, verbose_name='Удалена')
+    
+    objects = GardenZoneManager()
+    all_objects = GardenZoneQuerySet.as_manager()
+    
     def __str__(self):
         return f'{self.name} ({self.user.username})'
     
     class Meta:
         verbose_name = 'Зона сада'
         verbose_name_plural = 'Зоны сада'
+        indexes = [
+            # Очередь зон на удаление истории
+            models.Index(fields=['deleted_at'], condition=Q(deleted_at__isnull=False), name='gardenzone_deleted_idx'),
+        ]
+
+
+# Дни недели: 1 - понедельник ... 7 - воскресенье
+WEEKDAY_NAMES = {1: 'Пн', 2: 'Вт', 3: 'Ср', 4: 'Чт', 5: 'Пт', 6: 'Сб', 7: 'Вс'}
+
+# Маска «все дни недели»
+ALL_DAYS_MASK = 0b1111111
+
+
+def day_bit(weekday):
+    """Бит дня недели в маске (1 - понедельник)"""
+    return 1 << (weekday - 1)
+
+
+def days_to_mask(days_list):
+    mask = 0
+    for day in days_list:
+        mask |= day_bit(int(day))
+    return mask
+
+
+def mask_to_days(mask):
+    return [day for day in range(1, 8) if mask & day_bit(day)]
+
+
+class WateringScheduleQuerySet(models.QuerySet):
+    """Выборки расписаний по дням недели через побитовую маску"""
+    
+    def runs_on(self, weekday):
+        """Расписания, срабатывающие в заданный день недели"""
+        bit = day_bit(weekday)
+        return self.alias(weekday_bit=F('days_mask').bitand(bit)).filter(weekday_bit=bit)
+    
+    def due_between(self, weekday, start, end):
+        """Активные расписания дня недели со временем в [start, end).
+        
+        Диапазон по времени выбирается по индексу (is_active, time),
+        день недели проверяется побитово.
+        """
+        return self.filter(is_active=True, time__gte=start, time__lt=end).runs_on(weekday)
 
 
 class WateringSchedule(models.Model):
     """Расписание полива"""
     zone = models.ForeignKey(GardenZone, on_delete=models.CASCADE, related_name='schedules')
     time = models.TimeField(verbose_name='Время полива')
-    days_of_week = models.CharField(max_length=50, default='1,2,3,4,5,6,7', verbose_name='Дни недели')
+    days_mask = models.PositiveSmallIntegerField(default=ALL_DAYS_MASK, verbose_name='Дни недели (битовая маска)')
     is_active = models.BooleanField(default=True, verbose_name='Активно')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Изменено')
+    
+    objects = WateringScheduleQuerySet.as_manager()
     
     def get_days_list(self):
-        return [int(d) for d in self.days_of_week.split(',')]
+        return mask_to_days(self.days_mask)
     
     def set_days_list(self, days_list):
-        self.days_of_week = ','.join(str(d) for d in days_list)
+        self.days_mask = days_to_mask(days_list)
+    
+    def runs_on(self, weekday):
+        return bool(self.days_mask & day_bit(weekday))
+    
+    def get_days_display(self):
+        return ', '.join(WEEKDAY_NAMES[day] for day in self.get_days_list())
+    get_days_display.short_description = 'Дни недели'
     
     def __str__(self):
         return f'{self.zone.name} - {self.time}'
@@ -58,15 +160,24 @@ class WateringSchedule(models.Model):
     class Meta:
         verbose_name = 'Расписание полива'
         verbose_name_plural = 'Расписания полива'
+        indexes = [
+            models.Index(fields=['is_active', 'time'], name='schedule_active_time_idx'),
+        ]
 
 
 class WateringLog(models.Model):
-    """История полива"""
+    """История полива.
+    
+    Время начала по умолчанию - момент создания записи; контроллер при
+    выгрузке накопленной истории передаёт исходное время и ключ записи
+    (см. main.ingest).
+    """
     zone = models.ForeignKey(GardenZone, on_delete=models.CASCADE, related_name='logs')
-    started_at = models.DateTimeField(auto_now_add=True, verbose_name='Время начала')
+    started_at = models.DateTimeField(default=timezone.now, verbose_name='Время начала')
     duration = models.IntegerField(verbose_name='Длительность (мин)')
     water_used = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True, verbose_name='Использовано воды (л)')
     is_manual = models.BooleanField(default=False, verbose_name='Ручной запуск')
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, verbose_name='Ключ записи контроллера')
     
     def __str__(self):
         return f'{self.zone.name} - {self.started_at}'
@@ -74,15 +185,30 @@ class WateringLog(models.Model):
     class Meta:
         verbose_name = 'Запись полива'
         verbose_name_plural = 'История полива'
+        indexes = [
+            models.Index(fields=['zone', '-started_at'], name='wateringlog_zone_started_idx'),
+            models.Index(fields=['-started_at', '-id'], name='wateringlog_started_id_idx'),
+        ]
+        constraints = [
+            # Повторная выгрузка той же записи отбрасывается базой.
+            # Уникальный индекс секционированной таблицы (PostgreSQL)
+            # обязан включать столбец секционирования.
+            models.UniqueConstraint(
+                fields=['zone', 'idempotency_key', 'started_at'],
+                condition=Q(idempotency_key__isnull=False),
+                name='wateringlog_zone_key_uniq',
+            ),
+        ]
 
 
 class SensorReading(models.Model):
     """Показания датчиков"""
     zone = models.ForeignKey(GardenZone, on_delete=models.CASCADE, related_name='sensor_readings')
-    timestamp = models.DateTimeField(auto_now_add=True, verbose_name='Время измерения')
+    timestamp = models.DateTimeField(default=timezone.now, verbose_name='Время измерения')
     soil_moisture = models.IntegerField(null=True, blank=True, verbose_name='Влажность почвы (%)')
     temperature = models.DecimalField(max_digits=4, decimal_places=1, null=True, blank=True, verbose_name='Температура (°C)')
     humidity = models.IntegerField(null=True, blank=True, verbose_name='Влажность воздуха (%)')
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, verbose_name='Ключ записи контроллера')
     
     def __str__(self):
         return f'{self.zone.name} - {self.timestamp}'
@@ -90,6 +216,89 @@ class SensorReading(models.Model):
     class Meta:
         verbose_name = 'Показание датчика'
         verbose_name_plural = 'Показания датчиков'
+        indexes = [
+            models.Index(fields=['zone', '-timestamp'], name='sensorreading_zone_ts_idx'),
+            # Страницы админки по всем зонам (main.changelist)
+            models.Index(fields=['-timestamp', '-id'], name='sensorreading_ts_id_idx'),
+        ]
+        constraints = [
+            # См. WateringLog
+            models.UniqueConstraint(
+                fields=['zone', 'idempotency_key', 'timestamp'],
+                condition=Q(idempotency_key__isnull=False),
+                name='sensorreading_zone_key_uniq',
+            ),
+        ]
+
+
+class SensorRollup(models.Model):
+    """Агрегат показаний зоны за интервал (5 минут, час, сутки).
+    
+    Среднее хранится как сумма и количество, чтобы агрегаты можно было
+    дополнять новыми показаниями (см. main.rollups).
+    """
+    RESOLUTION_5MIN = 300
+    RESOLUTION_HOUR = 3600
+    RESOLUTION_DAY = 86400
+    RESOLUTION_CHOICES = [
+        (RESOLUTION_5MIN, '5 минут'),
+        (RESOLUTION_HOUR, 'Час'),
+        (RESOLUTION_DAY, 'Сутки'),
+    ]
+    
+    zone = models.ForeignKey(GardenZone, on_delete=models.CASCADE, related_name='rollups')
+    resolution = models.PositiveIntegerField(choices=RESOLUTION_CHOICES, verbose_name='Интервал')
+    bucket_start = models.DateTimeField(verbose_name='Начало интервала')
+    readings_count = models.PositiveIntegerField(default=0, verbose_name='Показаний')
+    
+    soil_moisture_min = models.IntegerField(null=True, blank=True)
+    soil_moisture_max = models.IntegerField(null=True, blank=True)
+    soil_moisture_sum = models.BigIntegerField(default=0)
+    soil_moisture_count = models.PositiveIntegerField(default=0)
+    
+    temperature_min = models.DecimalField(max_digits=4, decimal_places=1, null=True, blank=True)
+    temperature_max = models.DecimalField(max_digits=4, decimal_places=1, null=True, blank=True)
+    temperature_sum = models.DecimalField(max_digits=14, decimal_places=1, default=0)
+    temperature_count = models.PositiveIntegerField(default=0)
+    
+    humidity_min = models.IntegerField(null=True, blank=True)
+    humidity_max = models.IntegerField(null=True, blank=True)
+    humidity_sum = models.BigIntegerField(default=0)
+    humidity_count = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f'{self.zone.name} - {self.get_resolution_display()} - {self.bucket_start}'
+    
+    class Meta:
+        verbose_name = 'Агрегат показаний'
+        verbose_name_plural = 'Агрегаты показаний'
+        constraints = [
+            models.UniqueConstraint(fields=['zone', 'resolution', 'bucket_start'], name='sensorrollup_bucket_uniq'),
+        ]
+
+
+class DailyWaterUsage(models.Model):
+    """Расход воды зоны за локальные сутки (см. main.stats, main.analytics).
+    
+    Дополняется при каждой записи полива и не удаляется вместе с
+    историей по сроку хранения.
+    """
+    zone = models.ForeignKey(GardenZone, on_delete=models.CASCADE, related_name='daily_usage')
+    day = models.DateField(verbose_name='Дата')
+    waterings_count = models.PositiveIntegerField(default=0, verbose_name='Поливов')
+    water_used = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='Использовано воды (л)')
+    manual_count = models.PositiveIntegerField(default=0, verbose_name='Ручных поливов')
+    manual_water_used = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='Из них вручную (л)')
+    
+    def __str__(self):
+        return f'{self.zone.name} - {self.day}'
+    
+    class Meta:
+        verbose_name = 'Расход воды за сутки'
+        verbose_name_plural = 'Расход воды по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['zone', 'day'], name='dailywaterusage_zone_day_uniq'),
+        ]
 
 
 class SystemStatus(models.Model):
@@ -100,9 +309,119 @@ class SystemStatus(models.Model):
     water_pressure = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, verbose_name='Давление воды')
     total_water_used = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='Всего использовано воды (л)')
     
+    # Агрегаты для главной страницы, поддерживаются инкрементально (см. main.stats)
+    zones_count = models.PositiveIntegerField(default=0, verbose_name='Зон полива')
+    active_schedules_count = models.PositiveIntegerField(default=0, verbose_name='Активных расписаний')
+    waterings_count = models.PositiveIntegerField(default=0, verbose_name='Всего поливов')
+    
     def __str__(self):
         return f'Статус системы {self.user.username}'
     
     class Meta:
         verbose_name = 'Статус системы'
         verbose_name_plural = 'Статусы систем'
+
+
+class DeviceToken(models.Model):
+    """Токен контроллера для доступа к API устройств (см. main.devices).
+    
+    Хранится только хэш секретной части; префикс открыт и служит для
+    поиска токена одним запросом по уникальному индексу.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='device_tokens')
+    name = models.CharField(max_length=100, verbose_name='Контроллер')
+    prefix = models.CharField(max_length=16, unique=True, verbose_name='Префикс')
+    token_hash = models.CharField(max_length=64, verbose_name='Хэш токена')
+    is_active = models.BooleanField(default=True, verbose_name='Активен')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создан')
+    
+    def __str__(self):
+        return f'{self.name} ({self.user.username})'
+    
+    class Meta:
+        verbose_name = 'Токен контроллера'
+        verbose_name_plural = 'Токены контроллеров'
+
+
+class DeviceCommand(models.Model):
+    """Команда контроллеру (см. main.device_commands).
+    
+    ``zone_id`` хранится без внешнего ключа: команда обновления
+    расписания должна дойти до контроллера и после удаления зоны.
+    """
+    KIND_START_ZONE = 'start_zone'
+    KIND_STOP_ZONE = 'stop_zone'
+    KIND_UPDATE_SCHEDULE = 'update_schedule'
+    KIND_CHOICES = [
+        (KIND_START_ZONE, 'Запустить полив зоны'),
+        (KIND_STOP_ZONE, 'Остановить полив зоны'),
+        (KIND_UPDATE_SCHEDULE, 'Обновить расписание зоны'),
+    ]
+    
+    STATUS_PENDING = 'pending'
+    STATUS_DELIVERED = 'delivered'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_EXPIRED = 'expired'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает доставки'),
+        (STATUS_DELIVERED, 'Доставлена'),
+        (STATUS_DONE, 'Выполнена'),
+        (STATUS_FAILED, 'Ошибка'),
+        (STATUS_EXPIRED, 'Просрочена'),
+        (STATUS_CANCELLED, 'Заменена новой'),
+    ]
+    # Команды, которые ещё могут быть доставлены
+    OPEN_STATUSES = (STATUS_PENDING, STATUS_DELIVERED)
+    
+    device = models.ForeignKey(DeviceToken, on_delete=models.CASCADE, related_name='commands', verbose_name='Контроллер')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name='Команда')
+    zone_id = models.BigIntegerField(null=True, blank=True, verbose_name='Зона')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name='Состояние')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток доставки')
+    error = models.CharField(max_length=200, blank=True, verbose_name='Ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создана')
+    delivered_at = models.DateTimeField(null=True, blank=True, verbose_name='Доставлена')
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершена')
+    
+    def __str__(self):
+        return f'{self.get_kind_display()} #{self.id} ({self.device.name})'
+    
+    class Meta:
+        verbose_name = 'Команда контроллеру'
+        verbose_name_plural = 'Команды контроллерам'
+        indexes = [
+            # Открытые команды контроллера по порядку
+            models.Index(fields=['device', 'status', 'id'], name='devicecommand_device_status'),
+            # Удаление завершённых команд (compact_history)
+            models.Index(fields=['created_at'], name='devicecommand_created_idx'),
+        ]
+
+
+class RequestProfile(models.Model):
+    """Профиль запроса, снятый по требованию сотрудника (см. main.profiling).
+    
+    ``profile`` - статистика cProfile в формате ``pstats`` (файл .prof),
+    ``queries`` - SQL-запросы по порядку со временем и планами выполнения.
+    """
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='Сотрудник')
+    method = models.CharField(max_length=10, verbose_name='Метод')
+    path = models.CharField(max_length=2000, verbose_name='Адрес')
+    view_name = models.CharField(max_length=200, blank=True, verbose_name='Представление')
+    status_code = models.PositiveSmallIntegerField(verbose_name='Статус ответа')
+    duration_ms = models.FloatField(verbose_name='Время ответа (мс)')
+    sql_time_ms = models.FloatField(verbose_name='Время SQL (мс)')
+    queries_count = models.PositiveIntegerField(verbose_name='SQL-запросов')
+    summary = models.TextField(blank=True, verbose_name='Самые долгие функции')
+    profile = models.BinaryField(verbose_name='Профиль (pstats)')
+    queries = models.JSONField(default=list, blank=True, verbose_name='SQL-запросы')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Снят')
+    
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.created_at:%d.%m.%Y %H:%M:%S})'
+    
+    class Meta:
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
@@ -0,0 +1,150 @@
+"""Решение о поливе по влажности почвы.
+
+Перед поливом по расписанию для каждой зоны берётся средняя влажность
+почвы за последние ``GARDEN_MOISTURE_WINDOW_MINUTES`` минут и
+сравнивается с порогами типа растений (``GARDEN_MOISTURE_THRESHOLDS``):
+
+* влажность не выше ``dry`` - полив полной длительности;
+* не ниже ``wet`` - полив пропускается;
+* между порогами - длительность уменьшается пропорционально.
+
+Зоны без показаний за это время поливаются как обычно.
+
+Расчёт идёт сразу по всем зонам массивами NumPy (``decide_watering``),
+без цикла по зонам на Python, и зависит только от входных данных,
+поэтому его можно проверять на синтетических показаниях без базы.
+Средняя влажность читается из пятиминутных агрегатов (main.rollups),
+а не из сырых показаний.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import SensorRollup
+from .rollups import bucket_start
+from .watering import flow_rates
+
+
+# Пороги влажности почвы (%) по типу растений; тип сравнивается без учёта
+# регистра, для остальных типов берутся пороги 'default'
+DEFAULT_MOISTURE_THRESHOLDS = {
+    'default': {'dry': 30, 'wet': 60},
+    'газон': {'dry': 25, 'wet': 45},
+    'овощи': {'dry': 35, 'wet': 65},
+    'цветы': {'dry': 30, 'wet': 55},
+    'кустарники': {'dry': 20, 'wet': 45},
+    'суккуленты': {'dry': 10, 'wet': 25},
+}
+
+# За сколько минут усредняются показания
+MOISTURE_WINDOW_MINUTES = 60
+
+# Сколько зон читается одним запросом
+MOISTURE_QUERY_CHUNK_SIZE = 5000
+
+
+def moisture_thresholds():
+    """Действующие пороги с учётом настроек"""
+    thresholds = dict(DEFAULT_MOISTURE_THRESHOLDS)
+    thresholds.update(getattr(settings, 'GARDEN_MOISTURE_THRESHOLDS', {}))
+    return {plant_type.strip().lower(): value for plant_type, value in thresholds.items()}
+
+
+def thresholds_for(plant_types, thresholds=None):
+    """Массивы порогов (dry, wet) для списка типов растений"""
+    thresholds = thresholds if thresholds is not None else moisture_thresholds()
+    default = thresholds['default']
+    names, inverse = np.unique(
+        np.array([(plant_type or '').strip().lower() for plant_type in plant_types], dtype=object),
+        return_inverse=True,
+    )
+    # Словарь разбирается по уникальным типам, дальше - индексирование массивов
+    known = [thresholds.get(name, default) for name in names]
+    dry = np.array([value['dry'] for value in known], dtype=np.float64)
+    wet = np.array([value['wet'] for value in known], dtype=np.float64)
+    return dry[inverse.reshape(-1)], wet[inverse.reshape(-1)]
+
+
+def zone_moisture(zone_index, values, zone_count, counts=None):
+    """Средняя влажность каждой зоны, NaN - если показаний нет.
+
+    ``zone_index[i]`` - номер зоны (0..zone_count-1) для ``values[i]``.
+    Без ``counts`` каждое значение - одно показание; с ``counts`` значения
+    считаются суммами ``counts[i]`` показаний (как в агрегатах).
+    """
+    zone_index = np.asarray(zone_index, dtype=np.int64)
+    totals = np.bincount(zone_index, weights=np.asarray(values, dtype=np.float64), minlength=zone_count)
+    if counts is None:
+        numbers = np.bincount(zone_index, minlength=zone_count).astype(np.float64)
+    else:
+        numbers = np.bincount(zone_index, weights=np.asarray(counts, dtype=np.float64), minlength=zone_count)
+    moisture = np.full(zone_count, np.nan)
+    np.divide(totals, numbers, out=moisture, where=numbers > 0)
+    return moisture
+
+
+def decide_watering(durations, moisture, dry, wet, areas=None, rates=None):
+    """Длительность (мин) и расход воды (л) полива каждой зоны.
+
+    ``moisture`` - средняя влажность (NaN - нет данных), ``dry``/``wet`` -
+    пороги, ``areas`` - площадь в м² (NaN - не указана). Длительность 0
+    означает, что полив пропускается. Расход не округлён.
+    """
+    durations = np.asarray(durations, dtype=np.float64)
+    moisture = np.asarray(moisture, dtype=np.float64)
+    dry = np.broadcast_to(np.asarray(dry, dtype=np.float64), durations.shape)
+    wet = np.broadcast_to(np.asarray(wet, dtype=np.float64), durations.shape)
+
+    span = wet - dry
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.clip((wet - moisture) / span, 0.0, 1.0)
+    # Совпадающие пороги: либо полный полив, либо пропуск
+    fraction = np.where(span > 0, fraction, (moisture < wet).astype(np.float64))
+    fraction = np.where(np.isnan(moisture), 1.0, fraction)
+    # Округление половины вверх, а не к чётному, как np.rint
+    minutes = np.floor(durations * fraction + 0.5).astype(np.int64)
+
+    per_zone, per_m2 = rates if rates is not None else flow_rates()
+    if areas is None:
+        rate = np.full(durations.shape, float(per_zone))
+    else:
+        areas = np.asarray(areas, dtype=np.float64)
+        rate = np.where(np.isnan(areas), float(per_zone), areas * float(per_m2))
+    return minutes, minutes * rate
+
+
+def recent_moisture(zone_ids, now=None, window_minutes=None):
+    """Средняя влажность зон ``zone_ids`` за последние ``window_minutes`` минут"""
+    now = now or timezone.now()
+    if window_minutes is None:
+        window_minutes = getattr(settings, 'GARDEN_MOISTURE_WINDOW_MINUTES', MOISTURE_WINDOW_MINUTES)
+    since = bucket_start(now - timedelta(minutes=window_minutes), SensorRollup.RESOLUTION_5MIN)
+
+    # Зона может встретиться несколько раз (несколько расписаний)
+    unique_ids, inverse = np.unique(np.asarray(zone_ids, dtype=np.int64), return_inverse=True)
+    found_ids, sums, counts = [], [], []
+    for start in range(0, len(unique_ids), MOISTURE_QUERY_CHUNK_SIZE):
+        rows = SensorRollup.objects.filter(
+            resolution=SensorRollup.RESOLUTION_5MIN,
+            zone_id__in=unique_ids[start:start + MOISTURE_QUERY_CHUNK_SIZE].tolist(),
+            bucket_start__gte=since,
+            bucket_start__lte=now,
+            soil_moisture_count__gt=0,
+        ).values_list('zone_id', 'soil_moisture_sum', 'soil_moisture_count')
+        for zone_id, total, count in rows:
+            found_ids.append(zone_id)
+            sums.append(total)
+            counts.append(count)
+
+    position = np.searchsorted(unique_ids, np.asarray(found_ids, dtype=np.int64))
+    moisture = zone_moisture(position, sums, len(unique_ids), counts=counts)
+    return moisture[inverse.reshape(-1)]
+
+
+def plan_watering(zone_ids, durations, plant_types, areas, now=None):
+    """Решение по зонам из базы: массивы (длительность, расход), как в ``decide_watering``"""
+    dry, wet = thresholds_for(plant_types)
+    areas = np.array([np.nan if area is None else float(area) for area in areas], dtype=np.float64)
+    return decide_watering(durations, recent_moisture(zone_ids, now), dry, wet, areas)
@@ -0,0 +1,65 @@
+"""Курсорная (keyset) пагинация по убыванию (дата, id).
+
+В отличие от OFFSET, каждая страница выбирается условием по индексу,
+поэтому страница N стоит столько же, сколько первая.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """Курсор не удалось разобрать"""
+
+
+def encode_cursor(value, pk):
+    raw = f'{value.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        value, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(value), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+
+
+class KeysetPage:
+    """Страница результатов и курсор следующей страницы"""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_paginate(queryset, field, cursor=None, limit=50):
+    """Вернуть страницу queryset, упорядоченного по (-field, -id).
+
+    ``cursor`` - значение ``next_cursor`` предыдущей страницы.
+    Выбирается ``limit + 1`` строк, чтобы узнать, есть ли продолжение.
+    """
+    queryset = queryset.order_by(f'-{field}', '-id')
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        # (field, id) < (value, pk) в виде, допускающем поиск по диапазону индекса
+        queryset = queryset.filter(**{f'{field}__lte': value}).exclude(Q(**{field: value}) & Q(id__gte=pk))
+    items = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return KeysetPage(items, next_cursor)
@@ -0,0 +1,139 @@
+"""Помесячное секционирование показаний и истории полива (PostgreSQL).
+
+Таблицы ``SensorReading`` и ``WateringLog`` в PostgreSQL секционированы
+по диапазону времени (см. миграцию 0008): одна секция на календарный
+месяц UTC (``<таблица>_pГГГГММ``) и секция по умолчанию для строк вне
+созданных месяцев. Запросы с условием по времени читают только нужные
+секции, а срок хранения (main.retention) удаляет целые секции вместо
+построчного DELETE.
+
+Первичный ключ секционированной таблицы включает столбец времени,
+поэтому на эти таблицы нельзя ссылаться внешними ключами.
+
+На SQLite все функции ничего не делают.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from .models import SensorReading, WateringLog
+
+
+# Модель и столбец, по которому она секционирована
+PARTITIONED_MODELS = (
+    (SensorReading, 'timestamp'),
+    (WateringLog, 'started_at'),
+)
+
+# На сколько месяцев вперёд создаются секции
+PARTITION_MONTHS_AHEAD = 2
+
+
+def month_start(moment):
+    """Начало месяца UTC, в который попадает ``moment``"""
+    moment = moment.astimezone(dt_timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y%m}'
+
+
+def is_partitioned(model):
+    """Секционирована ли таблица модели"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)',
+            [model._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(model):
+    """Помесячные секции таблицы: список (имя, начало, конец) по возрастанию"""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s)',
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    prefix = f'{table}_p'
+    for name in names:
+        suffix = name[len(prefix):]
+        if not name.startswith(prefix) or len(suffix) != 6 or not suffix.isdigit():
+            continue
+        start = datetime(int(suffix[:4]), int(suffix[4:]), 1, tzinfo=dt_timezone.utc)
+        partitions.append((name, start, add_months(start, 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(model, column, month):
+    """Создать секцию месяца ``month``. Возвращает False, если она уже есть.
+
+    Строки этого месяца, попавшие в секцию по умолчанию, переносятся в
+    новую секцию до её подключения.
+    """
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    name = partition_name(table, month)
+    if name in {partition[0] for partition in list_partitions(model)}:
+        return False
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {qn(table + "_default")} '
+            f"WHERE {qn(column)} >= '{start}' AND {qn(column)} < '{end}' RETURNING *) "
+            f'INSERT INTO {qn(name)} SELECT * FROM moved'
+        )
+        cursor.execute(f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES FROM ('{start}') TO ('{end}')")
+    return True
+
+
+def ensure_partitions(now=None, months_ahead=PARTITION_MONTHS_AHEAD):
+    """Создать секции текущего и следующих ``months_ahead`` месяцев.
+
+    Возвращает имена созданных секций.
+    """
+    created = []
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    for model, column in PARTITIONED_MODELS:
+        if not is_partitioned(model):
+            continue
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if create_partition(model, column, month):
+                created.append(partition_name(model._meta.db_table, month))
+    return created
+
+
+def drop_partitions_before(model, cutoff, before_drop=None):
+    """Удалить секции, все строки которых старше ``cutoff``.
+
+    ``before_drop(cursor, name)`` вызывается в той же транзакции перед
+    удалением секции. Возвращает число удалённых строк.
+    """
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    dropped = 0
+    for name, start, end in list_partitions(model):
+        if end > cutoff:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {qn(name)}')
+            dropped += cursor.fetchone()[0]
+            if before_drop:
+                before_drop(cursor, name)
+            cursor.execute(f'ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}')
+            cursor.execute(f'DROP TABLE {qn(name)}')
+    return dropped
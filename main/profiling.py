@@ -0,0 +1,199 @@
+"""Профилирование отдельных запросов по требованию сотрудника.
+
+Запрос сотрудника (``is_staff``) с параметром ``?_profile=1`` или
+заголовком ``X-Garden-Profile`` выполняется под cProfile, а все его
+SQL-запросы записываются с параметрами и временем. После ответа для
+самых долгих выборок снимаются планы выполнения (EXPLAIN без ANALYZE -
+сам запрос повторно не выполняется), и всё сохраняется в
+``RequestProfile``. В админке профиль скачивается файлом .prof (snakeviz,
+``python -m pstats``), SQL - файлом JSON; адрес профиля возвращается в
+заголовке ответа ``X-Garden-Profile``.
+
+Профилируется поток, в котором выполняется представление. Под WSGI это
+поток запроса. Под ASGI синхронные представления запроса выполняются в
+отдельном потоке этого запроса (``sync_to_async`` с thread_sensitive),
+и профилировщик включается и выключается в нём же; код асинхронных
+представлений в цикле событий в профиль не попадает, их SQL - тоже.
+
+Без параметра и заголовка ничего не ставится: ни профилировщик, ни
+обёртка SQL-запросов - остаётся проверка заголовка и строки запроса.
+"""
+import cProfile
+import io
+import marshal
+import pstats
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.urls import reverse
+
+from .models import RequestProfile
+
+
+# Параметр строки запроса и заголовок, включающие профилирование
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_GARDEN_PROFILE'
+# Заголовок ответа со ссылкой на сохранённый профиль
+PROFILE_RESPONSE_HEADER = 'X-Garden-Profile'
+
+# Для скольких самых долгих SQL-запросов снимается план выполнения
+PROFILE_EXPLAIN_QUERIES = 20
+
+# Сколько SQL-запросов сохраняется с текстом (остальные только считаются)
+PROFILE_MAX_QUERIES = 1000
+
+# Сколько строк статистики функций показывается в админке
+PROFILE_SUMMARY_LINES = 40
+
+# Сколько последних профилей хранится
+PROFILE_KEEP = 200
+
+
+def profiling_enabled():
+    return getattr(settings, 'GARDEN_PROFILING_ENABLED', True)
+
+
+def profile_requested(request):
+    """Запрошено ли профилирование (права не проверяются)"""
+    if PROFILE_HEADER in request.META:
+        return True
+    # Подстрока проверяется до разбора строки запроса в request.GET
+    return PROFILE_PARAM in request.META.get('QUERY_STRING', '') and PROFILE_PARAM in request.GET
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _json_params(params):
+    if isinstance(params, dict):
+        return {key: _json_value(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [_json_value(value) for value in params]
+    return None
+
+
+def _is_select(sql):
+    return sql.lstrip().upper().startswith(('SELECT', 'WITH'))
+
+
+def explain(connection, sql, params):
+    """План выполнения запроса текстом; при ошибке - текст ошибки"""
+    prefix = connection.ops.explain_query_prefix()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError as error:
+        return f'Ошибка: {error}'
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+
+class ProfileSession:
+    """Профилирование одного запроса.
+
+    ``start``, ``stop`` и ``save`` вызываются в потоке, где выполняется
+    представление: cProfile и подключения к базе привязаны к потоку.
+    """
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.wrappers = []
+        # (псевдоним базы, SQL, параметры, executemany, время)
+        self.queries = []
+        self.queries_count = 0
+        self.sql_time = 0.0
+        self.started = None
+        self.duration = None
+
+    def _capture(self, alias):
+        max_queries = getattr(settings, 'GARDEN_PROFILE_MAX_QUERIES', PROFILE_MAX_QUERIES)
+
+        def capture_queries(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                duration = time.perf_counter() - started
+                self.queries_count += 1
+                self.sql_time += duration
+                if len(self.queries) < max_queries:
+                    self.queries.append((alias, sql, params, many, duration))
+
+        return capture_queries
+
+    def start(self):
+        for connection in connections.all():
+            wrapper = self._capture(connection.alias)
+            connection.execute_wrappers.append(wrapper)
+            self.wrappers.append((connection, wrapper))
+        self.started = time.perf_counter()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.duration = time.perf_counter() - self.started
+        for connection, wrapper in self.wrappers:
+            connection.execute_wrappers.remove(wrapper)
+        self.wrappers = []
+
+    def query_report(self):
+        """SQL-запросы по порядку; у самых долгих выборок - план выполнения"""
+        explain_limit = getattr(settings, 'GARDEN_PROFILE_EXPLAIN_QUERIES', PROFILE_EXPLAIN_QUERIES)
+        selects = [index for index, query in enumerate(self.queries) if not query[3] and _is_select(query[1])]
+        selects.sort(key=lambda index: self.queries[index][4], reverse=True)
+        to_explain = set(selects[:explain_limit])
+        # Повторы одного запроса с теми же параметрами объясняются один раз
+        plans = {}
+        report = []
+        for index, (alias, sql, params, many, duration) in enumerate(self.queries):
+            entry = {
+                'alias': alias,
+                'sql': sql,
+                'params': None if many else _json_params(params),
+                'many': many,
+                'duration_ms': round(duration * 1000, 3),
+            }
+            if index in to_explain:
+                key = (alias, sql, repr(params))
+                if key not in plans:
+                    plans[key] = explain(connections[alias], sql, params)
+                entry['explain'] = plans[key]
+            report.append(entry)
+        return report
+
+    def save(self, request, response, user_id):
+        """Сохранить профиль в ``RequestProfile`` и удалить самые старые сверх ``GARDEN_PROFILE_KEEP``"""
+        summary = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=summary)
+        stats.sort_stats('cumulative').print_stats(PROFILE_SUMMARY_LINES)
+        match = getattr(request, 'resolver_match', None)
+        profile = RequestProfile.objects.create(
+            user_id=user_id,
+            method=request.method,
+            path=request.get_full_path()[:2000],
+            view_name=match.view_name if match is not None else '',
+            status_code=response.status_code,
+            duration_ms=round(self.duration * 1000, 3),
+            sql_time_ms=round(self.sql_time * 1000, 3),
+            queries_count=self.queries_count,
+            summary=summary.getvalue(),
+            # Формат файла Stats.dump_stats
+            profile=marshal.dumps(stats.stats),
+            queries=self.query_report(),
+        )
+        purge_profiles()
+        response[PROFILE_RESPONSE_HEADER] = reverse('admin:main_requestprofile_change', args=[profile.pk])
+        return profile
+
+
+def purge_profiles():
+    """Удалить профили сверх ``GARDEN_PROFILE_KEEP`` последних"""
+    keep = getattr(settings, 'GARDEN_PROFILE_KEEP', PROFILE_KEEP)
+    oldest_kept = RequestProfile.objects.order_by('-id').values_list('id', flat=True)[keep - 1:keep]
+    boundary = list(oldest_kept)
+    if boundary:
+        RequestProfile.objects.filter(id__lt=boundary[0]).delete()
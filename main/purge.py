@@ -0,0 +1,175 @@
+"""Удаление зон с большой историей.
+
+Удаление зоны одним ``zone.delete()`` стирает всю её историю (миллионы
+показаний) одной транзакцией: всё это время запись в базу заблокирована.
+Поэтому зона удаляется в два шага.
+
+``delete_zone`` только помечает зону (``deleted_at``): с этого момента
+менеджер ``GardenZone.objects`` её не возвращает, история зоны
+исключается из выборок пользователя, расписания удаляются сразу
+(контроллеры получают пустое расписание). Сама пометка не читает
+историю зоны.
+
+``purge_deleted_zones`` (шаг ``run_scheduler`` и команда
+``purge_deleted_zones``) удаляет историю помеченных зон порциями. Каждая
+порция - один DELETE по диапазону времени зоны (индекс (zone, время),
+в PostgreSQL отсекаются секции) без загрузки строк и каскада. Размер
+порции подстраивается так, чтобы DELETE держал блокировку не дольше
+``GARDEN_ZONE_PURGE_MAX_LOCK_MS``. Поливы каждой порции вычитаются из
+агрегатов главной страницы (main.stats) вместе с её удалением, поэтому
+до удаления истории счётчик поливов пользователя их ещё учитывает.
+Когда история удалена, удаляется и сама строка зоны.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .cache import invalidate_user
+from .models import DailyWaterUsage, GardenZone, SensorReading, SensorRollup, WateringLog
+from .stats import add_waterings, refresh_zone_counts
+
+
+logger = logging.getLogger(__name__)
+
+# Начальный, наименьший и наибольший размер порции (строк)
+ZONE_PURGE_BATCH_SIZE = 5000
+ZONE_PURGE_MIN_BATCH_SIZE = 100
+ZONE_PURGE_MAX_BATCH_SIZE = 100000
+
+# Сколько миллисекунд может длиться один DELETE
+ZONE_PURGE_MAX_LOCK_MS = 200
+
+# Пауза между порциями (секунды): ожидающая запись успевает получить
+# блокировку, иначе SQLite отдаёт её снова удалению
+ZONE_PURGE_PAUSE = 0.02
+
+
+def _targets():
+    """Таблицы истории зоны: (модель, поле времени, доп. условия)"""
+    targets = [(SensorReading, 'timestamp', {}), (WateringLog, 'started_at', {})]
+    targets += [(SensorRollup, 'bucket_start', {'resolution': resolution}) for resolution, _ in SensorRollup.RESOLUTION_CHOICES]
+    targets.append((DailyWaterUsage, 'day', {}))
+    return targets
+
+
+def delete_zone(zone):
+    """Пометить зону удалённой; история удаляется позже ``purge_deleted_zones``.
+
+    Возвращает False, если зона уже помечена.
+    """
+    with transaction.atomic():
+        marked = GardenZone.all_objects.filter(id=zone.id, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        if not marked:
+            return False
+        # Расписаний у зоны немного: удаляются с сигналами, контроллеры
+        # получают пустое расписание зоны
+        for schedule in zone.schedules.all():
+            schedule.delete()
+        refresh_zone_counts(zone.user_id)
+    invalidate_user(zone.user_id)
+    return True
+
+
+class BatchSizer:
+    """Размер порции по времени предыдущего DELETE"""
+
+    def __init__(self, batch_size=None, max_lock_ms=None):
+        self.batch_size = batch_size or ZONE_PURGE_BATCH_SIZE
+        self.max_lock = (max_lock_ms or getattr(settings, 'GARDEN_ZONE_PURGE_MAX_LOCK_MS', ZONE_PURGE_MAX_LOCK_MS)) / 1000
+        self.slowest = 0.0
+
+    def record(self, rows, elapsed):
+        self.slowest = max(self.slowest, elapsed)
+        if elapsed > self.max_lock:
+            self.batch_size = max(ZONE_PURGE_MIN_BATCH_SIZE, self.batch_size // 2)
+        elif elapsed < self.max_lock / 4 and rows >= self.batch_size:
+            self.batch_size = min(ZONE_PURGE_MAX_BATCH_SIZE, self.batch_size * 2)
+
+
+def _delete_batch(queryset, field, batch_size, user_id=None):
+    """Удалить самые старые ``batch_size`` строк выборки одним DELETE.
+
+    Возвращает число строк и время самого DELETE (секунды): границу
+    порции ищет чтение, которое запись не блокирует. С ``user_id``
+    (записи полива) поливы порции вычитаются из агрегатов пользователя
+    в одной транзакции с удалением.
+    """
+    boundary = list(queryset.order_by(field).values_list(field, flat=True)[batch_size - 1:batch_size])
+    if boundary:
+        queryset = queryset.filter(**{f'{field}__lte': boundary[0]})
+    totals = None
+    if user_id is not None:
+        # Читается до транзакции: у помеченной зоны новых поливов не
+        # появляется, а порция по индексу (зона, время) невелика
+        totals = queryset.aggregate(count=Count('id'), water=Sum('water_used'))
+    with transaction.atomic():
+        started = time.monotonic()
+        # Без сборщика каскада: строки не загружаются, у таблиц истории нет
+        # ни обработчиков удаления, ни зависимых таблиц
+        rows = queryset._raw_delete(queryset.db)
+        elapsed = time.monotonic() - started
+        if totals and totals['count']:
+            add_waterings(user_id, -totals['count'], -(totals['water'] or 0))
+    return rows, elapsed
+
+
+def purge_zone(zone, sizer=None, pause=0, deadline=None, progress=None):
+    """Удалить историю помеченной зоны и саму зону.
+
+    Возвращает число удалённых строк истории и признак, что зона
+    удалена полностью (False - вышло время ``deadline``).
+    """
+    sizer = sizer or BatchSizer()
+    deleted = 0
+    for model, field, filters in _targets():
+        queryset = model.objects.filter(zone_id=zone.id, **filters)
+        user_id = zone.user_id if model is WateringLog else None
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                return deleted, False
+            rows, elapsed = _delete_batch(queryset, field, sizer.batch_size, user_id)
+            sizer.record(rows, elapsed)
+            if not rows:
+                break
+            deleted += rows
+            if progress:
+                progress(zone, model._meta.db_table, deleted)
+            if pause:
+                time.sleep(pause)
+    # История удалена: каскад строки зоны уже ничего не загружает
+    zone.delete()
+    if deleted:
+        invalidate_user(zone.user_id)
+    return deleted, True
+
+
+def purge_deleted_zones(batch_size=None, max_lock_ms=None, pause=None, time_budget=None, progress=None):
+    """Удалить историю зон, помеченных ``delete_zone``.
+
+    ``pause`` - пауза между порциями (по умолчанию
+    ``GARDEN_ZONE_PURGE_PAUSE``). ``time_budget`` (секунды) ограничивает
+    работу за вызов: оставшееся удалится при следующем.
+    ``progress(зона, таблица, удалено строк зоны)`` вызывается после
+    каждой порции. Возвращает словарь с числом полностью удалённых зон,
+    строк истории, ещё не удалённых зон и самым долгим DELETE (мс).
+    """
+    if pause is None:
+        pause = getattr(settings, 'GARDEN_ZONE_PURGE_PAUSE', ZONE_PURGE_PAUSE)
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    sizer = BatchSizer(batch_size, max_lock_ms)
+    result = {'zones': 0, 'rows': 0, 'pending': 0}
+    zones = GardenZone.all_objects.filter(deleted_at__isnull=False).order_by('deleted_at')
+    for zone in zones:
+        rows, done = purge_zone(zone, sizer, pause, deadline, progress)
+        result['rows'] += rows
+        if not done:
+            result['pending'] = GardenZone.all_objects.filter(deleted_at__isnull=False).count()
+            break
+        result['zones'] += 1
+        logger.info('Зона %s удалена вместе с историей (%d строк)', zone.id, rows)
+    result['slowest_delete_ms'] = round(sizer.slowest * 1000, 1)
+    return result
@@ -0,0 +1,180 @@
+"""Сроки хранения истории и сжатие базы.
+
+Сырые показания датчиков и записи полива старше срока из
+``settings.GARDEN_RETENTION_DAYS`` удаляются небольшими порциями: каждая
+порция - отдельный короткий DELETE по первичному ключу, поэтому запись
+в базу блокируется ненадолго и приём показаний не останавливается.
+Агрегаты показаний (``SensorRollup``) и расход воды по дням
+(``DailyWaterUsage``) хранятся всегда.
+
+В PostgreSQL таблицы секционированы по месяцам (main.partitions):
+секции, целиком вышедшие за срок, удаляются сразу, порциями удаляется
+только остаток в пограничной секции.
+
+Удалённые записи полива вычитаются из агрегатов главной страницы
+(main.stats), как и при удалении зоны.
+"""
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .cache import invalidate_all
+from .models import DeviceCommand, GardenZone, SensorReading, WateringLog
+from .partitions import drop_partitions_before, is_partitioned
+from .stats import add_waterings
+
+
+# Сроки по умолчанию (дни), None - хранить всегда
+DEFAULT_RETENTION_DAYS = {
+    'sensor_readings': 30,
+    'watering_logs': None,
+    # Завершённые команды контроллерам (main.device_commands)
+    'device_commands': 7,
+}
+
+# Сколько строк удаляется за одну транзакцию
+RETENTION_BATCH_SIZE = 2000
+
+# Сколько страниц освобождает один шаг PRAGMA incremental_vacuum
+VACUUM_PAGES_PER_STEP = 1000
+
+
+def retention_days():
+    """Действующие сроки хранения с учётом настроек"""
+    days = dict(DEFAULT_RETENTION_DAYS)
+    days.update(getattr(settings, 'GARDEN_RETENTION_DAYS', {}))
+    return days
+
+
+def cutoff_for(days, now=None):
+    """Граница удаления для срока ``days`` (None - не удалять)"""
+    if days is None:
+        return None
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def _expired_ids(queryset, field, cutoff, last_id, batch_size):
+    return list(
+        queryset.filter(id__gt=last_id, **{f'{field}__lt': cutoff})
+        .order_by('id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+
+
+def delete_expired_readings(cutoff, batch_size=RETENTION_BATCH_SIZE, pause=0):
+    """Удалить показания старше ``cutoff``. Возвращает число удалённых строк."""
+    deleted = 0
+    if is_partitioned(SensorReading):
+        deleted += drop_partitions_before(SensorReading, cutoff)
+    last_id = 0
+    while True:
+        # id выбираются вне транзакции записи, сам DELETE - один короткий запрос
+        ids = _expired_ids(SensorReading.objects.all(), 'timestamp', cutoff, last_id, batch_size)
+        if not ids:
+            if deleted:
+                invalidate_all()
+            return deleted
+        SensorReading.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+        last_id = ids[-1]
+        if pause:
+            time.sleep(pause)
+
+
+def delete_expired_logs(cutoff, batch_size=RETENTION_BATCH_SIZE, pause=0):
+    """Удалить записи полива старше ``cutoff`` с поправкой агрегатов пользователей"""
+    deleted = 0
+    if is_partitioned(WateringLog):
+        deleted += drop_partitions_before(WateringLog, cutoff, before_drop=_discount_partition)
+    last_id = 0
+    while True:
+        ids = _expired_ids(WateringLog.objects.all(), 'started_at', cutoff, last_id, batch_size)
+        if not ids:
+            if deleted:
+                invalidate_all()
+            return deleted
+        totals = list(
+            WateringLog.objects.filter(id__in=ids)
+            .values('zone__user_id')
+            .annotate(count=Count('id'), water=Sum('water_used'))
+            .order_by()
+        )
+        with transaction.atomic():
+            WateringLog.objects.filter(id__in=ids).delete()
+            for row in totals:
+                add_waterings(row['zone__user_id'], -row['count'], -(row['water'] or 0))
+        deleted += len(ids)
+        last_id = ids[-1]
+        if pause:
+            time.sleep(pause)
+
+
+def _discount_partition(cursor, name):
+    """Вычесть записи полива секции из агрегатов пользователей"""
+    qn = connection.ops.quote_name
+    cursor.execute(
+        f'SELECT z.{qn("user_id")}, COUNT(*), SUM(l.{qn("water_used")}) FROM {qn(name)} l '
+        f'JOIN {qn(GardenZone._meta.db_table)} z ON z.{qn("id")} = l.{qn("zone_id")} '
+        f'GROUP BY z.{qn("user_id")}'
+    )
+    for user_id, count, water in cursor.fetchall():
+        add_waterings(user_id, -count, -(water or 0))
+
+
+def count_expired(cutoffs):
+    """Сколько строк будет удалено при заданных границах (для --dry-run)"""
+    counts = {}
+    if cutoffs.get('sensor_readings') is not None:
+        counts['sensor_readings'] = SensorReading.objects.filter(timestamp__lt=cutoffs['sensor_readings']).count()
+    if cutoffs.get('watering_logs') is not None:
+        counts['watering_logs'] = WateringLog.objects.filter(started_at__lt=cutoffs['watering_logs']).count()
+    if cutoffs.get('device_commands') is not None:
+        counts['device_commands'] = DeviceCommand.objects.filter(created_at__lt=cutoffs['device_commands']).exclude(
+            status__in=DeviceCommand.OPEN_STATUSES,
+        ).count()
+    return counts
+
+
+def database_size():
+    """Размер базы в байтах (SQLite - файлы с журналом WAL), None для других СУБД"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_database_size(current_database())')
+            return cursor.fetchone()[0]
+    if connection.vendor != 'sqlite':
+        return None
+    name = str(connection.settings_dict['NAME'])
+    return sum(os.path.getsize(path) for path in (name, name + '-wal') if os.path.exists(path))
+
+
+def incremental_vacuum(pages_per_step=VACUUM_PAGES_PER_STEP, pause=0):
+    """Вернуть свободные страницы SQLite файловой системе.
+
+    Освобождение идёт шагами по ``pages_per_step`` страниц. Если база
+    создана без ``auto_vacuum = INCREMENTAL``, режим включается, что
+    требует одного полного VACUUM. Возвращает 'incremental', 'full'
+    или None для других СУБД.
+    """
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum')
+        if cursor.fetchone()[0] != 2:
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            cursor.execute('VACUUM')
+            return 'full'
+        while True:
+            cursor.execute('PRAGMA freelist_count')
+            if not cursor.fetchone()[0]:
+                break
+            cursor.execute(f'PRAGMA incremental_vacuum({int(pages_per_step)})')
+            # Страницы освобождаются по мере чтения результата
+            cursor.fetchall()
+            if pause:
+                time.sleep(pause)
+    return 'incremental'
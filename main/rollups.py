@@ -0,0 +1,284 @@
+"""Агрегаты (rollups) показаний датчиков: 5 минут, час, сутки.
+
+Для каждой зоны и интервала хранятся минимум, максимум, сумма и
+количество по каждой величине. Агрегаты дополняются по мере поступления
+показаний (``RollupBuffer``): показания группируются в памяти и
+записываются одним upsert'ом на интервал, где минимум/максимум и суммы
+объединяются на стороне базы. Поэтому графики и средние за длинные
+периоды читают сотни строк агрегатов вместо миллионов показаний.
+
+Пятиминутные и часовые интервалы выровнены по UTC, суточные - по
+локальным суткам ``TIME_ZONE``. Изменение и удаление показаний агрегаты
+не затрагивает; пересчитать их можно командой ``backfill_rollups``.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.utils import timezone
+
+from .models import SensorReading, SensorRollup
+
+
+RESOLUTIONS = (SensorRollup.RESOLUTION_5MIN, SensorRollup.RESOLUTION_HOUR, SensorRollup.RESOLUTION_DAY)
+
+METRICS = ('soil_moisture', 'temperature', 'humidity')
+
+# Сколько агрегатов записывается одним INSERT ... ON CONFLICT
+ROLLUP_UPSERT_BATCH_SIZE = 500
+
+# Ограничение на число точек в ответе по умолчанию
+ROLLUP_DEFAULT_MAX_POINTS = 500
+
+
+@lru_cache(maxsize=4096)
+def _local_day_start(timestamp):
+    tz = timezone.get_default_timezone()
+    local = datetime.fromtimestamp(timestamp, tz)
+    return timezone.make_aware(datetime.combine(local.date(), time.min), tz)
+
+
+def bucket_start(moment, resolution):
+    """Начало интервала ``resolution``, в который попадает ``moment``"""
+    timestamp = int(moment.timestamp())
+    if resolution == SensorRollup.RESOLUTION_DAY:
+        # Смещения часовых поясов кратны 5 минутам, поэтому границы
+        # суток можно кэшировать по пятиминутным интервалам
+        return _local_day_start(timestamp - timestamp % SensorRollup.RESOLUTION_5MIN)
+    return datetime.fromtimestamp(timestamp - timestamp % resolution, dt_timezone.utc)
+
+
+class RollupBuffer:
+    """Накопитель агрегатов для пакета показаний.
+
+    ``add`` группирует показания по (зона, интервал), ``flush``
+    дописывает накопленное в базу и очищает буфер.
+    """
+
+    def __init__(self, resolutions=RESOLUTIONS):
+        self.resolutions = resolutions
+        self.buckets = {}
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def add(self, zone_id, timestamp, soil_moisture, temperature, humidity):
+        values = (soil_moisture, temperature, humidity)
+        for resolution in self.resolutions:
+            key = (zone_id, resolution, bucket_start(timestamp, resolution))
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                # readings_count, затем [min, max, sum, count] по каждой величине
+                bucket = self.buckets[key] = [0, [None, None, 0, 0], [None, None, 0, 0], [None, None, 0, 0]]
+            bucket[0] += 1
+            for stats, value in zip(bucket[1:], values):
+                if value is None:
+                    continue
+                if stats[0] is None or value < stats[0]:
+                    stats[0] = value
+                if stats[1] is None or value > stats[1]:
+                    stats[1] = value
+                stats[2] += value
+                stats[3] += 1
+
+    def add_reading(self, reading):
+        # Значения несохранённого из БД объекта могут быть строками (create(temperature='21.5'))
+        values = [SensorReading._meta.get_field(metric).to_python(getattr(reading, metric)) for metric in METRICS]
+        self.add(reading.zone_id, reading.timestamp, *values)
+
+    def flush(self):
+        """Записать накопленные агрегаты. Возвращает число затронутых строк."""
+        if not self.buckets:
+            return 0
+        rows = [
+            (zone_id, resolution, start, bucket[0], *(value for stats in bucket[1:] for value in stats))
+            for (zone_id, resolution, start), bucket in self.buckets.items()
+        ]
+        self.buckets = {}
+        with transaction.atomic():
+            for index in range(0, len(rows), ROLLUP_UPSERT_BATCH_SIZE):
+                _upsert(rows[index:index + ROLLUP_UPSERT_BATCH_SIZE])
+        return len(rows)
+
+
+def _columns():
+    columns = ['zone_id', 'resolution', 'bucket_start', 'readings_count']
+    for metric in METRICS:
+        columns += [f'{metric}_min', f'{metric}_max', f'{metric}_sum', f'{metric}_count']
+    return columns
+
+
+def _merge_sql(table, column, function):
+    """Выражение для объединения минимума/максимума с уже сохранённым"""
+    old, new = f'{table}.{column}', f'excluded.{column}'
+    if connection.vendor == 'sqlite':
+        # Скалярные MIN/MAX в SQLite возвращают NULL, если один из аргументов NULL
+        return f'COALESCE({function}({old}, {new}), {old}, {new})'
+    # LEAST/GREATEST (PostgreSQL) пропускают NULL
+    return f"{'LEAST' if function == 'MIN' else 'GREATEST'}({old}, {new})"
+
+
+def _upsert(rows):
+    qn = connection.ops.quote_name
+    table = qn(SensorRollup._meta.db_table)
+    columns = _columns()
+    fields = [SensorRollup._meta.get_field(column.removesuffix('_id')) for column in columns]
+
+    updates = []
+    for column in columns[3:]:
+        if column.endswith('_min'):
+            updates.append(f'{qn(column)} = {_merge_sql(table, qn(column), "MIN")}')
+        elif column.endswith('_max'):
+            updates.append(f'{qn(column)} = {_merge_sql(table, qn(column), "MAX")}')
+        else:
+            updates.append(f'{qn(column)} = {table}.{qn(column)} + excluded.{qn(column)}')
+
+    placeholders = '(%s)' % ', '.join(['%s'] * len(columns))
+    sql = (
+        f'INSERT INTO {table} ({", ".join(qn(column) for column in columns)}) '
+        f'VALUES {", ".join([placeholders] * len(rows))} '
+        f'ON CONFLICT ({qn("zone_id")}, {qn("resolution")}, {qn("bucket_start")}) '
+        f'DO UPDATE SET {", ".join(updates)}'
+    )
+    # Само подключение, а не прокси django.db.connection: обращение
+    # через прокси на каждое значение заметно замедляет большие пакеты
+    db = connections[DEFAULT_DB_ALIAS]
+    params = [
+        field.get_db_prep_save(value, db)
+        for row in rows
+        for field, value in zip(fields, row)
+    ]
+    with db.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def record_readings(readings):
+    """Дописать показания (сохранённые SensorReading) в агрегаты"""
+    buffer = RollupBuffer()
+    for reading in readings:
+        buffer.add_reading(reading)
+    return buffer.flush()
+
+
+# Чтение
+
+
+def choose_resolution(start, end, max_points=ROLLUP_DEFAULT_MAX_POINTS):
+    """Интервал агрегатов для диапазона [start, end).
+
+    Берётся самый подробный интервал, при котором число точек не
+    превышает ``max_points``; для очень длинных диапазонов - сутки.
+    """
+    seconds = (end - start).total_seconds()
+    for resolution in RESOLUTIONS:
+        if seconds / resolution <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def _metric_data(row, metric):
+    count = row[f'{metric}_count']
+    minimum, maximum, total = row[f'{metric}_min'], row[f'{metric}_max'], row[f'{metric}_sum']
+    if metric == 'temperature':
+        minimum = float(minimum) if minimum is not None else None
+        maximum = float(maximum) if maximum is not None else None
+        total = float(total)
+    return {
+        'min': minimum,
+        'max': maximum,
+        'avg': round(total / count, 2) if count else None,
+        'count': count,
+    }
+
+
+def query_rollups(zone_id, start, end, max_points=ROLLUP_DEFAULT_MAX_POINTS, resolution=None):
+    """Агрегаты зоны за [start, end) с автоматическим выбором интервала.
+
+    Возвращает (resolution, points), где points - список словарей по
+    интервалам в порядке времени.
+    """
+    if resolution is None:
+        resolution = choose_resolution(start, end, max_points)
+    rows = (
+        SensorRollup.objects
+        .filter(
+            zone_id=zone_id,
+            resolution=resolution,
+            bucket_start__gte=bucket_start(start, resolution),
+            bucket_start__lt=end,
+        )
+        .order_by('bucket_start')
+        .values('bucket_start', 'readings_count', *_columns()[4:])
+    )
+    points = [
+        {
+            'bucket_start': row['bucket_start'].isoformat(),
+            'readings_count': row['readings_count'],
+            **{metric: _metric_data(row, metric) for metric in METRICS},
+        }
+        for row in rows
+    ]
+    return resolution, points
+
+
+# Пересчёт
+
+
+def backfill_rollups(zone_ids=None, chunk_size=50000, progress=None, since=None):
+    """Пересчитать агрегаты по сохранённым показаниям.
+
+    Существующие агрегаты (всех или указанных зон) удаляются, затем
+    показания читаются порциями по ``chunk_size`` в порядке id, и каждая
+    порция записывается отдельной транзакцией, поэтому память не зависит
+    от объёма таблицы. Показания, поступившие во время пересчёта,
+    учитываются обычным путём. Возвращает число обработанных показаний.
+
+    ``since`` ограничивает пересчёт интервалами начиная с первых суток,
+    которые начинаются не раньше этого момента. Агрегаты более ранних
+    периодов, сырые показания которых уже удалены (``compact_history``),
+    сохраняются - в том числе агрегаты суток, удалённых лишь частично.
+    Без ``since`` удаляются все агрегаты: для истории, сжатой сроками
+    хранения, это единственная копия.
+    """
+    rollups = SensorRollup.objects.all()
+    readings = SensorReading.objects.all()
+    if zone_ids is not None:
+        rollups = rollups.filter(zone_id__in=zone_ids)
+        readings = readings.filter(zone_id__in=zone_ids)
+    if since is not None:
+        # Граница суток - граница интервалов всех разрешений
+        day = bucket_start(since, SensorRollup.RESOLUTION_DAY)
+        if day < since:
+            # Сутки длятся 23-25 часов: через 36 часов - уже следующие
+            day = bucket_start(day + timedelta(hours=36), SensorRollup.RESOLUTION_DAY)
+        since = day
+        rollups = rollups.filter(bucket_start__gte=since)
+        readings = readings.filter(timestamp__gte=since)
+
+    with transaction.atomic():
+        rollups.delete()
+        # Всё, что новее max_id, уже попадает в агрегаты при сохранении
+        max_id = SensorReading.objects.order_by('-id').values_list('id', flat=True).first()
+    if max_id is None:
+        return 0
+
+    processed = 0
+    last_id = 0
+    fields = ('id', 'zone_id', 'timestamp', *METRICS)
+    while True:
+        chunk = list(
+            readings.filter(id__gt=last_id, id__lte=max_id)
+            .order_by('id')
+            .values_list(*fields)[:chunk_size]
+        )
+        if not chunk:
+            break
+        buffer = RollupBuffer()
+        for _, zone_id, timestamp, soil_moisture, temperature, humidity in chunk:
+            buffer.add(zone_id, timestamp, soil_moisture, temperature, humidity)
+        buffer.flush()
+        last_id = chunk[-1][0]
+        processed += len(chunk)
+        if progress:
+            progress(processed)
+    return processed
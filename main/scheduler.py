@@ -0,0 +1,292 @@
+"""Исполнитель расписаний полива.
+
+Для каждого активного расписания вычисляется ближайшее время запуска,
+и все они хранятся в куче (min-heap). На каждом шаге извлекаются только
+наступившие запуски, поэтому шаг стоит O(k log n), где k - число
+сработавших расписаний, а не O(n) по всем расписаниям.
+
+Изменения расписаний подгружаются инкрементально по ``updated_at``.
+Удалённые и выключенные расписания отбрасываются при срабатывании:
+перед записью полива расписания перечитываются одним запросом.
+
+Перед записью длительность каждого полива уточняется по влажности
+почвы зоны (main.moisture): полив укорачивается или пропускается, если
+почва достаточно влажная. Отключается ``GARDEN_MOISTURE_CONTROL = False``.
+
+Время берётся из объекта «часов», поэтому планировщик можно прогонять
+на ``SimulatedClock`` без реального ожидания.
+"""
+import heapq
+import logging
+import time as time_module
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.utils import timezone
+
+from .devices import expire_offline_devices
+from .models import WateringLog, WateringSchedule, day_bit
+from .moisture import plan_watering
+from .purge import purge_deleted_zones
+from .watering import create_watering_logs, liters, water_used_for
+
+logger = logging.getLogger(__name__)
+
+SYNC_OVERLAP_SECONDS = 5
+
+# Сколько секунд за шаг синхронизации уходит на удаление истории удалённых зон
+ZONE_PURGE_TIME_BUDGET = 5
+
+
+class SystemClock:
+    """Реальные часы"""
+
+    def now(self):
+        return timezone.now()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time_module.sleep(seconds)
+
+
+class SimulatedClock:
+    """Часы для тестов: sleep() мгновенно переводит время вперёд"""
+
+    def __init__(self, start):
+        self.current = start
+
+    def now(self):
+        return self.current
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.current += timedelta(seconds=seconds)
+
+    def advance(self, **kwargs):
+        self.current += timedelta(**kwargs)
+
+
+def _localize(day, at, tz):
+    """Локальные дата и время -> aware datetime с учётом перехода на летнее время.
+
+    Несуществующее время (весенний перевод) сдвигается вперёд на величину
+    перевода, неоднозначное (осенний) берётся в первом вхождении.
+    """
+    local = datetime.combine(day, at, tzinfo=tz)
+    normalized = local.astimezone(dt_timezone.utc).astimezone(tz)
+    if normalized.replace(tzinfo=None) != local.replace(tzinfo=None):
+        return normalized
+    return local
+
+
+def next_fire_time(at, days_mask, after, tz):
+    """Ближайший момент строго после ``after``, когда сработает расписание.
+
+    ``at`` - время суток, ``days_mask`` - битовая маска дней недели
+    (см. ``WateringSchedule.days_mask``). Возвращает None, если дней нет.
+    """
+    if not days_mask:
+        return None
+    local_after = after.astimezone(tz)
+    for offset in range(8):
+        day = local_after.date() + timedelta(days=offset)
+        if not days_mask & day_bit(day.isoweekday()):
+            continue
+        moment = _localize(day, at, tz)
+        if moment > after:
+            return moment
+    return None
+
+
+class ScheduleEntry:
+    """Данные расписания, нужные планировщику"""
+
+    __slots__ = ('schedule_id', 'time', 'days_mask', 'version')
+
+    def __init__(self, schedule_id, at, days_mask, version=0):
+        self.schedule_id = schedule_id
+        self.time = at
+        self.days_mask = days_mask
+        self.version = version
+
+
+class Scheduler:
+    """Планировщик поливов по расписаниям"""
+
+    def __init__(self, clock=None, tz=None, batch_size=1000):
+        self.clock = clock or SystemClock()
+        self.tz = tz or ZoneInfo(settings.TIME_ZONE)
+        self.batch_size = batch_size
+        self.entries = {}
+        self.heap = []
+        self.last_sync = None
+
+    # Загрузка расписаний
+
+    def _schedules(self):
+        return WateringSchedule.objects.filter(is_active=True).values_list('id', 'time', 'days_mask')
+
+    def load(self):
+        """Полная загрузка активных расписаний"""
+        # updated_at проставляет база по реальному времени, а не по self.clock
+        self.last_sync = timezone.now()
+        self.entries = {}
+        self.heap = []
+        now = self.clock.now()
+        for schedule_id, at, days_mask in self._schedules().iterator(chunk_size=5000):
+            entry = ScheduleEntry(schedule_id, at, days_mask)
+            self.entries[schedule_id] = entry
+            fire_at = next_fire_time(entry.time, entry.days_mask, now, self.tz)
+            if fire_at is not None:
+                self.heap.append((fire_at, schedule_id, entry.version))
+        heapq.heapify(self.heap)
+        logger.info('Загружено расписаний: %d', len(self.entries))
+
+    def sync(self):
+        """Подгрузить расписания, изменённые с прошлой синхронизации"""
+        # Перекрытие на случай транзакций, зафиксированных позже своего updated_at
+        since = self.last_sync - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+        self.last_sync = timezone.now()
+        changed = (
+            WateringSchedule.objects.filter(updated_at__gte=since)
+            .values_list('id', 'time', 'days_mask', 'is_active')
+        )
+        now = self.clock.now()
+        count = 0
+        for schedule_id, at, days_mask, is_active in changed.iterator(chunk_size=5000):
+            count += 1
+            old = self.entries.pop(schedule_id, None)
+            if not is_active:
+                # Старая запись в куче станет недействительной по версии
+                continue
+            entry = ScheduleEntry(schedule_id, at, days_mask, old.version + 1 if old else 0)
+            self.entries[schedule_id] = entry
+            fire_at = next_fire_time(entry.time, entry.days_mask, now, self.tz)
+            if fire_at is not None:
+                heapq.heappush(self.heap, (fire_at, schedule_id, entry.version))
+        return count
+
+    # Выполнение
+
+    def next_fire_at(self):
+        """Время ближайшего запуска (пропуская устаревшие записи кучи)"""
+        while self.heap:
+            fire_at, schedule_id, version = self.heap[0]
+            entry = self.entries.get(schedule_id)
+            if entry is not None and entry.version == version:
+                return fire_at
+            heapq.heappop(self.heap)
+        return None
+
+    def pop_due(self, now):
+        """Извлечь расписания, время которых наступило, и запланировать следующие запуски"""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            fire_at, schedule_id, version = heapq.heappop(self.heap)
+            entry = self.entries.get(schedule_id)
+            if entry is None or entry.version != version:
+                continue
+            due.append((schedule_id, fire_at))
+            # Пропущенные за время простоя запуски выполняются один раз
+            next_at = next_fire_time(entry.time, entry.days_mask, max(fire_at, now), self.tz)
+            if next_at is not None:
+                heapq.heappush(self.heap, (next_at, schedule_id, version))
+        return due
+
+    def execute(self, due):
+        """Записать поливы для сработавших расписаний пакетами. Возвращает число записей."""
+        created = 0
+        for start in range(0, len(due), self.batch_size):
+            created += self._execute_batch(due[start:start + self.batch_size])
+        return created
+
+    def _execute_batch(self, due):
+        # Полив записывается временем срабатывания, а не временем записи:
+        # после простоя или на SimulatedClock они различаются
+        fire_times = dict(due)
+        # Перечитываем расписания: удалённые и выключенные отбрасываются здесь
+        schedules = list(
+            WateringSchedule.objects.filter(id__in=list(fire_times), is_active=True)
+            .values_list('id', 'zone_id', 'zone__user_id', 'zone__watering_duration', 'zone__plant_type', 'zone__area_size')
+        )
+        if getattr(settings, 'GARDEN_MOISTURE_CONTROL', True):
+            durations, water = plan_watering(
+                [schedule[1] for schedule in schedules],
+                [schedule[3] for schedule in schedules],
+                [schedule[4] for schedule in schedules],
+                [schedule[5] for schedule in schedules],
+                now=self.clock.now(),
+            )
+            durations, water = durations.tolist(), [liters(value) for value in water.tolist()]
+        else:
+            durations = [schedule[3] for schedule in schedules]
+            water = [water_used_for(schedule[3], schedule[5]) for schedule in schedules]
+
+        logs_by_user = {}
+        skipped = 0
+        for (schedule_id, zone_id, user_id, *_), duration, water_used in zip(schedules, durations, water):
+            if duration <= 0:
+                skipped += 1
+                continue
+            log = WateringLog(
+                zone_id=zone_id,
+                started_at=fire_times[schedule_id],
+                duration=duration,
+                is_manual=False,
+                water_used=water_used,
+            )
+            logs_by_user.setdefault(user_id, []).append(log)
+        if skipped:
+            logger.info('Пропущено поливов по влажности почвы: %d', skipped)
+
+        alive = {schedule_id for schedule_id, *_ in schedules}
+        for schedule_id in set(fire_times) - alive:
+            self.entries.pop(schedule_id, None)
+
+        return create_watering_logs(logs_by_user, batch_size=self.batch_size)
+
+    def tick(self):
+        """Один шаг: выполнить все наступившие запуски"""
+        due = self.pop_due(self.clock.now())
+        if not due:
+            return 0
+        created = self.execute(due)
+        logger.info('Сработало расписаний: %d, записей полива: %d', len(due), created)
+        return created
+
+    def purge_zones(self):
+        """Удалить часть истории удалённых зон, не дольше ``GARDEN_ZONE_PURGE_TIME_BUDGET`` секунд"""
+        budget = getattr(settings, 'GARDEN_ZONE_PURGE_TIME_BUDGET', ZONE_PURGE_TIME_BUDGET)
+        result = purge_deleted_zones(time_budget=budget)
+        if result['rows'] or result['zones']:
+            logger.info(
+                'Удаление зон: удалено зон %d, строк истории %d, осталось зон %d',
+                result['zones'], result['rows'], result['pending'],
+            )
+        return result
+
+    def run(self, reload_interval=30, max_sleep=60, until=None):
+        """Основной цикл. ``until`` ограничивает работу (для симуляции)."""
+        if self.last_sync is None:
+            self.load()
+        next_sync = self.clock.now() + timedelta(seconds=reload_interval)
+        while until is None or self.clock.now() < until:
+            self.tick()
+            now = self.clock.now()
+            if now >= next_sync:
+                self.sync()
+                # Системы, от которых давно нет сигналов, помечаются офлайн
+                # и тогда, когда сигналы не приходят ни в один процесс
+                expire_offline_devices()
+                # История удалённых зон удаляется порциями (main.purge)
+                self.purge_zones()
+                next_sync = now + timedelta(seconds=reload_interval)
+
+            wake_at = min(next_sync, self.clock.now() + timedelta(seconds=max_sleep))
+            fire_at = self.next_fire_at()
+            if fire_at is not None:
+                wake_at = min(wake_at, fire_at)
+            if until is not None:
+                wake_at = min(wake_at, until)
+            self.clock.sleep((wake_at - self.clock.now()).total_seconds())
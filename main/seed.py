@@ -0,0 +1,209 @@
+"""Синтетические данные для нагрузочных тестов и бенчмарков.
+
+``seed_garden`` создаёт пользователей с зонами и расписаниями и историю
+за ``days`` суток: показания датчиков каждой зоны с шагом
+``reading_interval`` минут и поливы по расписаниям (плюс редкие ручные).
+Всё вставляется через ``bulk_create`` порциями, агрегаты показаний и
+расход по дням дописываются по ходу вставки, счётчики пользователей
+пересчитываются в конце. При одном и том же ``seed`` объёмы и значения
+совпадают, сдвигается только время - история заканчивается сейчас.
+"""
+import math
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ALL_DAYS_MASK, GardenZone, SensorReading, UserProfile, WateringLog, WateringSchedule
+from .partitions import PARTITIONED_MODELS, add_months, create_partition, is_partitioned, month_start
+from .rollups import RollupBuffer
+from .stats import add_daily_usage, rebuild_user_stats
+from .watering import water_used_for
+
+
+# Сколько строк вставляется одним bulk_create
+SEED_BATCH_SIZE = 5000
+
+PLANT_TYPES = ['Газон', 'Томаты', 'Огурцы', 'Розы', 'Клубника', 'Смородина', '']
+
+# Доля дней с дополнительным ручным поливом зоны
+MANUAL_WATERING_RATE = 0.05
+
+
+class SeedError(ValueError):
+    """Данные с таким префиксом уже есть"""
+
+
+def _create_users(count, prefix, password):
+    usernames = [f'{prefix}_{index}' for index in range(count)]
+    if User.objects.filter(username__in=usernames).exists():
+        raise SeedError(f'Пользователи {prefix}_* уже есть, укажите другой префикс')
+    # Хэш пароля медленный намеренно - считается один раз на всех
+    password_hash = make_password(password)
+    users = User.objects.bulk_create(User(username=username, password=password_hash) for username in usernames)
+    UserProfile.objects.bulk_create(UserProfile(user=user) for user in users)
+    return users
+
+
+def _create_zones(users, zones_per_user, rnd):
+    return GardenZone.objects.bulk_create(
+        (
+            GardenZone(
+                user=user,
+                name=f'Зона {index + 1}',
+                plant_type=rnd.choice(PLANT_TYPES),
+                area_size=Decimal(rnd.randint(500, 5000)) / 100,
+                watering_duration=rnd.choice([10, 15, 20, 30]),
+            )
+            for user in users
+            for index in range(zones_per_user)
+        ),
+        batch_size=SEED_BATCH_SIZE,
+    )
+
+
+def _create_schedules(zones, schedules_per_zone, rnd):
+    return WateringSchedule.objects.bulk_create(
+        (
+            WateringSchedule(
+                zone=zone,
+                time=time(rnd.choice([5, 6, 7, 19, 20, 21]), rnd.choice([0, 15, 30, 45])),
+                days_mask=ALL_DAYS_MASK if rnd.random() < 0.5 else rnd.randint(1, ALL_DAYS_MASK),
+            )
+            for zone in zones
+            for _ in range(schedules_per_zone)
+        ),
+        batch_size=SEED_BATCH_SIZE,
+    )
+
+
+def _create_partitions(start, end):
+    """Секции PostgreSQL на весь период истории (на SQLite ничего не делает)"""
+    for model, column in PARTITIONED_MODELS:
+        if not is_partitioned(model):
+            continue
+        month = month_start(start)
+        while month <= end:
+            create_partition(model, column, month)
+            month = add_months(month, 1)
+
+
+def _readings(zone, start, end, step, rnd):
+    """Показания зоны: влажность почвы медленно падает, температура следует за сутками"""
+    moisture = rnd.uniform(30, 70)
+    moment = start
+    while moment < end:
+        moisture = min(max(moisture + rnd.uniform(-1.5, 1.2), 10), 90)
+        hour = moment.hour + moment.minute / 60
+        temperature = 18 + 8 * math.sin((hour - 9) / 24 * 2 * math.pi) + rnd.uniform(-2, 2)
+        yield SensorReading(
+            zone_id=zone.id,
+            timestamp=moment,
+            soil_moisture=round(moisture),
+            temperature=Decimal(f'{temperature:.1f}'),
+            humidity=rnd.randint(35, 95),
+        )
+        moment += step
+
+
+def _logs(zone, schedules, start, end, rnd):
+    """Поливы зоны по её расписаниям и редкие ручные"""
+    day = timezone.localtime(start).date()
+    last_day = timezone.localtime(end).date()
+    while day <= last_day:
+        weekday = day.isoweekday()
+        moments = [(schedule.time, False) for schedule in schedules if schedule.runs_on(weekday)]
+        if rnd.random() < MANUAL_WATERING_RATE:
+            moments.append((time(rnd.randint(8, 18), rnd.randint(0, 59)), True))
+        for moment, is_manual in moments:
+            started_at = timezone.make_aware(datetime.combine(day, moment))
+            if not start <= started_at < end:
+                continue
+            duration = max(zone.watering_duration + rnd.randint(-5, 5), 1)
+            yield WateringLog(
+                zone_id=zone.id,
+                started_at=started_at,
+                duration=duration,
+                water_used=water_used_for(duration, zone.area_size),
+                is_manual=is_manual,
+            )
+        day += timedelta(days=1)
+
+
+def _save_readings(batch):
+    rollups = RollupBuffer()
+    for reading in batch:
+        rollups.add_reading(reading)
+    with transaction.atomic():
+        SensorReading.objects.bulk_create(batch)
+        rollups.flush()
+
+
+def _save_logs(batch):
+    with transaction.atomic():
+        WateringLog.objects.bulk_create(batch)
+        add_daily_usage(batch)
+
+
+def _insert(rows, save, kind, progress):
+    """Вставить строки порциями по ``SEED_BATCH_SIZE``, каждая - своей транзакцией"""
+    inserted = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= SEED_BATCH_SIZE:
+            save(batch)
+            inserted += len(batch)
+            batch = []
+            if progress:
+                progress(kind, inserted)
+    if batch:
+        save(batch)
+        inserted += len(batch)
+    return inserted
+
+
+def seed_garden(users=10, zones_per_user=5, schedules_per_zone=2, days=365, reading_interval=30,
+                prefix='seed', password='garden', seed=0, progress=None):
+    """Создать синтетических пользователей с историей.
+
+    ``reading_interval`` - шаг показаний в минутах. ``progress(вид,
+    вставлено)`` вызывается после каждой порции истории. Пароль у всех
+    пользователей ``password``. Возвращает словарь с числом созданных
+    строк по видам.
+    """
+    rnd = random.Random(seed)
+    end = timezone.now().replace(second=0, microsecond=0)
+    start = end - timedelta(days=days)
+
+    with transaction.atomic():
+        created_users = _create_users(users, prefix, password)
+        zones = _create_zones(created_users, zones_per_user, rnd)
+        schedules = _create_schedules(zones, schedules_per_zone, rnd)
+    _create_partitions(start, end)
+
+    schedules_by_zone = {}
+    for schedule in schedules:
+        schedules_by_zone.setdefault(schedule.zone_id, []).append(schedule)
+    step = timedelta(minutes=reading_interval)
+    readings = _insert(
+        (reading for zone in zones for reading in _readings(zone, start, end, step, rnd)),
+        _save_readings, 'readings', progress,
+    )
+    logs = _insert(
+        (log for zone in zones for log in _logs(zone, schedules_by_zone.get(zone.id, []), start, end, rnd)),
+        _save_logs, 'waterings', progress,
+    )
+    # bulk_create не отправляет сигналы: счётчики пересчитываются целиком
+    rebuild_user_stats([user.id for user in created_users])
+    return {
+        'users': len(created_users),
+        'zones': len(zones),
+        'schedules': len(schedules),
+        'readings': readings,
+        'waterings': logs,
+    }
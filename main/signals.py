@@ -0,0 +1,100 @@
+from django.db.models import Count, Sum
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import invalidate_user
+from .device_commands import enqueue_command, schedule_payload
+from .events import publish_on_commit, reading_event, watering_event
+from .models import DeviceCommand, GardenZone, SensorReading, WateringLog, WateringSchedule
+from .rollups import record_readings
+from .stats import add_daily_usage, add_waterings, refresh_zone_counts
+
+
+@receiver(post_save, sender=SensorReading)
+def publish_sensor_reading(sender, instance, created, **kwargs):
+    """Отправить новое показание датчика подписчикам пользователя"""
+    if created:
+        publish_on_commit(instance.zone.user_id, [reading_event(instance)])
+
+
+@receiver(post_save, sender=SensorReading)
+def rollup_sensor_reading(sender, instance, created, **kwargs):
+    """Дописать новое показание в агрегаты (main.rollups)"""
+    if created:
+        record_readings([instance])
+
+
+@receiver(post_save, sender=WateringLog)
+def publish_watering_log(sender, instance, created, **kwargs):
+    """Отправить новую запись полива подписчикам пользователя"""
+    if created:
+        publish_on_commit(instance.zone.user_id, [watering_event(instance)])
+
+
+# Агрегаты главной страницы (main.stats).
+# На удаление WateringLog намеренно нет обработчика: он заставил бы
+# каскадное удаление зоны загружать всю историю. Удаление зоны
+# учитывается целиком в pre_delete.
+
+@receiver(post_save, sender=WateringLog)
+def count_watering_log(sender, instance, created, **kwargs):
+    if created:
+        add_waterings(instance.zone.user_id, 1, instance.water_used)
+
+
+@receiver(post_save, sender=WateringLog)
+def count_daily_usage(sender, instance, created, **kwargs):
+    if created:
+        add_daily_usage([instance])
+
+
+@receiver(pre_delete, sender=GardenZone)
+def discount_zone_logs(sender, instance, **kwargs):
+    # Поливы зоны, помеченной удалённой, вычтены при удалении её истории (main.purge)
+    if instance.deleted_at is not None:
+        return
+    totals = WateringLog.objects.filter(zone=instance).aggregate(count=Count('id'), water=Sum('water_used'))
+    if totals['count']:
+        add_waterings(instance.user_id, -totals['count'], -(totals['water'] or 0))
+
+
+@receiver(post_save, sender=GardenZone)
+@receiver(post_delete, sender=GardenZone)
+def count_zones(sender, instance, **kwargs):
+    if kwargs.get('created', True):
+        refresh_zone_counts(instance.user_id)
+
+
+@receiver(post_save, sender=WateringSchedule)
+@receiver(post_delete, sender=WateringSchedule)
+def count_schedules(sender, instance, **kwargs):
+    refresh_zone_counts(instance.zone.user_id)
+
+
+@receiver(post_save, sender=WateringSchedule)
+@receiver(post_delete, sender=WateringSchedule)
+def queue_schedule_update(sender, instance, raw=False, **kwargs):
+    """Отправить контроллерам новое расписание зоны (main.device_commands)"""
+    if not raw:
+        enqueue_command(
+            instance.zone.user_id, DeviceCommand.KIND_UPDATE_SCHEDULE, instance.zone_id, schedule_payload(instance.zone_id),
+        )
+
+
+# Кэш пользователя (main.cache).
+# Удаление WateringLog и SensorReading отдельно не отслеживается по той же
+# причине, что и выше: каскад от зоны покрывает обработчик GardenZone,
+# массовые удаления сбрасывают кэш явно.
+
+@receiver(post_save, sender=GardenZone)
+@receiver(post_delete, sender=GardenZone)
+def invalidate_zone_cache(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=WateringSchedule)
+@receiver(post_delete, sender=WateringSchedule)
+@receiver(post_save, sender=WateringLog)
+@receiver(post_save, sender=SensorReading)
+def invalidate_zone_data_cache(sender, instance, **kwargs):
+    invalidate_user(instance.zone.user_id)
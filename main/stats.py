@@ -0,0 +1,207 @@
+"""Агрегаты пользователя для главной страницы.
+
+Количество зон, активных расписаний, поливов и общий расход воды
+хранятся в ``SystemStatus`` и обновляются при изменении данных
+(см. ``main.signals``), поэтому главная страница читает одну строку
+вместо агрегации по всей истории полива.
+
+Массовые операции, которые обходят сигналы (``bulk_create``, прямой
+SQL), должны сами вызывать ``add_waterings``. Если у пользователя ещё
+нет ``SystemStatus``, обновления пропускаются: строка будет создана с
+полным пересчётом при первом обращении (``get_user_stats``). Расхождения находит
+``check_user_stats``, исправляет ``rebuild_user_stats``.
+
+Расход воды по зонам и локальным суткам (``DailyWaterUsage``, для
+main.analytics) дополняется теми же путями записи через
+``add_daily_usage``. Он не уменьшается при удалении истории по сроку
+хранения; по сохранившимся записям его пересчитывает ``rebuild_daily_usage``.
+"""
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .cache import invalidate_user
+from .models import DailyWaterUsage, GardenZone, SystemStatus, WateringLog, WateringSchedule
+
+
+STATS_FIELDS = ('zones_count', 'active_schedules_count', 'waterings_count', 'total_water_used')
+
+USAGE_FIELDS = ('waterings_count', 'water_used', 'manual_count', 'manual_water_used')
+
+# Сколько строк расхода по дням записывается одним INSERT ... ON CONFLICT
+USAGE_UPSERT_BATCH_SIZE = 500
+
+# Сколько зон пересчитывается одним запросом в rebuild_daily_usage
+USAGE_REBUILD_ZONES_CHUNK = 200
+
+
+def compute_user_stats(user_id):
+    """Полный пересчёт агрегатов пользователя по исходным таблицам"""
+    # Поливы зон, помеченных удалёнными, учитываются, пока их история не
+    # удалена (main.purge)
+    logs = WateringLog.objects.filter(zone__user_id=user_id).aggregate(
+        count=Count('id'),
+        water=Sum('water_used'),
+    )
+    return {
+        'zones_count': GardenZone.objects.filter(user_id=user_id).count(),
+        'active_schedules_count': WateringSchedule.objects.filter(zone__user_id=user_id, is_active=True).count(),
+        'waterings_count': logs['count'],
+        'total_water_used': (logs['water'] or Decimal('0')).quantize(Decimal('0.01')),
+    }
+
+
+def _users(user_ids=None):
+    users = User.objects.order_by('id').values_list('id', flat=True)
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+    return users
+
+
+def rebuild_user_stats(user_ids=None):
+    """Пересчитать и сохранить агрегаты (всех или указанных пользователей)"""
+    rebuilt = 0
+    for user_id in _users(user_ids).iterator():
+        values = compute_user_stats(user_id)
+        SystemStatus.objects.update_or_create(user_id=user_id, defaults=values)
+        invalidate_user(user_id)
+        rebuilt += 1
+    return rebuilt
+
+
+def check_user_stats(user_ids=None):
+    """Сравнить сохранённые агрегаты с полным пересчётом.
+
+    Возвращает список (user_id, поле, сохранено, пересчитано) для расхождений.
+    """
+    stored = {
+        row['user_id']: row
+        for row in SystemStatus.objects.filter(user_id__in=_users(user_ids)).values('user_id', *STATS_FIELDS)
+    }
+    mismatches = []
+    for user_id in _users(user_ids).iterator():
+        expected = compute_user_stats(user_id)
+        actual = stored.get(user_id)
+        for field in STATS_FIELDS:
+            value = actual[field] if actual else None
+            if value != expected[field]:
+                mismatches.append((user_id, field, value, expected[field]))
+    return mismatches
+
+
+def refresh_zone_counts(user_id):
+    """Обновить количество зон и активных расписаний пользователя.
+
+    Таблицы зон и расписаний небольшие, поэтому здесь дешевле
+    пересчитать значения, чем отслеживать каждое изменение is_active.
+    """
+    SystemStatus.objects.filter(user_id=user_id).update(
+        zones_count=GardenZone.objects.filter(user_id=user_id).count(),
+        active_schedules_count=WateringSchedule.objects.filter(zone__user_id=user_id, is_active=True).count(),
+    )
+
+
+def add_waterings(user_id, count, water_used):
+    """Прибавить к агрегатам пользователя ``count`` поливов и ``water_used`` литров"""
+    SystemStatus.objects.filter(user_id=user_id).update(
+        waterings_count=F('waterings_count') + count,
+        total_water_used=F('total_water_used') + (water_used or 0),
+    )
+
+
+def get_user_stats(user):
+    """SystemStatus пользователя; при первом обращении агрегаты пересчитываются"""
+    try:
+        return SystemStatus.objects.get(user=user)
+    except SystemStatus.DoesNotExist:
+        rebuild_user_stats([user.id])
+        return SystemStatus.objects.get(user=user)
+
+
+# Расход воды по дням
+
+def _upsert_usage(rows, replace=False):
+    """Записать строки (zone_id, day, поливов, литров, ручных, литров вручную).
+
+    Значения прибавляются к сохранённым, с ``replace`` - заменяют их.
+    """
+    qn = connection.ops.quote_name
+    table = qn(DailyWaterUsage._meta.db_table)
+    columns = ('zone_id', 'day') + USAGE_FIELDS
+    fields = [DailyWaterUsage._meta.get_field(column.removesuffix('_id')) for column in columns]
+    if replace:
+        updates = [f'{qn(column)} = excluded.{qn(column)}' for column in USAGE_FIELDS]
+    else:
+        updates = [f'{qn(column)} = {table}.{qn(column)} + excluded.{qn(column)}' for column in USAGE_FIELDS]
+
+    placeholders = '(%s)' % ', '.join(['%s'] * len(columns))
+    sql = (
+        f'INSERT INTO {table} ({", ".join(qn(column) for column in columns)}) '
+        f'VALUES {", ".join([placeholders] * len(rows))} '
+        f'ON CONFLICT ({qn("zone_id")}, {qn("day")}) DO UPDATE SET {", ".join(updates)}'
+    )
+    params = [
+        field.get_db_prep_save(value, connection)
+        for row in rows
+        for field, value in zip(fields, row)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _write_usage(totals, replace=False):
+    rows = [(zone_id, day, *values) for (zone_id, day), values in totals.items()]
+    for index in range(0, len(rows), USAGE_UPSERT_BATCH_SIZE):
+        _upsert_usage(rows[index:index + USAGE_UPSERT_BATCH_SIZE], replace=replace)
+    return len(rows)
+
+
+def add_daily_usage(logs):
+    """Прибавить сохранённые записи полива к расходу по дням. Возвращает число строк."""
+    totals = {}
+    for log in logs:
+        key = (log.zone_id, timezone.localdate(log.started_at))
+        values = totals.setdefault(key, [0, Decimal('0'), 0, Decimal('0')])
+        water = Decimal(str(log.water_used or 0))
+        values[0] += 1
+        values[1] += water
+        if log.is_manual:
+            values[2] += 1
+            values[3] += water
+    return _write_usage(totals)
+
+
+def rebuild_daily_usage(zone_ids=None):
+    """Пересчитать расход по дням по записям полива.
+
+    Заменяются только сутки, за которые есть записи: расход за дни,
+    история которых удалена по сроку хранения, сохраняется.
+    Возвращает число записанных строк.
+    """
+    zones = GardenZone.objects.order_by('id').values_list('id', flat=True)
+    if zone_ids is not None:
+        zones = zones.filter(id__in=zone_ids)
+    zones = list(zones)
+    written = 0
+    for start in range(0, len(zones), USAGE_REBUILD_ZONES_CHUNK):
+        rows = (
+            WateringLog.objects.filter(zone_id__in=zones[start:start + USAGE_REBUILD_ZONES_CHUNK])
+            .annotate(day=TruncDate('started_at'))
+            .values_list('zone_id', 'day', 'is_manual')
+            .annotate(count=Count('id'), water=Sum('water_used'))
+            .order_by()
+        )
+        totals = {}
+        for zone_id, day, is_manual, count, water in rows:
+            values = totals.setdefault((zone_id, day), [0, Decimal('0'), 0, Decimal('0')])
+            values[0] += count
+            values[1] += water or 0
+            if is_manual:
+                values[2] += count
+                values[3] += water or 0
+        written += _write_usage(totals, replace=True)
+    return written
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from main.changelist import estimate_rows
+from main.models import GardenZone, SensorReading, WateringLog
+
+
+class LargeTableAdminTests(TestCase):
+    """Списки показаний и поливов в админке: курсорные страницы и оценка числа строк"""
+    
+    def setUp(self):
+        user = User.objects.create_user(username='gardener', password='secret')
+        self.zone = GardenZone.objects.create(user=user, name='Грядка у забора')
+        self.other_zone = GardenZone.objects.create(user=user, name='Газон')
+        now = timezone.now().replace(microsecond=0)
+        # Пары показаний с одинаковым временем: порядок внутри пары - по id
+        SensorReading.objects.bulk_create(
+            SensorReading(
+                zone=self.zone if index % 3 else self.other_zone,
+                timestamp=now - timedelta(minutes=index // 2),
+                soil_moisture=index % 100,
+            )
+            for index in range(250)
+        )
+        WateringLog.objects.bulk_create(
+            WateringLog(zone=self.zone, started_at=now - timedelta(hours=index), duration=5, water_used=25, is_manual=index % 2 == 0)
+            for index in range(300)
+        )
+        admin = User.objects.create_superuser('root', password='secret')
+        self.client.force_login(admin)
+    
+    def walk(self, url):
+        """Пройти все страницы по ссылке «Дальше»: (id по страницам, списки)"""
+        pages, changelists = [], []
+        while True:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            cl = response.context['cl']
+            self.assertTrue(cl.keyset)
+            pages.append([obj.id for obj in cl.result_list])
+            changelists.append(cl)
+            if not cl.next_cursor:
+                return pages, changelists
+            url = f'{url.split("?")[0]}{cl.next_page_url}'
+    
+    def test_next_pages_follow_time_and_id(self):
+        pages, changelists = self.walk('/admin/main/sensorreading/')
+        self.assertEqual([len(page) for page in pages], [100, 100, 50])
+        expected = list(SensorReading.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        self.assertEqual(sum(pages, []), expected)
+        # Со второй страницы есть ссылка на первую, без курсора
+        self.assertIsNone(changelists[0].cursor)
+        self.assertEqual(changelists[2].first_page_url, '?')
+        response = self.client.get(f'/admin/main/sensorreading/{changelists[2].first_page_url}')
+        self.assertEqual([obj.id for obj in response.context['cl'].result_list], pages[0])
+        self.assertContains(response, 'Дальше')
+    
+    def test_filter_and_search_with_cursor(self):
+        pages, changelists = self.walk('/admin/main/wateringlog/?is_manual__exact=1')
+        ids = sum(pages, [])
+        self.assertEqual(ids, list(WateringLog.objects.filter(is_manual=True).order_by('-started_at', '-id').values_list('id', flat=True)))
+        self.assertEqual(len(pages), 2)
+        # Фильтр переносится в ссылку «Дальше», курсор - не переносится в ссылки фильтров
+        self.assertIn('is_manual__exact=1', changelists[0].next_page_url)
+        self.assertNotIn('cursor', changelists[1].get_query_string({'is_manual__exact': 0}))
+        
+        pages, _ = self.walk('/admin/main/sensorreading/?q=забора')
+        ids = sum(pages, [])
+        self.assertEqual(ids, list(SensorReading.objects.filter(zone=self.zone).order_by('-timestamp', '-id').values_list('id', flat=True)))
+        pages, _ = self.walk(f'/admin/main/sensorreading/?q={self.other_zone.id}')
+        self.assertEqual(set(SensorReading.objects.filter(id__in=sum(pages, [])).values_list('zone_id', flat=True)), {self.other_zone.id})
+    
+    def test_invalid_cursor(self):
+        response = self.client.get('/admin/main/sensorreading/?cursor=broken')
+        self.assertRedirects(response, '/admin/main/sensorreading/?e=1', fetch_redirect_response=False)
+    
+    def test_sorted_column_uses_page_numbers(self):
+        response = self.client.get('/admin/main/sensorreading/?o=3&p=2')
+        cl = response.context['cl']
+        self.assertFalse(cl.keyset)
+        self.assertEqual(cl.result_count, 250)
+        self.assertEqual(len(cl.result_list), 100)
+    
+    @override_settings(GARDEN_ADMIN_COUNT_LIMIT=100)
+    def test_estimated_and_capped_count(self):
+        # Дыры в id завышают оценку, но COUNT(*) по таблице не выполняется
+        SensorReading.objects.filter(id__in=SensorReading.objects.order_by('id').values('id')[10:20]).delete()
+        self.assertEqual(estimate_rows(SensorReading), 250)
+        response = self.client.get('/admin/main/sensorreading/')
+        cl = response.context['cl']
+        self.assertTrue(cl.paginator.estimated)
+        self.assertEqual(cl.result_count, 250)
+        self.assertContains(response, 'около 250')
+        
+        # Отфильтрованная выборка считается не дальше предела
+        response = self.client.get('/admin/main/wateringlog/?is_manual__exact=1')
+        cl = response.context['cl']
+        self.assertTrue(cl.paginator.capped)
+        self.assertEqual(cl.result_count, 100)
+        self.assertContains(response, 'больше 100')
+        
+        response = self.client.get(f'/admin/main/sensorreading/?q={self.other_zone.id}')
+        cl = response.context['cl']
+        self.assertFalse(cl.paginator.capped or cl.paginator.estimated)
+        self.assertEqual(cl.result_count, SensorReading.objects.filter(zone=self.other_zone).count())
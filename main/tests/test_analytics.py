@@ -0,0 +1,103 @@
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from main import views
+from main.analytics import usage_report
+from main.models import DailyWaterUsage, GardenZone, WateringLog, WateringSchedule, days_to_mask
+
+
+def at_noon(day):
+    return timezone.make_aware(datetime.combine(day, time(12, 0)))
+
+
+@override_settings(GARDEN_FLOW_RATE_LITERS_PER_MINUTE=5, GARDEN_FLOW_RATE_PER_M2=2)
+class UsageAnalyticsTests(TestCase):
+    """Расход воды по дням и прогноз по расписаниям"""
+    
+    def setUp(self):
+        caches[getattr(settings, 'GARDEN_CACHE_ALIAS', 'default')].clear()
+        self.user = User.objects.create_user(username='gardener', password='secret')
+        self.beds = GardenZone.objects.create(user=self.user, name='Грядки', watering_duration=10)
+        self.lawn = GardenZone.objects.create(user=self.user, name='Газон', watering_duration=5, area_size=4)
+        self.idle = GardenZone.objects.create(user=self.user, name='Теплица')
+        neighbour = User.objects.create_user(username='neighbour', password='secret')
+        self.other = GardenZone.objects.create(user=neighbour, name='Чужая зона')
+        
+        # 10.06.2026 - среда
+        self.today = date(2026, 6, 10)
+        yesterday = self.today - timedelta(days=1)
+        for zone, day, water, manual in [
+            (self.beds, yesterday, 20, False),
+            (self.beds, yesterday, 30, False),
+            (self.beds, yesterday, 14, True),
+            (self.beds, self.today - timedelta(days=3), 25, False),
+            (self.other, yesterday, 100, False),
+        ]:
+            WateringLog.objects.create(zone=zone, started_at=at_noon(day), duration=5, water_used=water, is_manual=manual)
+        
+        WateringSchedule.objects.create(zone=self.beds, time=time(7, 0))
+        WateringSchedule.objects.create(zone=self.lawn, time=time(7, 0), days_mask=days_to_mask([1, 3]))
+        WateringSchedule.objects.create(zone=self.idle, time=time(7, 0), is_active=False)
+    
+    def test_daily_usage(self):
+        self.assertEqual(DailyWaterUsage.objects.get(zone=self.beds, day=self.today - timedelta(days=1)).waterings_count, 3)
+        report = usage_report(self.user.id, self.today - timedelta(days=3), self.today, 0, today=self.today)
+        self.assertEqual(report['days'], ['2026-06-07', '2026-06-08', '2026-06-09', '2026-06-10'])
+        zones = {zone['zone_name']: zone for zone in report['zones']}
+        self.assertEqual(list(zones), ['Грядки', 'Газон', 'Теплица'])
+        self.assertEqual(zones['Грядки']['usage'], [25.0, 0.0, 64.0, 0.0])
+        self.assertEqual(zones['Грядки']['total'], 89.0)
+        self.assertEqual(zones['Газон']['usage'], [0.0] * 4)
+        self.assertEqual(report['total']['usage'], [25.0, 0.0, 64.0, 0.0])
+        self.assertEqual(report['total']['total'], 89.0)
+    
+    def test_forecast(self):
+        report = usage_report(self.user.id, self.today, self.today, 7, today=self.today)
+        self.assertEqual(report['forecast_days'][0], '2026-06-11')
+        self.assertEqual(len(report['forecast_days']), 7)
+        zones = {zone['zone_name']: zone for zone in report['zones']}
+        # Средний полив по расписанию (20 + 30 + 25) / 3 плюс ручные 14 л за 28 дней
+        self.assertEqual(zones['Грядки']['forecast'], [25.5] * 7)
+        # Истории нет: 5 мин × 4 м² × 2 л/мин·м² по понедельникам и средам
+        self.assertEqual(zones['Газон']['forecast'], [0, 0, 0, 0, 40, 0, 40])
+        self.assertEqual(zones['Теплица']['forecast'], [0] * 7)
+        self.assertEqual(report['total']['forecast_total'], 25.5 * 7 + 80)
+    
+    def test_api_is_cached_per_user(self):
+        self.client.force_login(self.user)
+        today = timezone.localdate()
+        params = {'start': (today - timedelta(days=6)).isoformat(), 'end': today.isoformat(), 'forecast_days': 3}
+        with mock.patch.object(views, 'usage_report', wraps=usage_report) as report:
+            first = self.client.get('/api/analytics/usage/', params).json()
+            self.assertEqual(first, usage_report(self.user.id, today - timedelta(days=6), today, 3, today=today))
+            self.assertEqual(self.client.get('/api/analytics/usage/', params).json(), first)
+            self.assertEqual(report.call_count, 1)
+            
+            # Новый полив сбрасывает кэш пользователя
+            with self.captureOnCommitCallbacks(execute=True):
+                WateringLog.objects.create(zone=self.lawn, started_at=timezone.now(), duration=5, water_used=7)
+            second = self.client.get('/api/analytics/usage/', params).json()
+            self.assertEqual(report.call_count, 2)
+            self.assertEqual(second['total']['total'], first['total']['total'] + 7)
+            
+            self.client.force_login(self.other.user)
+            data = self.client.get('/api/analytics/usage/', params).json()
+            self.assertEqual(report.call_count, 3)
+            self.assertEqual([zone['zone_id'] for zone in data['zones']], [self.other.id])
+    
+    def test_api_rejects_bad_range(self):
+        self.client.force_login(self.user)
+        for params in [
+            {'start': '2026-06-10', 'end': '2026-06-01'},
+            {'start': '2025-01-01', 'end': '2026-06-01'},
+            {'forecast_days': 91},
+        ]:
+            response = self.client.get('/api/analytics/usage/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
@@ -0,0 +1,122 @@
+import io
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, TransactionTestCase
+from django.utils import timezone
+
+from main.cache import cache_stats, reset_cache_stats
+from main.models import GardenZone, SensorReading, WateringLog, WateringSchedule
+from main.watering import create_watering_logs, start_zone_watering, water_used_for
+
+
+class CacheInvalidationTests(TransactionTestCase):
+    """После фиксации любой записи кэш пользователя не отдаёт старые данные.
+
+    TransactionTestCase: кэш сбрасывается в ``transaction.on_commit``,
+    а внутри TestCase транзакция теста не фиксируется.
+    """
+    
+    def setUp(self):
+        caches[getattr(settings, 'GARDEN_CACHE_ALIAS', 'default')].clear()
+        self.user = User.objects.create_user(username='gardener', password='secret')
+        self.zone = GardenZone.objects.create(user=self.user, name='Грядки')
+        self.other_zone = GardenZone.objects.create(user=self.user, name='Газон')
+        self.client.force_login(self.user)
+    
+    def zone_status(self):
+        return self.client.get(f'/api/zone/{self.zone.id}/status/').json()
+    
+    def zones_status(self):
+        return {zone['zone_id'] for zone in self.client.get('/api/zones/status/').json()['zones']}
+    
+    def test_repeated_request_is_cached(self):
+        reset_cache_stats()
+        self.zone_status()
+        self.zone_status()
+        self.assertEqual(cache_stats()['zone_status']['hits'], 1)
+    
+    def test_write_paths_invalidate(self):
+        self.zone_status()
+        SensorReading.objects.create(zone=self.zone, soil_moisture=11)
+        self.assertEqual(self.zone_status()['soil_moisture'], 11)
+        
+        self.client.post(
+            '/api/readings/bulk/', [{'zone_id': self.zone.id, 'soil_moisture': 12}],
+            content_type='application/json',
+        )
+        self.assertEqual(self.zone_status()['soil_moisture'], 12)
+        
+        log = start_zone_watering(self.zone, 5)
+        self.assertEqual(self.zone_status()['last_watering'], log.started_at.isoformat())
+        
+        logs = [WateringLog(zone_id=self.zone.id, duration=2, water_used=water_used_for(2)) for _ in range(3)]
+        create_watering_logs({self.user.id: logs})
+        self.assertEqual(self.zone_status()['last_watering'], logs[-1].started_at.isoformat())
+        home = self.client.get('/').content.decode()
+        self.assertRegex(home, r'>\s*4\s*</h3>\s*<p[^>]*>Всего поливов')
+        
+        schedule = WateringSchedule.objects.create(zone=self.zone, time='06:00')
+        self.assertEqual(self.zone_status()['schedules_count'], 1)
+        response = self.client.post(f'/api/schedule/{schedule.id}/toggle/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.zone_status()['schedules_count'], 0)
+        
+        self.zone.name = 'Переименована'
+        self.zone.save()
+        self.assertEqual(self.zone_status()['zone_name'], 'Переименована')
+        
+        self.assertIn(self.other_zone.id, self.zones_status())
+        self.other_zone.delete()
+        self.assertNotIn(self.other_zone.id, self.zones_status())
+    
+    def test_retention_invalidates(self):
+        SensorReading.objects.create(zone=self.zone, soil_moisture=30)
+        SensorReading.objects.filter(zone=self.zone).update(timestamp=timezone.now() - timedelta(days=400))
+        self.zone_status()
+        # update() обходит сигналы: сроки хранения сбрасывают кэш сами
+        call_command('compact_history', '--readings-days', '30', stdout=io.StringIO())
+        self.assertIsNone(self.zone_status()['soil_moisture'])
+    
+    def test_invalidated_on_commit(self):
+        SensorReading.objects.create(zone=self.zone, soil_moisture=20)
+        self.assertEqual(self.zone_status()['soil_moisture'], 20)
+        with transaction.atomic():
+            SensorReading.objects.create(zone=self.zone, soil_moisture=21)
+            # До фиксации версия прежняя: ответ берётся из кэша
+            self.assertEqual(self.zone_status()['soil_moisture'], 20)
+        self.assertEqual(self.zone_status()['soil_moisture'], 21)
+    
+    def test_parallel_readers_never_see_stale_value(self):
+        writes = 50
+        committed = {'value': 0}
+        stop = threading.Event()
+        stale = []
+        
+        def reader():
+            client = Client()
+            client.force_login(self.user)
+            try:
+                while not stop.is_set():
+                    floor = committed['value']
+                    value = client.get(f'/api/zone/{self.zone.id}/status/').json()['soil_moisture'] or 0
+                    if value < floor:
+                        stale.append((floor, value))
+            finally:
+                connection.close()
+        
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+        for thread in readers:
+            thread.start()
+        for value in range(1, writes + 1):
+            SensorReading.objects.create(zone=self.zone, soil_moisture=value)
+            committed['value'] = value
+        stop.set()
+        for thread in readers:
+            thread.join()
+        self.assertEqual(stale, [])
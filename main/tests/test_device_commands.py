@@ -0,0 +1,62 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from main import device_commands
+from main.device_commands import COMMAND_ACK_TIMEOUT, acknowledge_command, claim_commands, enqueue_command
+from main.devices import create_device_token
+from main.models import DeviceCommand, GardenZone
+
+
+class ClaimCommandsTests(TestCase):
+    """Команда выдаётся контроллеру один раз до истечения срока подтверждения"""
+    
+    def setUp(self):
+        user = User.objects.create_user(username='gardener', password='secret')
+        self.zone = GardenZone.objects.create(user=user, name='Грядки')
+        self.device, _ = create_device_token(user, 'Контроллер')
+        enqueue_command(user.id, DeviceCommand.KIND_START_ZONE, self.zone.id, {'duration': 5})
+        self.command = DeviceCommand.objects.get(device=self.device)
+    
+    def test_two_claims_in_a_row(self):
+        now = timezone.now()
+        first = claim_commands(self.device.id, now=now)
+        second = claim_commands(self.device.id, now=now + timedelta(seconds=1))
+        self.assertEqual([command['id'] for command in first], [self.command.id])
+        self.assertEqual(first[0]['attempt'], 1)
+        self.assertEqual(second, [])
+        self.command.refresh_from_db()
+        self.assertEqual(self.command.attempts, 1)
+        self.assertEqual(self.command.status, DeviceCommand.STATUS_DELIVERED)
+    
+    def test_overlapping_claims(self):
+        # Второй опрос прочитал команду до того, как первый отметил её выданной
+        now = timezone.now()
+        mark_delivered = device_commands._mark_delivered
+        results = []
+        
+        def claim_first(*args):
+            results.append(mark_delivered(*args))
+            return mark_delivered(*args)
+        
+        with mock.patch.object(device_commands, '_mark_delivered', side_effect=claim_first):
+            second = claim_commands(self.device.id, now=now)
+        self.assertEqual(results, [{self.command.id: 1}])
+        self.assertEqual(second, [])
+        self.command.refresh_from_db()
+        self.assertEqual(self.command.attempts, 1)
+    
+    def test_resend_after_ack_timeout(self):
+        now = timezone.now()
+        claim_commands(self.device.id, now=now)
+        resent = claim_commands(self.device.id, now=now + timedelta(seconds=COMMAND_ACK_TIMEOUT + 1))
+        self.assertEqual([(command['id'], command['attempt']) for command in resent], [(self.command.id, 2)])
+    
+    def test_acknowledged_command_is_not_resent(self):
+        now = timezone.now()
+        claim_commands(self.device.id, now=now)
+        acknowledge_command(self.device.id, self.command.id)
+        self.assertEqual(claim_commands(self.device.id, now=now + timedelta(seconds=COMMAND_ACK_TIMEOUT + 1)), [])
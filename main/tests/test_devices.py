@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from main import devices
+from main.devices import HeartbeatBuffer, create_device_token
+from main.models import SystemStatus
+from main.stats import get_user_stats
+
+
+class FakeMonotonic:
+    """Подменяет модуль time в main.devices: часы двигает тест"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def monotonic(self):
+        return self.now
+
+
+@override_settings(GARDEN_HEARTBEAT_FLUSH_INTERVAL=30)
+class HeartbeatCoalescingTests(TestCase):
+    """Сигналы присутствия за интервал записываются одним UPDATE"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='gardener', password='secret')
+        get_user_stats(self.user)
+        _, self.token = create_device_token(self.user, 'Контроллер')
+        self.clock = FakeMonotonic()
+        patcher = mock.patch.object(devices, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.buffer = HeartbeatBuffer()
+        patcher = mock.patch('main.views.heartbeats', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(devices, '_write_heartbeats', wraps=devices._write_heartbeats)
+        self.writes = patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def heartbeat(self, at, **data):
+        self.clock.now = at
+        response = self.client.post(
+            '/api/device/heartbeat/', data, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {self.token}',
+        )
+        self.assertEqual(response.status_code, 204)
+    
+    def test_coalesced_within_window(self):
+        self.heartbeat(1)
+        # Первый сигнал записывается сразу: система онлайн без задержки
+        self.assertEqual(self.writes.call_count, 1)
+        status = SystemStatus.objects.get(user=self.user)
+        self.assertTrue(status.is_online)
+        first_connection = status.last_connection
+        
+        self.heartbeat(5, water_pressure=2.5)
+        self.heartbeat(10)
+        self.heartbeat(29)
+        self.assertEqual(self.writes.call_count, 1)
+        self.assertEqual(SystemStatus.objects.get(user=self.user).last_connection, first_connection)
+        
+        # После интервала накопленное записывается одним UPDATE
+        self.heartbeat(31)
+        self.assertEqual(self.writes.call_count, 2)
+        status = SystemStatus.objects.get(user=self.user)
+        self.assertGreater(status.last_connection, first_connection)
+        self.assertEqual(float(status.water_pressure), 2.5)
+        
+        self.heartbeat(40)
+        self.assertEqual(self.writes.call_count, 2)
+        self.heartbeat(62)
+        self.assertEqual(self.writes.call_count, 3)
+    
+    def test_flush_writes_pending(self):
+        self.heartbeat(1)
+        self.heartbeat(2)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.writes.call_count, 2)
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.writes.call_count, 2)
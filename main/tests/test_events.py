@@ -0,0 +1,37 @@
+import asyncio
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from main.events import get_backend, user_channel
+
+
+class EventStreamTests(TestCase):
+    """Поток событий: под ASGI отдаётся сразу, под WSGI - отказ 503"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='gardener', password='secret')
+    
+    def test_wsgi_request_is_refused(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/api/events/')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('error', response.json())
+    
+    def test_anonymous(self):
+        self.assertEqual(self.client.get('/api/events/').status_code, 401)
+    
+    async def test_asgi_stream_sends_ready_and_events(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/api/events/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            ready = await asyncio.wait_for(anext(stream), 3)
+            self.assertEqual(ready, b'event: ready\ndata: {}\n\n')
+            get_backend().publish(user_channel(self.user.id), {'type': 'reading', 'zone_id': 1})
+            event = await asyncio.wait_for(anext(stream), 3)
+            self.assertEqual(event, b'event: reading\ndata: {"type": "reading", "zone_id": 1}\n\n')
+        finally:
+            await stream.aclose()
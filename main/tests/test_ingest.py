@@ -0,0 +1,116 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import Client, TestCase
+
+from main.devices import create_device_token
+from main.ingest import IngestError, build_reading, build_watering_log
+from main.models import GardenZone, SensorReading
+
+
+class ReadingValidationTests(TestCase):
+    """Пакет с недопустимым значением отклоняется целиком с ответом 400"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='gardener', password='secret')
+        self.zone = GardenZone.objects.create(user=self.user, name='Грядки')
+        self.client.force_login(self.user)
+    
+    def post(self, body):
+        return self.client.post('/api/readings/bulk/', body, content_type='application/json')
+    
+    def test_rejects_out_of_range_and_non_finite_values(self):
+        bad_values = [
+            ('temperature', 'NaN'),
+            ('temperature', 'Infinity'),
+            ('soil_moisture', 'NaN'),
+            ('soil_moisture', '-Infinity'),
+            ('soil_moisture', '1e30'),
+            ('soil_moisture', '-1'),
+            ('soil_moisture', '101'),
+            ('humidity', '100.5'),
+            ('humidity', '-0.5'),
+            ('soil_moisture', '59.9'),
+            ('humidity', '0.5'),
+        ]
+        for field, raw in bad_values:
+            with self.subTest(field=field, value=raw):
+                # json.dumps не пишет NaN и Infinity в строгом виде, тело собирается вручную
+                body = '[{"zone_id": %d, "soil_moisture": 50}, {"zone_id": %d, "%s": %s}]' % (
+                    self.zone.id, self.zone.id, field, raw,
+                )
+                response = self.post(body)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['line'], 2)
+                self.assertIn(field, response.json()['error'])
+        self.assertFalse(SensorReading.objects.exists())
+    
+    def test_accepts_range_bounds(self):
+        records = [
+            {'zone_id': self.zone.id, 'soil_moisture': 0, 'humidity': 100, 'temperature': -40.5},
+            {'zone_id': self.zone.id, 'soil_moisture': 100, 'humidity': 0, 'temperature': 999.9},
+            {'zone_id': self.zone.id, 'soil_moisture': 59.0},
+        ]
+        response = self.post(json.dumps(records))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'created': 3})
+        self.assertEqual(SensorReading.objects.filter(soil_moisture=59).count(), 1)
+    
+    def test_watering_log_values(self):
+        zones = {self.zone.id: None}
+        for record in (
+            {'zone_id': self.zone.id, 'duration': float('nan')},
+            {'zone_id': self.zone.id, 'duration': 1e30},
+            {'zone_id': self.zone.id, 'duration': -1},
+            {'zone_id': self.zone.id, 'duration': 7.5},
+            {'zone_id': self.zone.id, 'duration': 10, 'water_used': float('inf')},
+        ):
+            with self.subTest(record=record):
+                with self.assertRaises(IngestError):
+                    build_watering_log(record, zones)
+        with self.assertRaises(IngestError):
+            build_reading({'zone_id': self.zone.id, 'humidity': 10 ** 400}, {self.zone.id})
+
+
+class ReadingsAuthTests(TestCase):
+    """Пакетная загрузка: браузер - по сессии с CSRF, контроллер - по токену"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='gardener', password='secret')
+        self.zone = GardenZone.objects.create(user=self.user, name='Грядки')
+        other = User.objects.create_user(username='neighbour', password='secret')
+        self.other_zone = GardenZone.objects.create(user=other, name='Чужая грядка')
+        _, self.token = create_device_token(self.user, 'Контроллер')
+        self.body = json.dumps([{'zone_id': self.zone.id, 'soil_moisture': 40}])
+    
+    def post_device(self, body, token=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        return Client().post('/api/device/readings/', body, content_type='application/json', headers=headers)
+    
+    def test_device_token(self):
+        self.assertEqual(self.post_device(self.body).status_code, 401)
+        self.assertEqual(self.post_device(self.body, 'bad.token').status_code, 401)
+        response = self.post_device(self.body, self.token)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'created': 1})
+        self.assertEqual(SensorReading.objects.get().zone_id, self.zone.id)
+    
+    def test_device_cannot_write_other_users_zone(self):
+        body = json.dumps([{'zone_id': self.other_zone.id, 'soil_moisture': 40}])
+        response = self.post_device(body, self.token)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SensorReading.objects.exists())
+    
+    def test_session_endpoint_requires_login_and_csrf(self):
+        response = Client().post('/api/readings/bulk/', self.body, content_type='application/json')
+        self.assertEqual(response.status_code, 302)
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post('/api/readings/bulk/', self.body, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        # Токен контроллера не заменяет сессию
+        response = Client().post(
+            '/api/readings/bulk/', self.body, content_type='application/json',
+            headers={'Authorization': f'Bearer {self.token}'},
+        )
+        self.assertEqual(response.status_code, 302)
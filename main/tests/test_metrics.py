@@ -0,0 +1,58 @@
+import re
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from main.metrics import registry
+from main.models import GardenZone
+
+
+class RequestMetricsTests(TestCase):
+    """Server-Timing, учёт SQL через execute_wrapper и эндпоинт /metrics"""
+    
+    def setUp(self):
+        registry.reset()
+        self.user = User.objects.create_user(username='gardener', password='secret')
+        GardenZone.objects.create(user=self.user, name='Грядки')
+        self.client.force_login(self.user)
+    
+    def test_server_timing_counts_request_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/zones/status/')
+        self.assertEqual(response.status_code, 200)
+        timing = re.fullmatch(r'total;dur=[\d.]+, db;dur=[\d.]+;desc="(\d+) queries"', response['Server-Timing'])
+        self.assertIsNotNone(timing, response['Server-Timing'])
+        self.assertGreater(len(queries), 0)
+        self.assertEqual(int(timing.group(1)), len(queries))
+    
+    def test_metrics_endpoint(self):
+        self.client.get('/api/zones/status/')
+        self.client.get('/api/zones/status/')
+        self.client.get('/api/zone/999999/status/')
+        staff = User.objects.create_user(username='admin', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE garden_request_duration_seconds histogram', body)
+        self.assertIn('garden_request_duration_seconds_count{view="api_zones_status"} 2', body)
+        self.assertIn('garden_request_db_queries_bucket{view="api_zones_status",le="+Inf"} 2', body)
+        self.assertIn('garden_responses_total{view="api_zones_status",status="2xx"} 2', body)
+        self.assertIn('garden_responses_total{view="api_zone_status",status="4xx"} 1', body)
+    
+    @override_settings(GARDEN_METRICS_TOKEN='scrape-secret')
+    def test_metrics_access(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+    
+    @override_settings(GARDEN_SLOW_REQUEST_QUERIES=1)
+    def test_slow_request_logged(self):
+        with self.assertLogs('main.metrics', 'WARNING') as logs:
+            self.client.get('/api/zones/status/')
+        self.assertIn('/api/zones/status/', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
@@ -0,0 +1,92 @@
+import math
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from main.ingest import ingest_readings
+from main.models import GardenZone
+from main.moisture import decide_watering, recent_moisture, thresholds_for, zone_moisture
+
+
+# (расход на зону, расход на м²), литров в минуту
+RATES = (5, 0.5)
+
+
+class DecideWateringTests(SimpleTestCase):
+    """Решение о поливе на синтетических показаниях, без базы"""
+    
+    def decide(self, durations, moisture, dry=30, wet=60, areas=None):
+        minutes, water = decide_watering(durations, moisture, dry, wet, areas, rates=RATES)
+        return minutes.tolist(), water.tolist()
+    
+    def test_skip_when_wet(self):
+        minutes, water = self.decide([20, 20], [60, 85])
+        self.assertEqual(minutes, [0, 0])
+        self.assertEqual(water, [0, 0])
+    
+    def test_full_duration_when_dry(self):
+        minutes, _ = self.decide([20, 20], [30, 5])
+        self.assertEqual(minutes, [20, 20])
+    
+    def test_proportional_between_thresholds(self):
+        minutes, _ = self.decide([20, 20, 20], [45, 40, 54])
+        # (60 - влажность) / 30 от длительности
+        self.assertEqual(minutes, [10, 13, 4])
+    
+    def test_round_half_up(self):
+        # 5 * 0.5 = 2.5 и 1 * 0.5 = 0.5 округляются вверх (np.rint дал бы 2 и 0)
+        minutes, _ = self.decide([5, 1, 9], [45, 45, 45])
+        self.assertEqual(minutes, [3, 1, 5])
+    
+    def test_equal_thresholds(self):
+        minutes, _ = self.decide([20, 20, 20], [39, 40, 41], dry=40, wet=40)
+        self.assertEqual(minutes, [20, 0, 0])
+    
+    def test_no_data_gets_full_duration(self):
+        minutes, _ = self.decide([20, 15], [float('nan'), float('nan')])
+        self.assertEqual(minutes, [20, 15])
+        minutes, _ = self.decide([20], [float('nan')], dry=40, wet=40)
+        self.assertEqual(minutes, [20])
+    
+    def test_water_by_area(self):
+        minutes, water = self.decide([10, 10], [0, 0], areas=[float('nan'), 8])
+        self.assertEqual(minutes, [10, 10])
+        self.assertEqual(water, [10 * 5, 10 * 8 * 0.5])
+    
+    def test_thresholds_by_plant_type(self):
+        thresholds = {'default': {'dry': 30, 'wet': 60}, 'газон': {'dry': 25, 'wet': 45}}
+        dry, wet = thresholds_for([' Газон ', 'кактусы', None, 'газон'], thresholds)
+        self.assertEqual(dry.tolist(), [25, 30, 30, 25])
+        self.assertEqual(wet.tolist(), [45, 60, 60, 45])
+    
+    def test_zone_moisture(self):
+        moisture = zone_moisture([0, 0, 2], [40, 60, 30], 3)
+        self.assertEqual(moisture[0], 50)
+        self.assertTrue(math.isnan(moisture[1]))
+        self.assertEqual(moisture[2], 30)
+        # Суммы агрегатов: (40 + 60 + 50) / 3
+        moisture = zone_moisture([0, 0], [100, 50], 1, counts=[2, 1])
+        self.assertEqual(moisture.tolist(), [50])
+
+
+class RecentMoistureTests(TestCase):
+    """Средняя влажность зон из пятиминутных агрегатов"""
+    
+    def test_zone_under_several_schedules(self):
+        user = User.objects.create_user(username='gardener', password='secret')
+        zones = [GardenZone.objects.create(user=user, name=f'Зона {index}') for index in range(3)]
+        now = timezone.now()
+        moment = (now - timedelta(minutes=10)).isoformat()
+        ingest_readings(user.id, [
+            {'zone_id': zones[0].id, 'timestamp': moment, 'soil_moisture': 40},
+            {'zone_id': zones[0].id, 'timestamp': moment, 'soil_moisture': 50},
+            {'zone_id': zones[1].id, 'timestamp': moment, 'soil_moisture': 70},
+            # Вне окна усреднения
+            {'zone_id': zones[2].id, 'timestamp': (now - timedelta(days=1)).isoformat(), 'soil_moisture': 10},
+        ])
+        zone_ids = [zones[0].id, zones[1].id, zones[0].id, zones[2].id, zones[1].id]
+        moisture = recent_moisture(zone_ids, now=now, window_minutes=60)
+        np.testing.assert_array_equal(moisture, [45, 70, 45, np.nan, 70])
@@ -0,0 +1,98 @@
+import json
+import marshal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+
+from main.middleware import RequestProfilingMiddleware
+from main.models import GardenZone, RequestProfile
+
+
+class RequestProfilingTests(TestCase):
+    """Профиль запроса по ?_profile=1 снимается только для сотрудников"""
+    
+    def setUp(self):
+        caches[getattr(settings, 'GARDEN_CACHE_ALIAS', 'default')].clear()
+        self.staff = User.objects.create_user(username='agronomist', password='secret', is_staff=True)
+        self.gardener = User.objects.create_user(username='gardener', password='secret')
+        for user in (self.staff, self.gardener):
+            GardenZone.objects.create(user=user, name='Грядки')
+    
+    def test_staff_request_is_profiled(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/zones/status/?_profile=1')
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response['X-Garden-Profile'], f'/admin/main/requestprofile/{profile.pk}/change/')
+        self.assertEqual((profile.user, profile.method, profile.path), (self.staff, 'GET', '/api/zones/status/?_profile=1'))
+        self.assertEqual((profile.view_name, profile.status_code), ('api_zones_status', 200))
+        
+        # Статистика функций в формате pstats содержит само представление
+        stats = marshal.loads(bytes(profile.profile))
+        self.assertIn('api_zones_status', {function for _, _, function in stats})
+        self.assertIn('api_zones_status', profile.summary)
+        
+        self.assertEqual(profile.queries_count, len(profile.queries))
+        zones_query = next(query for query in profile.queries if 'main_gardenzone' in query['sql'])
+        self.assertEqual(zones_query['alias'], 'default')
+        self.assertTrue(zones_query['explain'])
+        self.assertNotIn('Ошибка', zones_query['explain'])
+        # Обёртки SQL-запросов сняты после ответа
+        wrappers = [wrapper.__name__ for connection in connections.all() for wrapper in connection.execute_wrappers]
+        self.assertNotIn('capture_queries', wrappers)
+        
+        self.client.get('/api/zones/status/', HTTP_X_GARDEN_PROFILE='1')
+        self.assertEqual(RequestProfile.objects.count(), 2)
+    
+    def test_other_requests_are_not_profiled(self):
+        self.client.force_login(self.gardener)
+        response = self.client.get('/api/zones/status/?_profile=1', HTTP_X_GARDEN_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Garden-Profile', response)
+        
+        self.client.force_login(self.staff)
+        self.client.get('/api/zones/status/?profile=1')
+        self.client.get('/api/zones/status/?zone_ids=1&_profiles=1')
+        self.assertFalse(RequestProfile.objects.exists())
+    
+    @override_settings(GARDEN_PROFILE_KEEP=2)
+    def test_keeps_latest_profiles(self):
+        self.client.force_login(self.staff)
+        for _ in range(3):
+            self.client.get('/api/zones/status/?_profile=1')
+        ids = list(RequestProfile.objects.order_by('id').values_list('id', flat=True))
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(self.client.get('/api/zones/status/?_profile=1')['X-Garden-Profile'], f'/admin/main/requestprofile/{ids[-1] + 1}/change/')
+    
+    @override_settings(GARDEN_PROFILING_ENABLED=False)
+    def test_can_be_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestProfilingMiddleware(lambda request: HttpResponse())
+    
+    def test_admin_downloads(self):
+        self.client.force_login(self.staff)
+        self.client.get('/api/zones/status/?_profile=1')
+        profile = RequestProfile.objects.get()
+        
+        admin = User.objects.create_superuser('root', password='secret')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/main/requestprofile/')
+        self.assertContains(response, f'/admin/main/requestprofile/{profile.pk}/profile/')
+        response = self.client.get(f'/admin/main/requestprofile/{profile.pk}/change/')
+        self.assertContains(response, 'main_gardenzone')
+        
+        response = self.client.get(f'/admin/main/requestprofile/{profile.pk}/profile/')
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="profile-{profile.pk}.prof"')
+        self.assertEqual(response.content, bytes(profile.profile))
+        response = self.client.get(f'/admin/main/requestprofile/{profile.pk}/sql/')
+        self.assertEqual(json.loads(response.content), profile.queries)
+        self.assertEqual(self.client.get(f'/admin/main/requestprofile/{profile.pk + 1}/sql/').status_code, 404)
+        
+        # Без прав на просмотр профилей скачать нельзя
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(f'/admin/main/requestprofile/{profile.pk}/profile/').status_code, 404)
@@ -0,0 +1,115 @@
+from collections import defaultdict
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from main.ingest import ingest_readings
+from main.models import DailyWaterUsage, GardenZone, SensorReading, SensorRollup, SystemStatus, WateringLog, WateringSchedule
+from main.purge import delete_zone, purge_deleted_zones
+from main.stats import check_user_stats, get_user_stats
+from main.watering import create_watering_logs, water_used_for
+
+
+class ZoneDeletionTests(TestCase):
+    """Удалённая зона сразу скрыта, а история удаляется в фоне порциями"""
+    
+    def setUp(self):
+        caches[getattr(settings, 'GARDEN_CACHE_ALIAS', 'default')].clear()
+        self.user = User.objects.create_user(username='gardener', password='secret')
+        self.kept = GardenZone.objects.create(user=self.user, name='Грядки')
+        self.deleted = GardenZone.objects.create(user=self.user, name='Старый газон')
+        WateringSchedule.objects.create(zone=self.deleted, time='06:00')
+        now = timezone.now()
+        records = [
+            {'zone_id': zone.id, 'timestamp': (now - timedelta(minutes=10 * index)).isoformat(), 'soil_moisture': 40}
+            for zone in (self.kept, self.deleted)
+            for index in range(250)
+        ]
+        ingest_readings(self.user.id, records)
+        create_watering_logs({self.user.id: [
+            WateringLog(zone_id=zone.id, started_at=now - timedelta(hours=index), duration=5, water_used=water_used_for(5))
+            for zone in (self.kept, self.deleted)
+            for index in range(30)
+        ]})
+        get_user_stats(self.user)
+        self.client.force_login(self.user)
+    
+    def test_hidden_from_views_and_apis(self):
+        response = self.client.post(f'/zone/{self.deleted.id}/delete/')
+        self.assertRedirects(response, '/dashboard/')
+        self.assertFalse(WateringSchedule.objects.filter(zone_id=self.deleted.id).exists())
+        # История ещё не удалена
+        self.assertEqual(SensorReading.objects.filter(zone_id=self.deleted.id).count(), 250)
+        
+        dashboard = self.client.get('/dashboard/')
+        self.assertEqual([zone.id for zone in dashboard.context['zones']], [self.kept.id])
+        self.assertNotContains(dashboard, 'Старый газон')
+        for url in (
+            f'/api/zone/{self.deleted.id}/status/',
+            f'/api/zone/{self.deleted.id}/readings/',
+            f'/zone/{self.deleted.id}/edit/',
+            f'/zone/{self.deleted.id}/water/',
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+        zones = self.client.get('/api/zones/status/').json()['zones']
+        self.assertEqual([zone['zone_id'] for zone in zones], [self.kept.id])
+        
+        logs = self.client.get('/api/history/?limit=500').json()['logs']
+        self.assertEqual({log['zone_id'] for log in logs}, {self.kept.id})
+        self.assertNotContains(self.client.get('/history/'), 'Старый газон')
+        for url in ('/api/export/readings/?format=ndjson', '/api/export/logs/?format=ndjson'):
+            with self.subTest(url=url):
+                body = b''.join(self.client.get(url).streaming_content).decode()
+                self.assertNotIn('Старый газон', body)
+                self.assertIn('Грядки', body)
+        today = timezone.localdate()
+        usage = self.client.get(f'/api/analytics/usage/?start={today - timedelta(days=3)}&end={today}').json()
+        self.assertEqual([zone['zone_id'] for zone in usage['zones']], [self.kept.id])
+        self.assertEqual(get_user_stats(self.user).zones_count, 1)
+    
+    def test_delete_does_not_read_history(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(delete_zone(self.deleted))
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn(WateringLog._meta.db_table, sql)
+        self.assertNotIn(SensorReading._meta.db_table, sql)
+        self.assertFalse(delete_zone(self.deleted))
+    
+    @mock.patch('main.purge.ZONE_PURGE_MAX_BATCH_SIZE', 100)
+    def test_purge_in_batches(self):
+        delete_zone(self.deleted)
+        batches = defaultdict(list)
+        
+        def progress(zone, table, deleted):
+            batches[table].append(deleted)
+            # Агрегаты главной страницы сходятся после каждой порции
+            self.assertEqual(check_user_stats([self.user.id]), [])
+        
+        result = purge_deleted_zones(batch_size=50, pause=0, progress=progress)
+        self.assertEqual(result['zones'], 1)
+        self.assertEqual(result['pending'], 0)
+        self.assertGreater(len(batches[SensorReading._meta.db_table]), 2)
+        self.assertGreater(len(batches[WateringLog._meta.db_table]), 0)
+        self.assertFalse(GardenZone.all_objects.filter(id=self.deleted.id).exists())
+        for model in (SensorReading, WateringLog, SensorRollup, DailyWaterUsage):
+            with self.subTest(model=model.__name__):
+                self.assertFalse(model.objects.filter(zone_id=self.deleted.id).exists())
+                self.assertTrue(model.objects.filter(zone_id=self.kept.id).exists())
+        status = SystemStatus.objects.get(user=self.user)
+        self.assertEqual(status.waterings_count, 30)
+        self.assertEqual(check_user_stats([self.user.id]), [])
+    
+    def test_purge_stops_at_time_budget(self):
+        delete_zone(self.deleted)
+        result = purge_deleted_zones(batch_size=50, pause=0, time_budget=0)
+        self.assertEqual(result, {'zones': 0, 'rows': 0, 'pending': 1, 'slowest_delete_ms': 0.0})
+        self.assertTrue(GardenZone.all_objects.filter(id=self.deleted.id).exists())
+        self.assertEqual(check_user_stats([self.user.id]), [])
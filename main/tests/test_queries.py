@@ -0,0 +1,60 @@
+from datetime import time, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase
+from django.utils import timezone
+
+from main.models import GardenZone, SensorReading, WateringLog, WateringSchedule
+
+
+class ZoneQueryCountTests(TestCase):
+    """Число SQL-запросов главной панели и API статуса не зависит от числа зон"""
+    
+    # Сессия и пользователь входят в число запросов каждого ответа
+    DASHBOARD_QUERIES = 6
+    ZONES_STATUS_QUERIES = 3
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='gardener', password='secret')
+        self.client.force_login(self.user)
+    
+    def add_zones(self, count):
+        now = timezone.now()
+        existing = GardenZone.objects.filter(user=self.user).count()
+        for index in range(existing, count):
+            zone = GardenZone.objects.create(user=self.user, name=f'Зона {index}')
+            WateringSchedule.objects.create(zone=zone, time=time(6, 0))
+            WateringSchedule.objects.create(zone=zone, time=time(20, 0))
+            SensorReading.objects.bulk_create(
+                SensorReading(zone=zone, timestamp=now - timedelta(minutes=minutes), soil_moisture=40 + minutes)
+                for minutes in range(3)
+            )
+            WateringLog.objects.create(zone=zone, duration=10, water_used=50)
+    
+    def get(self, url):
+        # Ответы кэшируются (main.cache): считаются запросы построения
+        caches[getattr(settings, 'GARDEN_CACHE_ALIAS', 'default')].clear()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+    
+    def test_dashboard(self):
+        for zones_count in (3, 50):
+            with self.subTest(zones=zones_count):
+                self.add_zones(zones_count)
+                with self.assertNumQueries(self.DASHBOARD_QUERIES):
+                    response = self.get('/dashboard/')
+                self.assertEqual(len(response.context['zones']), zones_count)
+    
+    def test_zones_status(self):
+        for zones_count in (3, 50):
+            with self.subTest(zones=zones_count):
+                self.add_zones(zones_count)
+                with self.assertNumQueries(self.ZONES_STATUS_QUERIES):
+                    response = self.get('/api/zones/status/')
+                zones = response.json()['zones']
+                self.assertEqual(len(zones), zones_count)
+                # Последнее показание каждой зоны - самое свежее из трёх
+                self.assertEqual({zone['soil_moisture'] for zone in zones}, {40})
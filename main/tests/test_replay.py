@@ -0,0 +1,167 @@
+import json
+import random
+import threading
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from main.devices import create_device_token
+from main.models import DailyWaterUsage, GardenZone, SensorReading, SensorRollup, SystemStatus, WateringLog
+from main.stats import check_user_stats, rebuild_user_stats
+
+
+def make_records(zone_ids, count, prefix, seed=0, days=30):
+    """Записи истории контроллера с ключами: каждая десятая - полив"""
+    rnd = random.Random(seed)
+    now = timezone.now()
+    records = []
+    for index in range(count):
+        moment = (now - timedelta(seconds=rnd.randrange(days * 86400))).isoformat()
+        if index % 10 == 9:
+            records.append({
+                'type': 'watering',
+                'key': f'{prefix}-{index}',
+                'zone_id': rnd.choice(zone_ids),
+                'started_at': moment,
+                'duration': rnd.randint(5, 30),
+                'is_manual': rnd.random() < 0.2,
+            })
+        else:
+            records.append({
+                'type': 'reading',
+                'key': f'{prefix}-{index}',
+                'zone_id': rnd.choice(zone_ids),
+                'timestamp': moment,
+                'soil_moisture': rnd.randint(10, 90),
+                'temperature': round(rnd.uniform(5, 35), 1),
+                'humidity': rnd.randint(30, 95),
+            })
+    return records
+
+
+class ReplayMixin:
+    """Пользователь с зонами и токеном контроллера, выгрузка и снимок агрегатов"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='gardener', password='secret')
+        self.zone_ids = [GardenZone.objects.create(user=self.user, name=f'Зона {index}').id for index in range(5)]
+        rebuild_user_stats([self.user.id])
+        _, self.token = create_device_token(self.user, 'Контроллер')
+    
+    def replay(self, records):
+        body = ''.join(json.dumps(record) + '\n' for record in records)
+        response = Client().post(
+            '/api/device/replay/', body,
+            content_type='application/x-ndjson',
+            HTTP_AUTHORIZATION=f'Bearer {self.token}',
+        )
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        return response.json()
+    
+    def created(self, counts):
+        return counts['readings']['created'] + counts['waterings']['created']
+    
+    def snapshot(self):
+        status = SystemStatus.objects.get(user=self.user)
+        usage = DailyWaterUsage.objects.filter(zone__user=self.user).aggregate(
+            count=Sum('waterings_count'), water=Sum('water_used'),
+        )
+        return {
+            'readings': SensorReading.objects.filter(zone__user=self.user).count(),
+            'waterings': WateringLog.objects.filter(zone__user=self.user).count(),
+            'waterings_count': status.waterings_count,
+            'total_water_used': status.total_water_used,
+            'usage_count': usage['count'],
+            'usage_water': usage['water'],
+            'rollup_readings': {
+                resolution: SensorRollup.objects.filter(zone__user=self.user, resolution=resolution)
+                .aggregate(total=Sum('readings_count'))['total']
+                for resolution, _ in SensorRollup.RESOLUTION_CHOICES
+            },
+        }
+    
+    def assertConsistent(self, state):
+        # Агрегаты совпадают с самими строками
+        self.assertEqual(state['waterings_count'], state['waterings'])
+        self.assertEqual(state['usage_count'], state['waterings'])
+        self.assertEqual(state['usage_water'], state['total_water_used'])
+        for resolution, total in state['rollup_readings'].items():
+            self.assertEqual(total, state['readings'], resolution)
+        self.assertEqual(check_user_stats([self.user.id]), [])
+
+
+class ReplayTests(ReplayMixin, TestCase):
+    """Повторная выгрузка истории не создаёт строк и не меняет агрегаты"""
+    
+    def test_second_replay_changes_nothing(self):
+        records = make_records(self.zone_ids, 100000, 'base')
+        first = self.replay(records)
+        self.assertEqual(self.created(first), len(records))
+        after_first = self.snapshot()
+        self.assertEqual(after_first['readings'] + after_first['waterings'], len(records))
+        self.assertConsistent(after_first)
+        
+        second = self.replay(records)
+        self.assertEqual(self.created(second), 0)
+        self.assertEqual(second['readings']['duplicates'] + second['waterings']['duplicates'], len(records))
+        self.assertEqual(self.snapshot(), after_first)
+    
+    def test_keyed_record_requires_time(self):
+        for record in (
+            {'type': 'reading', 'key': 'k1', 'zone_id': self.zone_ids[0], 'soil_moisture': 40},
+            {'type': 'watering', 'key': 'k2', 'zone_id': self.zone_ids[0], 'duration': 5},
+        ):
+            with self.subTest(type=record['type']):
+                for _ in range(2):
+                    response = Client().post(
+                        '/api/device/replay/', json.dumps(record) + '\n',
+                        content_type='application/x-ndjson',
+                        HTTP_AUTHORIZATION=f'Bearer {self.token}',
+                    )
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json()['line'], 1)
+        self.assertFalse(SensorReading.objects.exists())
+        self.assertFalse(WateringLog.objects.exists())
+    
+    def test_duplicates_within_batch(self):
+        stored = make_records(self.zone_ids, 100, 'base')
+        self.replay(stored)
+        # Новые записи дважды вперемешку с уже сохранёнными
+        fresh = make_records(self.zone_ids, 100, 'mixed', seed=1)
+        mixed = fresh + fresh + stored
+        random.Random(2).shuffle(mixed)
+        counts = self.replay(mixed)
+        self.assertEqual(self.created(counts), len(fresh))
+        state = self.snapshot()
+        self.assertEqual(state['readings'] + state['waterings'], len(stored) + len(fresh))
+        self.assertConsistent(state)
+
+
+class ConcurrentReplayTests(ReplayMixin, TransactionTestCase):
+    """Один пакет, выгруженный из нескольких потоков сразу, вставляется один раз"""
+    
+    def test_concurrent_replay_inserts_once(self):
+        records = make_records(self.zone_ids, 500, 'concurrent', seed=3)
+        results = []
+        errors = []
+        
+        def worker():
+            try:
+                results.append(self.replay(records))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sum(self.created(counts) for counts in results), len(records))
+        self.assertConsistent(self.snapshot())
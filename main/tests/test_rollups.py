@@ -0,0 +1,148 @@
+import io
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+
+from main.ingest import ingest_readings
+from main.models import GardenZone, SensorReading, SensorRollup
+from main.rollups import backfill_rollups, bucket_start, choose_resolution, query_rollups
+
+
+def rollup_rows(zone):
+    rollups = SensorRollup.objects.filter(zone=zone).order_by('resolution', 'bucket_start')
+    return [row[1:] for row in rollups.values_list()]
+
+
+class BackfillRetentionTests(TestCase):
+    """Пересчёт агрегатов не уничтожает агрегаты истории, сжатой сроками хранения"""
+    
+    def setUp(self):
+        user = User.objects.create_user(username='gardener', password='secret')
+        self.zone = GardenZone.objects.create(user=user, name='Грядки')
+        now = timezone.now()
+        # 40 суток по 4 показания
+        records = [
+            {'zone_id': self.zone.id, 'timestamp': (now - timedelta(hours=6 * index)).isoformat(), 'soil_moisture': 40}
+            for index in range(160)
+        ]
+        ingest_readings(user.id, records)
+        call_command('compact_history', '--readings-days', '30', stdout=io.StringIO())
+        self.cutoff = now - timedelta(days=30)
+        self.assertFalse(SensorReading.objects.filter(timestamp__lt=self.cutoff).exists())
+    
+    def daily_counts(self):
+        rollups = SensorRollup.objects.filter(zone=self.zone, resolution=SensorRollup.RESOLUTION_DAY)
+        return dict(rollups.values_list('bucket_start', 'readings_count'))
+    
+    def total(self, resolution):
+        rollups = SensorRollup.objects.filter(zone=self.zone, resolution=resolution)
+        return rollups.aggregate(total=Sum('readings_count'))['total']
+    
+    def test_default_keeps_rollups_before_retention(self):
+        before = self.daily_counts()
+        totals = {resolution: self.total(resolution) for resolution, _ in SensorRollup.RESOLUTION_CHOICES}
+        self.assertEqual(totals[SensorRollup.RESOLUTION_DAY], 160)
+        # Испорченный свежий агрегат пересчитывается
+        latest = SensorRollup.objects.filter(zone=self.zone, resolution=SensorRollup.RESOLUTION_DAY).latest('bucket_start')
+        SensorRollup.objects.filter(id=latest.id).update(readings_count=999)
+        call_command('backfill_rollups', stdout=io.StringIO())
+        # Агрегаты всех суток, в том числе удалённых частично, не изменились
+        self.assertEqual(self.daily_counts(), before)
+        for resolution, total in totals.items():
+            self.assertEqual(self.total(resolution), total, resolution)
+    
+    def test_all_rebuilds_from_remaining_readings(self):
+        call_command('backfill_rollups', '--all', stdout=io.StringIO())
+        remaining = SensorReading.objects.filter(zone=self.zone).count()
+        self.assertEqual(self.total(SensorRollup.RESOLUTION_DAY), remaining)
+        self.assertLess(remaining, 160)
+    
+    def test_since_and_all_are_exclusive(self):
+        with self.assertRaises(CommandError):
+            call_command('backfill_rollups', '--all', '--since', '2026-01-01', stdout=io.StringIO())
+
+
+class IncrementalRollupTests(TestCase):
+    """Агрегаты дополняются при сохранении показаний и выбирают интервал по длине периода"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='gardener', password='secret')
+        self.zone = GardenZone.objects.create(user=self.user, name='Грядки')
+        self.start = datetime(2026, 6, 10, 10, 0, tzinfo=dt_timezone.utc)
+    
+    def test_incremental_matches_backfill(self):
+        # Поштучно (сигнал post_save) и пакетом (ingest), в том числе пустые значения
+        SensorReading.objects.create(zone=self.zone, timestamp=self.start + timedelta(minutes=1), soil_moisture=40, temperature='21.5', humidity=60)
+        SensorReading.objects.create(zone=self.zone, timestamp=self.start + timedelta(minutes=3), soil_moisture=50, temperature=None, humidity=70)
+        records = [
+            {
+                'zone_id': self.zone.id,
+                'timestamp': (self.start + timedelta(minutes=7 * index)).isoformat(),
+                'soil_moisture': 30 + index % 40,
+                'temperature': 15 + index % 10 / 2,
+                'humidity': 50,
+            }
+            for index in range(1, 500)
+        ]
+        ingest_readings(self.user.id, records)
+        
+        bucket = SensorRollup.objects.get(zone=self.zone, resolution=SensorRollup.RESOLUTION_5MIN, bucket_start=self.start)
+        self.assertEqual(bucket.readings_count, 2)
+        self.assertEqual((bucket.soil_moisture_min, bucket.soil_moisture_max, bucket.soil_moisture_sum), (40, 50, 90))
+        self.assertEqual((bucket.temperature_min, bucket.temperature_max, bucket.temperature_count), (21.5, 21.5, 1))
+        for resolution, _ in SensorRollup.RESOLUTION_CHOICES:
+            total = SensorRollup.objects.filter(zone=self.zone, resolution=resolution).aggregate(total=Sum('readings_count'))['total']
+            self.assertEqual(total, 501, resolution)
+        
+        incremental = rollup_rows(self.zone)
+        backfill_rollups()
+        self.assertEqual(rollup_rows(self.zone), incremental)
+    
+    def test_query_resolution_follows_points(self):
+        self.assertEqual(choose_resolution(self.start, self.start + timedelta(days=1)), SensorRollup.RESOLUTION_5MIN)
+        self.assertEqual(choose_resolution(self.start, self.start + timedelta(days=10)), SensorRollup.RESOLUTION_HOUR)
+        self.assertEqual(choose_resolution(self.start, self.start + timedelta(days=60)), SensorRollup.RESOLUTION_DAY)
+        self.assertEqual(choose_resolution(self.start, self.start + timedelta(days=1), max_points=24), SensorRollup.RESOLUTION_HOUR)
+        
+        for minutes in (0, 20, 65, 70):
+            SensorReading.objects.create(zone=self.zone, timestamp=self.start + timedelta(minutes=minutes), soil_moisture=minutes)
+        resolution, points = query_rollups(self.zone.id, self.start, self.start + timedelta(hours=2), max_points=2)
+        self.assertEqual(resolution, SensorRollup.RESOLUTION_HOUR)
+        self.assertEqual([point['readings_count'] for point in points], [2, 2])
+        self.assertEqual(points[0]['bucket_start'], self.start.isoformat())
+        self.assertEqual(points[1]['soil_moisture'], {'min': 65, 'max': 70, 'avg': 67.5, 'count': 2})
+        self.assertEqual(points[1]['temperature'], {'min': None, 'max': None, 'avg': None, 'count': 0})
+        
+        # Начало периода внутри интервала захватывает весь интервал
+        _, points = query_rollups(self.zone.id, self.start + timedelta(minutes=30), self.start + timedelta(hours=2), resolution=SensorRollup.RESOLUTION_HOUR)
+        self.assertEqual(len(points), 2)
+        resolution, points = query_rollups(self.zone.id, self.start, self.start + timedelta(hours=2))
+        self.assertEqual(resolution, SensorRollup.RESOLUTION_5MIN)
+        self.assertEqual([point['readings_count'] for point in points], [1, 1, 1, 1])
+        day = bucket_start(self.start, SensorRollup.RESOLUTION_DAY)
+        _, points = query_rollups(self.zone.id, day, day + timedelta(days=60))
+        self.assertEqual(len(points), 1)
+        self.assertEqual(datetime.fromisoformat(points[0]['bucket_start']), day)
+        self.assertEqual(points[0]['readings_count'], 4)
+    
+    def test_api(self):
+        SensorReading.objects.create(zone=self.zone, timestamp=self.start, soil_moisture=40)
+        self.client.force_login(self.user)
+        url = f'/api/zone/{self.zone.id}/readings/'
+        params = {'start': self.start.isoformat(), 'end': (self.start + timedelta(days=20)).isoformat()}
+        data = self.client.get(url, params).json()
+        self.assertEqual(data['resolution'], SensorRollup.RESOLUTION_HOUR)
+        self.assertEqual(len(data['points']), 1)
+        
+        data = self.client.get(url, {**params, 'resolution': SensorRollup.RESOLUTION_DAY}).json()
+        self.assertEqual(data['resolution'], SensorRollup.RESOLUTION_DAY)
+        response = self.client.get(url, {'start': params['end'], 'end': params['start']})
+        self.assertEqual(response.status_code, 400)
+        
+        other = User.objects.create_user(username='neighbour', password='secret')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url, params).status_code, 404)
@@ -0,0 +1,89 @@
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from main.models import ALL_DAYS_MASK, DailyWaterUsage, GardenZone, WateringLog, WateringSchedule, days_to_mask
+from main.scheduler import Scheduler, SimulatedClock
+
+
+BERLIN = ZoneInfo('Europe/Berlin')
+
+
+@override_settings(TIME_ZONE='Europe/Berlin', GARDEN_MOISTURE_CONTROL=False)
+class SimulatedWeekTests(TestCase):
+    """Планировщик на SimulatedClock в течение недели с переводом часов"""
+    
+    def setUp(self):
+        user = User.objects.create_user(username='gardener', password='secret')
+        self.daily_zone = GardenZone.objects.create(user=user, name='Грядки')
+        self.weekday_zone = GardenZone.objects.create(user=user, name='Газон')
+        # 02:30 каждый день: в ночь весеннего перевода такого времени нет
+        WateringSchedule.objects.create(zone=self.daily_zone, time=time(2, 30), days_mask=ALL_DAYS_MASK)
+        # Понедельник, среда и пятница: вторник, четверг и выходные пропускаются
+        WateringSchedule.objects.create(zone=self.weekday_zone, time=time(7, 0), days_mask=days_to_mask([1, 3, 5]))
+    
+    def run_week(self, monday):
+        start = datetime.combine(monday, time(0, 0), tzinfo=BERLIN)
+        clock = SimulatedClock(start)
+        scheduler = Scheduler(clock=clock, tz=BERLIN)
+        scheduler.run(reload_interval=3600, until=start + timedelta(days=7))
+        return clock
+    
+    def local_starts(self, zone):
+        logs = WateringLog.objects.filter(zone=zone).order_by('started_at')
+        return [log.started_at.astimezone(BERLIN) for log in logs]
+    
+    def test_spring_forward_week(self):
+        # 29.03.2026 в 02:00 часы переводятся на 03:00
+        clock = self.run_week(date(2026, 3, 23))
+        self.assertEqual(clock.now(), datetime(2026, 3, 30, tzinfo=BERLIN))
+        
+        daily = self.local_starts(self.daily_zone)
+        expected = [datetime(2026, 3, day, 2, 30, tzinfo=BERLIN) for day in range(23, 29)]
+        # Несуществующее 02:30 сдвигается вперёд на величину перевода
+        expected.append(datetime(2026, 3, 29, 3, 30, tzinfo=BERLIN))
+        self.assertEqual(daily, expected)
+        self.assertEqual(daily[-1].utcoffset(), timedelta(hours=2))
+        
+        weekday = self.local_starts(self.weekday_zone)
+        self.assertEqual(weekday, [datetime(2026, 3, day, 7, 0, tzinfo=BERLIN) for day in (23, 25, 27)])
+        
+        per_day = Counter(moment.date() for moment in daily + weekday)
+        self.assertEqual(per_day, {
+            date(2026, 3, 23): 2, date(2026, 3, 24): 1, date(2026, 3, 25): 2, date(2026, 3, 26): 1,
+            date(2026, 3, 27): 2, date(2026, 3, 28): 1, date(2026, 3, 29): 1,
+        })
+        
+        # Расход по дням разложен по дням срабатывания, а не по дню записи
+        usage = dict(DailyWaterUsage.objects.filter(zone=self.daily_zone).values_list('day', 'waterings_count'))
+        self.assertEqual(usage, {date(2026, 3, day): 1 for day in range(23, 30)})
+        usage = dict(DailyWaterUsage.objects.filter(zone=self.weekday_zone).values_list('day', 'waterings_count'))
+        self.assertEqual(usage, {date(2026, 3, day): 1 for day in (23, 25, 27)})
+    
+    def test_fall_back_week(self):
+        # 25.10.2026 в 03:00 часы переводятся на 02:00: 02:30 бывает дважды
+        self.run_week(date(2026, 10, 19))
+        
+        daily = self.local_starts(self.daily_zone)
+        self.assertEqual(daily, [datetime(2026, 10, day, 2, 30, tzinfo=BERLIN) for day in range(19, 26)])
+        # Неоднозначное время берётся в первом вхождении (ещё летнее время)
+        self.assertEqual(daily[-1].utcoffset(), timedelta(hours=2))
+        self.assertEqual(Counter(moment.date() for moment in daily), {date(2026, 10, day): 1 for day in range(19, 26)})
+        
+        weekday = self.local_starts(self.weekday_zone)
+        self.assertEqual(weekday, [datetime(2026, 10, day, 7, 0, tzinfo=BERLIN) for day in (19, 21, 23)])
+    
+    def test_missed_runs_execute_once_at_fire_time(self):
+        # Планировщик не работал сутки: пропущенный запуск выполняется один
+        # раз и записывается временем срабатывания
+        start = datetime(2026, 3, 23, 0, 0, tzinfo=BERLIN)
+        clock = SimulatedClock(start)
+        scheduler = Scheduler(clock=clock, tz=BERLIN)
+        scheduler.load()
+        clock.advance(days=1, hours=12)
+        self.assertEqual(scheduler.tick(), 2)
+        self.assertEqual(self.local_starts(self.daily_zone), [datetime(2026, 3, 23, 2, 30, tzinfo=BERLIN)])
+        self.assertEqual(self.local_starts(self.weekday_zone), [datetime(2026, 3, 23, 7, 0, tzinfo=BERLIN)])
@@ -0,0 +1,119 @@
+from datetime import time
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from main.forms import WateringScheduleForm
+from main.models import ALL_DAYS_MASK, GardenZone, WateringSchedule, days_to_mask, mask_to_days
+
+
+class DaysMaskTests(TestCase):
+    """Дни недели расписания в битовой маске"""
+    
+    def setUp(self):
+        user = User.objects.create_user(username='gardener', password='secret')
+        self.zone = GardenZone.objects.create(user=user, name='Грядки')
+        self.weekdays = WateringSchedule.objects.create(zone=self.zone, time=time(7, 0), days_mask=days_to_mask([1, 3, 5]))
+        self.weekend = WateringSchedule.objects.create(zone=self.zone, time=time(9, 0), days_mask=days_to_mask(['6', '7']))
+        self.daily = WateringSchedule.objects.create(zone=self.zone, time=time(20, 0))
+        self.inactive = WateringSchedule.objects.create(zone=self.zone, time=time(7, 30), days_mask=days_to_mask([3]), is_active=False)
+    
+    def test_mask_conversion(self):
+        self.assertEqual(days_to_mask([1, 3, 5]), 0b0010101)
+        self.assertEqual(days_to_mask(range(1, 8)), ALL_DAYS_MASK)
+        self.assertEqual(days_to_mask([]), 0)
+        self.assertEqual(mask_to_days(0b1100000), [6, 7])
+        for mask in range(ALL_DAYS_MASK + 1):
+            self.assertEqual(days_to_mask(mask_to_days(mask)), mask)
+        
+        self.assertEqual(self.weekdays.get_days_list(), [1, 3, 5])
+        self.assertEqual(self.weekend.get_days_display(), 'Сб, Вс')
+        self.assertEqual([self.weekdays.runs_on(day) for day in range(1, 8)], [True, False, True, False, True, False, False])
+    
+    def test_runs_on_queryset(self):
+        expected = {
+            1: {self.weekdays, self.daily},
+            2: {self.daily},
+            3: {self.weekdays, self.daily, self.inactive},
+            6: {self.weekend, self.daily},
+            7: {self.weekend, self.daily},
+        }
+        for weekday, schedules in expected.items():
+            self.assertEqual(set(WateringSchedule.objects.runs_on(weekday)), schedules, weekday)
+        # Выборка совпадает с проверкой маски в Python для всех дней
+        for weekday in range(1, 8):
+            self.assertEqual(
+                set(WateringSchedule.objects.runs_on(weekday)),
+                {schedule for schedule in WateringSchedule.objects.all() if schedule.runs_on(weekday)},
+            )
+    
+    def test_due_between(self):
+        due = WateringSchedule.objects.due_between(3, time(7, 0), time(8, 0))
+        self.assertEqual(list(due), [self.weekdays])
+        self.assertFalse(WateringSchedule.objects.due_between(2, time(7, 0), time(8, 0)).exists())
+        self.assertEqual(set(WateringSchedule.objects.due_between(6, time(0, 0), time(23, 59))), {self.weekend, self.daily})
+    
+    def test_form_round_trip(self):
+        form = WateringScheduleForm(instance=self.weekdays)
+        self.assertEqual(form.fields['days'].initial, [1, 3, 5])
+        
+        form = WateringScheduleForm({'time': '06:15', 'is_active': 'on', 'days': ['2', '4']}, instance=self.weekdays)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.weekdays.refresh_from_db()
+        self.assertEqual(self.weekdays.days_mask, 0b0001010)
+        self.assertEqual(self.weekdays.get_days_list(), [2, 4])
+        
+        form = WateringScheduleForm({'time': '06:15', 'days': []})
+        self.assertIn('days', form.errors)
+    
+    def test_admin_weekday_filter(self):
+        admin = User.objects.create_superuser('root', password='secret')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/main/wateringschedule/?weekday=6')
+        self.assertEqual(set(response.context['cl'].result_list), {self.weekend, self.daily})
+        self.assertContains(response, 'Сб, Вс')
+        # Неизвестное значение фильтра не сужает список
+        response = self.client.get('/admin/main/wateringschedule/?weekday=8')
+        self.assertEqual(response.context['cl'].result_count, 4)
+
+
+class DaysMaskMigrationTests(TransactionTestCase):
+    """Перенос дней недели из строки в маску и обратно"""
+    
+    before = [('main', '0004_wateringschedule_updated_at')]
+    after = [('main', '0005_wateringschedule_days_mask')]
+    
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+    
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+    
+    def test_csv_to_mask_and_back(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('auth', 'User')
+        GardenZone = apps.get_model('main', 'GardenZone')
+        Schedule = apps.get_model('main', 'WateringSchedule')
+        zone = GardenZone.objects.create(user=User.objects.create(username='gardener'), name='Грядки')
+        days = {'1,3,5': 0b0010101, '6, 7': 0b1100000, '1,2,3,4,5,6,7': ALL_DAYS_MASK, '0,8,x,': 0}
+        ids = {Schedule.objects.create(zone=zone, time=time(7, 0), days_of_week=value).id: value for value in days}
+        
+        apps = self.migrate(self.after)
+        Schedule = apps.get_model('main', 'WateringSchedule')
+        masks = dict(Schedule.objects.values_list('id', 'days_mask'))
+        self.assertEqual({ids[pk]: mask for pk, mask in masks.items()}, days)
+        
+        apps = self.migrate(self.before)
+        Schedule = apps.get_model('main', 'WateringSchedule')
+        restored = dict(Schedule.objects.values_list('id', 'days_of_week'))
+        self.assertEqual(
+            {ids[pk]: value for pk, value in restored.items()},
+            {'1,3,5': '1,3,5', '6, 7': '6,7', '1,2,3,4,5,6,7': '1,2,3,4,5,6,7', '0,8,x,': ''},
+        )
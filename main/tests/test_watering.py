@@ -0,0 +1,58 @@
+import threading
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TransactionTestCase
+
+from main.models import DailyWaterUsage, GardenZone, SystemStatus, WateringLog
+from main.stats import check_user_stats, rebuild_user_stats
+from main.watering import create_watering_logs, start_zone_watering, water_used_for
+
+
+class ConcurrentWateringTests(TransactionTestCase):
+    """Параллельные поливы одного пользователя не теряют обновлений счётчиков"""
+    
+    THREADS = 8
+    ITERATIONS = 10
+    BATCH = 5
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='gardener', password='secret')
+        self.zones = [GardenZone.objects.create(user=self.user, name=f'Зона {index}') for index in range(4)]
+        rebuild_user_stats([self.user.id])
+    
+    def worker(self, index, barrier, errors):
+        try:
+            barrier.wait()
+            for iteration in range(self.ITERATIONS):
+                zone = self.zones[(index + iteration) % len(self.zones)]
+                if index % 4 == 0:
+                    logs = [
+                        WateringLog(zone_id=zone.id, duration=3, is_manual=False, water_used=water_used_for(3))
+                        for _ in range(self.BATCH)
+                    ]
+                    create_watering_logs({self.user.id: logs})
+                else:
+                    start_zone_watering(zone, 1 + iteration % 7)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+    
+    def test_parallel_waterings_keep_counters(self):
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+        threads = [threading.Thread(target=self.worker, args=(index, barrier, errors)) for index in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        
+        batch_threads = len(range(0, self.THREADS, 4))
+        expected = batch_threads * self.ITERATIONS * self.BATCH + (self.THREADS - batch_threads) * self.ITERATIONS
+        self.assertEqual(WateringLog.objects.count(), expected)
+        self.assertEqual(check_user_stats([self.user.id]), [])
+        self.assertEqual(SystemStatus.objects.get(user=self.user).waterings_count, expected)
+        usage = sum(DailyWaterUsage.objects.values_list('waterings_count', flat=True))
+        self.assertEqual(usage, expected)
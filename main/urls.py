@@ -31,5 +31,24 @@ urlpatterns = [
     
     # API
     path('api/zone/<int:zone_id>/status/', views.api_zone_status, name='api_zone_status'),
+    path('api/zone/<int:zone_id>/readings/', views.api_zone_readings, name='api_zone_readings'),
+    path('api/zones/status/', views.api_zones_status, name='api_zones_status'),
+    path('api/zone/<int:zone_id>/stop/', views.api_zone_stop, name='api_zone_stop'),
     path('api/schedule/<int:schedule_id>/toggle/', views.api_toggle_schedule, name='api_toggle_schedule'),
+    path('api/readings/bulk/', views.api_readings_bulk, name='api_readings_bulk'),
+    path('api/events/', views.api_events, name='api_events'),
+    path('api/history/', views.api_watering_history, name='api_watering_history'),
+    path('api/analytics/usage/', views.api_usage_analytics, name='api_usage_analytics'),
+    path('api/export/readings/', views.api_export_readings, name='api_export_readings'),
+    path('api/export/logs/', views.api_export_logs, name='api_export_logs'),
+    
+    # Метрики запросов для Prometheus
+    path('metrics', views.metrics, name='metrics'),
+    
+    # API контроллеров (доступ по токену устройства, см. main.devices)
+    path('api/device/heartbeat/', views.api_device_heartbeat, name='api_device_heartbeat'),
+    path('api/device/commands/', views.api_device_commands, name='api_device_commands'),
+    path('api/device/commands/<int:command_id>/ack/', views.api_device_command_ack, name='api_device_command_ack'),
+    path('api/device/replay/', views.api_device_replay, name='api_device_replay'),
+    path('api/device/readings/', views.api_device_readings, name='api_device_readings'),
 ]
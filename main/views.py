@@ -3,11 +3,42 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Sum
-from .models import UserProfile, GardenZone, WateringSchedule, WateringLog, SensorReading, SystemStatus
-from .forms import UserRegistrationForm, UserProfileForm, GardenZoneForm, WateringScheduleForm, ManualWateringForm
+from django.utils.cache import get_conditional_response, patch_cache_control
+import asyncio
+import hashlib
+import hmac
+import json
+from datetime import timedelta
+from .models import UserProfile, GardenZone, WateringSchedule, WateringLog, SensorReading, SystemStatus, DeviceCommand
+from .events import get_backend, user_channel
+from .export import (
+    LOG_EXPORT_FIELDS, LOG_EXPORT_HEADER, READING_EXPORT_FIELDS, READING_EXPORT_HEADER, export_response,
+)
+from .analytics import usage_report
+from .cache import cached_for_user
+from .db import database_sync_to_async, read_database, use_read_database
+from .device_commands import (
+    acknowledge_command, claim_commands, command_watcher, device_channel, enqueue_command, poll_interval,
+)
+from .devices import device_api, heartbeats
+from .metrics import long_running, registry as metrics_registry
+from .pagination import InvalidCursor, keyset_paginate
+from .purge import delete_zone
+from .rollups import ROLLUP_DEFAULT_MAX_POINTS, query_rollups
+from .stats import get_user_stats
+from .watering import start_zone_watering
+from .forms import (
+    UserRegistrationForm, UserProfileForm, GardenZoneForm, WateringScheduleForm, ManualWateringForm,
+    WateringHistoryFilterForm, ExportFilterForm, ReadingRollupForm, UsageAnalyticsForm, HeartbeatForm,
+    CommandPollForm, CommandAckForm,
+)
+from .ingest import (
+    INGEST_MAX_JSON_BODY_SIZE, IngestError, ingest_readings, iter_json_records, iter_ndjson_records, replay_records,
+)
 
 
 def home(request):
@@ -19,30 +50,13 @@ def home(request):
     
     # Если пользователь авторизован, показываем статус системы
     if request.user.is_authenticated:
-        try:
-            system_status = SystemStatus.objects.get(user=request.user)
-            context['system_status'] = system_status
-        except SystemStatus.DoesNotExist:
-            # Создаем статус системы при первом входе
-            system_status = SystemStatus.objects.create(user=request.user)
-            context['system_status'] = system_status
-        
-        # Статистика для дашборда
-        context['zones_count'] = GardenZone.objects.filter(user=request.user).count()
-        context['active_schedules'] = WateringSchedule.objects.filter(
-            zone__user=request.user, 
-            is_active=True
-        ).count()
-        
-        # Общее количество поливов
-        total_waterings = WateringLog.objects.filter(zone__user=request.user).count()
-        context['total_waterings'] = total_waterings
-        
-        # Общий расход воды
-        total_water = WateringLog.objects.filter(zone__user=request.user).aggregate(
-            total=Sum('water_used')
-        )['total'] or 0
-        context['total_water'] = round(total_water, 2)
+        # Агрегаты хранятся в SystemStatus и обновляются инкрементально
+        system_status = cached_for_user(request.user.id, 'home', lambda: get_user_stats(request.user))
+        context['system_status'] = system_status
+        context['zones_count'] = system_status.zones_count
+        context['active_schedules'] = system_status.active_schedules_count
+        context['total_waterings'] = system_status.waterings_count
+        context['total_water'] = round(system_status.total_water_used, 2)
     
     return render(request, 'main/home.html', context)
 
@@ -121,34 +135,40 @@ def profile(request):
 
 
 @login_required
+@use_read_database
 def dashboard(request):
     """Панель управления поливом"""
-    zones = GardenZone.objects.filter(user=request.user).prefetch_related('schedules')
-    
-    # Статистика
-    today = timezone.now().date()
-    today_waterings = WateringLog.objects.filter(
-        zone__user=request.user,
-        started_at__date=today
-    ).count()
-    
-    recent_logs = WateringLog.objects.filter(
-        zone__user=request.user
-    ).select_related('zone').order_by('-started_at')[:10]
-    
-    # Последние показания датчиков
-    sensor_data = {}
-    for zone in zones:
-        latest_reading = SensorReading.objects.filter(zone=zone).order_by('-timestamp').first()
-        if latest_reading:
-            sensor_data[zone.id] = latest_reading
+    # Границы сегодняшнего дня: сравнение по диапазону идёт по индексу (zone, started_at)
+    today_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    def build():
+        zones = list(
+            GardenZone.objects.filter(user=request.user)
+            .with_latest_reading()
+            .prefetch_related('schedules')
+        )
+        today_waterings = WateringLog.objects.filter(
+            zone__user=request.user,
+            zone__deleted_at__isnull=True,
+            started_at__gte=today_start,
+            started_at__lt=today_start + timedelta(days=1),
+        ).count()
+        recent_logs = list(
+            WateringLog.objects.filter(zone__user=request.user, zone__deleted_at__isnull=True)
+            .select_related('zone').order_by('-started_at')[:10]
+        )
+        return zones, today_waterings, recent_logs
+    
+    # Счётчик «сегодня» зависит от даты, поэтому она входит в ключ
+    zones, today_waterings, recent_logs = cached_for_user(
+        request.user.id, f'dashboard:{today_start.date()}', build
+    )
     
     context = {
         'zones': zones,
-        'zones_count': zones.count(),
+        'zones_count': len(zones),
         'today_waterings': today_waterings,
         'recent_logs': recent_logs,
-        'sensor_data': sensor_data,
     }
     
     return render(request, 'main/dashboard.html', context)
@@ -203,9 +223,9 @@ def zone_delete(request, zone_id):
     zone = get_object_or_404(GardenZone, id=zone_id, user=request.user)
     
     if request.method == 'POST':
-        zone_name = zone.name
-        zone.delete()
-        messages.success(request, f'Зона "{zone_name}" удалена!')
+        # История зоны удаляется в фоне (main.purge)
+        delete_zone(zone)
+        messages.success(request, f'Зона "{zone.name}" удалена!')
         return redirect('dashboard')
     
     return render(request, 'main/zone_confirm_delete.html', {'zone': zone})
@@ -257,17 +277,8 @@ def start_watering(request, zone_id):
         if form.is_valid():
             duration = form.cleaned_data['duration']
             # Создаем запись о поливе
-            log = WateringLog.objects.create(
-                zone=zone,
-                duration=duration,
-                is_manual=True,
-                water_used=duration * 5  # Примерно 5 литров в минуту
-            )
-            
-            # Обновляем общий расход воды
-            system_status, _ = SystemStatus.objects.get_or_create(user=request.user)
-            system_status.total_water_used += log.water_used
-            system_status.save()
+            # Запись о поливе и общий расход воды - в одной транзакции
+            start_zone_watering(zone, duration, is_manual=True)
             
             messages.success(request, f'Полив зоны "{zone.name}" запущен на {duration} минут!')
             return redirect('dashboard')
@@ -280,49 +291,286 @@ def start_watering(request, zone_id):
     })
 
 
+# Размер страницы истории полива
+HISTORY_PAGE_SIZE = 50
+
+# Максимальный размер страницы истории в API
+HISTORY_API_MAX_LIMIT = 500
+
+
+def _history_logs(request, form):
+    """Записи полива пользователя с учётом фильтров формы"""
+    logs = WateringLog.objects.filter(zone__user=request.user, zone__deleted_at__isnull=True).select_related('zone')
+    if form.is_valid():
+        logs = form.filter_logs(logs)
+    return logs
+
+
 @login_required
+@use_read_database
 def watering_history(request):
     """История полива"""
-    logs = WateringLog.objects.filter(
-        zone__user=request.user
-    ).select_related('zone').order_by('-started_at')
+    form = WateringHistoryFilterForm(request.GET, user=request.user)
+    logs = _history_logs(request, form)
     
-    # Фильтрация по зоне
-    zone_filter = request.GET.get('zone')
-    if zone_filter:
-        logs = logs.filter(zone_id=zone_filter)
+    # Курсорная пагинация: стоимость страницы не зависит от её номера
+    try:
+        page = keyset_paginate(logs, 'started_at', request.GET.get('cursor'), HISTORY_PAGE_SIZE)
+    except InvalidCursor:
+        page = keyset_paginate(logs, 'started_at', None, HISTORY_PAGE_SIZE)
     
-    zones = GardenZone.objects.filter(user=request.user)
+    # Параметры фильтра для ссылки на следующую страницу
+    query = request.GET.copy()
+    query.pop('cursor', None)
     
     return render(request, 'main/watering_history.html', {
-        'logs': logs,
-        'zones': zones,
-        'selected_zone': zone_filter
+        'logs': page,
+        'page': page,
+        'form': form,
+        'filter_query': query.urlencode(),
+        'is_first_page': not request.GET.get('cursor'),
+    })
+
+
+@login_required
+@use_read_database
+def api_watering_history(request):
+    """API истории полива с курсорной пагинацией"""
+    form = WateringHistoryFilterForm(request.GET, user=request.user)
+    if not form.is_valid():
+        return JsonResponse({'error': 'Некорректные параметры фильтра', 'fields': form.errors}, status=400)
+    
+    try:
+        limit = min(int(request.GET.get('limit', HISTORY_PAGE_SIZE)), HISTORY_API_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'Некорректный limit'}, status=400)
+    if limit < 1:
+        return JsonResponse({'error': 'Некорректный limit'}, status=400)
+    
+    try:
+        page = keyset_paginate(_history_logs(request, form), 'started_at', request.GET.get('cursor'), limit)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Некорректный курсор'}, status=400)
+    
+    return JsonResponse({
+        'logs': [
+            {
+                'id': log.id,
+                'zone_id': log.zone_id,
+                'zone_name': log.zone.name,
+                'started_at': log.started_at.isoformat(),
+                'duration': log.duration,
+                'water_used': float(log.water_used) if log.water_used is not None else None,
+                'is_manual': log.is_manual,
+            }
+            for log in page
+        ],
+        'next_cursor': page.next_cursor,
     })
 
 
+def _export(request, queryset, field, fields, header, filename):
+    """Общая часть выгрузок: проверка параметров и потоковый ответ"""
+    form = ExportFilterForm(request.GET, user=request.user)
+    if not form.is_valid():
+        return JsonResponse({'error': 'Некорректные параметры выгрузки', 'fields': form.errors}, status=400)
+    
+    # Порядок по первичному ключу не требует сортировки на стороне базы.
+    # Поток читается уже после выхода из представления, поэтому
+    # подключение для чтения задаётся явно.
+    queryset = form.filter_range(queryset, field).order_by('id').using(read_database())
+    return export_response(
+        queryset, fields, header, filename,
+        fmt=form.cleaned_data['format'] or 'csv',
+        compress=form.cleaned_data['gzip'],
+    )
+
+
+@login_required
+def api_export_readings(request):
+    """Выгрузка показаний датчиков (CSV/NDJSON, опционально gzip)"""
+    readings = SensorReading.objects.filter(zone__user=request.user, zone__deleted_at__isnull=True)
+    return _export(request, readings, 'timestamp', READING_EXPORT_FIELDS, READING_EXPORT_HEADER, 'sensor_readings')
+
+
+@login_required
+def api_export_logs(request):
+    """Выгрузка истории полива (CSV/NDJSON, опционально gzip)"""
+    logs = WateringLog.objects.filter(zone__user=request.user, zone__deleted_at__isnull=True)
+    return _export(request, logs, 'started_at', LOG_EXPORT_FIELDS, LOG_EXPORT_HEADER, 'watering_logs')
+
+
+# Поля, из которых собирается статус зоны для API
+ZONE_STATUS_FIELDS = (
+    'id', 'name', 'latest_soil_moisture', 'latest_temperature', 'latest_humidity',
+    'last_watering_at', 'active_schedules_count',
+)
+
+
+def _zone_status_queryset(user):
+    """Зоны пользователя со всеми данными для статуса (один запрос)"""
+    return (
+        GardenZone.objects.filter(user=user)
+        .with_latest_reading()
+        .with_last_watering()
+        .with_active_schedules_count()
+        .values(*ZONE_STATUS_FIELDS)
+    )
+
+
+def _zone_status_data(row):
+    """Преобразовать строку из _zone_status_queryset в ответ API"""
+    return {
+        'zone_id': row['id'],
+        'zone_name': row['name'],
+        'soil_moisture': row['latest_soil_moisture'],
+        'temperature': float(row['latest_temperature']) if row['latest_temperature'] else None,
+        'humidity': row['latest_humidity'],
+        'last_watering': row['last_watering_at'].isoformat() if row['last_watering_at'] else None,
+        'schedules_count': row['active_schedules_count'],
+    }
+
+
 @login_required
+@use_read_database
 def api_zone_status(request, zone_id):
     """API для получения статуса зоны"""
-    zone = get_object_or_404(GardenZone, id=zone_id, user=request.user)
-    
-    # Последнее показание датчика
-    latest_reading = SensorReading.objects.filter(zone=zone).order_by('-timestamp').first()
-    
-    # Последний полив
-    last_watering = WateringLog.objects.filter(zone=zone).order_by('-started_at').first()
+    data = cached_for_user(
+        request.user.id, f'zone_status:{zone_id}',
+        lambda: _zone_status_data(get_object_or_404(_zone_status_queryset(request.user), id=zone_id)),
+    )
+    return JsonResponse(data)
+
+
+@login_required
+@use_read_database
+def api_zone_readings(request, zone_id):
+    """API агрегатов показаний зоны за период.
     
-    data = {
+    Интервал агрегатов (5 минут, час, сутки) выбирается так, чтобы
+    число точек не превышало ``points``, либо задаётся явно.
+    """
+    zone = get_object_or_404(GardenZone, id=zone_id, user=request.user)
+    form = ReadingRollupForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': 'Некорректные параметры запроса', 'fields': form.errors}, status=400)
+    
+    data = form.cleaned_data
+    resolution, points = query_rollups(
+        zone.id, data['start'], data['end'],
+        max_points=data['points'] or ROLLUP_DEFAULT_MAX_POINTS,
+        resolution=data['resolution'],
+    )
+    return JsonResponse({
         'zone_id': zone.id,
-        'zone_name': zone.name,
-        'soil_moisture': latest_reading.soil_moisture if latest_reading else None,
-        'temperature': float(latest_reading.temperature) if latest_reading and latest_reading.temperature else None,
-        'humidity': latest_reading.humidity if latest_reading else None,
-        'last_watering': last_watering.started_at.isoformat() if last_watering else None,
-        'schedules_count': zone.schedules.filter(is_active=True).count(),
-    }
-    
-    return JsonResponse(data)
+        'start': data['start'].isoformat(),
+        'end': data['end'].isoformat(),
+        'resolution': resolution,
+        'points': points,
+    })
+
+
+@login_required
+@use_read_database
+def api_usage_analytics(request):
+    """API расхода воды по дням за период и прогноза по зонам пользователя.
+    
+    Ответ кэшируется для пользователя до следующего изменения его данных
+    или до конца суток.
+    """
+    form = UsageAnalyticsForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': 'Некорректные параметры запроса', 'fields': form.errors}, status=400)
+    
+    data = form.cleaned_data
+    today = timezone.localdate()
+    report = cached_for_user(
+        request.user.id,
+        f"usage:{today.isoformat()}:{data['start'].isoformat()}:{data['end'].isoformat()}:{data['forecast_days']}",
+        lambda: usage_report(request.user.id, data['start'], data['end'], data['forecast_days'], today=today),
+    )
+    return JsonResponse(report)
+
+
+@login_required
+@use_read_database
+def api_zones_status(request):
+    """API для получения статуса всех (или выбранных) зон одним запросом.
+    
+    Поддерживает ETag/If-None-Match: если данные не изменились,
+    возвращается 304 без формирования JSON.
+    """
+    zone_ids = None
+    ids = request.GET.get('ids')
+    if ids:
+        try:
+            zone_ids = sorted({int(zone_id) for zone_id in ids.split(',') if zone_id})
+        except ValueError:
+            return JsonResponse({'error': 'Некорректный список зон'}, status=400)
+    
+    def build():
+        rows = _zone_status_queryset(request.user).order_by('id')
+        if zone_ids is not None:
+            rows = rows.filter(id__in=zone_ids)
+        rows = list(rows)
+        etag = '"%s"' % hashlib.md5(repr(rows).encode()).hexdigest()
+        return etag, [_zone_status_data(row) for row in rows]
+    
+    etag, zones = cached_for_user(
+        request.user.id, f"zones_status:{','.join(map(str, zone_ids)) if zone_ids is not None else '*'}", build
+    )
+    
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({'zones': zones})
+    response['ETag'] = etag
+    # Браузер обязан перепроверять ответ при каждом опросе
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# Интервал отправки комментария-пинга, чтобы прокси не закрывали соединение
+EVENTS_KEEPALIVE_SECONDS = 15
+
+
+async def _event_stream(channel):
+    """Поток Server-Sent Events для канала пользователя"""
+    backend = get_backend()
+    subscription = backend.subscribe(channel)
+    try:
+        # Клиент после (пере)подключения запрашивает актуальный статус
+        yield 'event: ready\ndata: {}\n\n'
+        while True:
+            event = await subscription.get(timeout=EVENTS_KEEPALIVE_SECONDS)
+            if event is None:
+                yield ': keepalive\n\n'
+            else:
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        backend.unsubscribe(subscription)
+
+
+async def api_events(request):
+    """Поток событий зон пользователя (SSE).
+    
+    Асинхронное представление: под ASGI-сервером ожидающие клиенты
+    не занимают потоков. Под WSGI (``runserver``) Django читает
+    асинхронный поток целиком до отправки, а этот поток не кончается:
+    клиент не получил бы ни байта, а поток воркера был бы занят
+    навсегда. Поэтому под WSGI отвечаем 503, и страница переходит на
+    опрос ``/api/zones/status/``.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Поток событий доступен только под ASGI-сервером'}, status=503)
+    
+    response = StreamingHttpResponse(_event_stream(user_channel(user.id)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Отключить буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @login_required
@@ -340,3 +588,205 @@ def api_toggle_schedule(request, schedule_id):
         'is_active': schedule.is_active,
         'message': 'Расписание ' + ('включено' if schedule.is_active else 'выключено')
     })
+
+
+@login_required
+def api_zone_stop(request, zone_id):
+    """API остановки полива зоны: команда контроллерам пользователя"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    zone = get_object_or_404(GardenZone, id=zone_id, user=request.user)
+    queued = enqueue_command(request.user.id, DeviceCommand.KIND_STOP_ZONE, zone.id)
+    
+    return JsonResponse({'zone_id': zone.id, 'commands': queued})
+
+
+@login_required
+def api_readings_bulk(request):
+    """API для пакетной загрузки показаний датчиков (JSON-массив или NDJSON).
+    
+    Доступ по сессии пользователя с CSRF-токеном (браузер, скрипты);
+    контроллеры загружают показания по токену устройства через
+    ``api_device_readings``.
+    """
+    return _readings_bulk(request, request.user.id)
+
+
+@device_api
+def api_device_readings(request):
+    """API пакетной загрузки показаний контроллером (доступ по токену устройства).
+    
+    Тело и ответ - как у ``api_readings_bulk``.
+    """
+    return _readings_bulk(request, request.device_user_id)
+
+
+def _readings_bulk(request, user_id):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    records = _ingest_records(request)
+    if records is None:
+        return JsonResponse({'error': 'Слишком большой запрос, используйте NDJSON'}, status=413)
+    
+    try:
+        created = ingest_readings(user_id, records)
+    except IngestError as exc:
+        return JsonResponse({'error': str(exc), 'line': exc.line}, status=400)
+    
+    return JsonResponse({'created': created}, status=201)
+
+
+def _ingest_records(request):
+    """Записи пакета из тела запроса (JSON-массив или NDJSON) или None, если тело слишком большое"""
+    if request.content_type in ('application/x-ndjson', 'application/jsonlines'):
+        # Построчное чтение тела запроса без загрузки в память целиком
+        return iter_ndjson_records(request)
+    # request.body ограничен DATA_UPLOAD_MAX_MEMORY_SIZE (2.5 МБ),
+    # поэтому читаем тело напрямую со своим лимитом
+    body = request.read(INGEST_MAX_JSON_BODY_SIZE + 1)
+    if len(body) > INGEST_MAX_JSON_BODY_SIZE:
+        return None
+    return iter_json_records(body)
+
+
+@device_api
+def api_device_heartbeat(request):
+    """API сигнала присутствия контроллера (доступ по токену устройства).
+    
+    Тело запроса необязательно: ``{"water_pressure": 2.5}``. Запись в
+    SystemStatus объединяется с другими сигналами (см. main.devices).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Некорректный JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Ожидается JSON-объект'}, status=400)
+    form = HeartbeatForm(data)
+    if not form.is_valid():
+        return JsonResponse({'error': 'Некорректные параметры запроса', 'fields': form.errors}, status=400)
+    
+    heartbeats.add(request.device_user_id, form.cleaned_data['water_pressure'])
+    return HttpResponse(status=204)
+
+
+@device_api
+def api_device_replay(request):
+    """API выгрузки накопленной контроллером истории (доступ по токену устройства).
+    
+    Тело - JSON-массив или NDJSON записей ``{"type": "reading"|"watering",
+    "key": ..., "zone_id": ..., "timestamp"|"started_at": ..., ...}``.
+    Уже сохранённые записи с тем же ключом пропускаются, так что пакет
+    можно безопасно отправить повторно (см. main.ingest).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    records = _ingest_records(request)
+    if records is None:
+        return JsonResponse({'error': 'Слишком большой запрос, используйте NDJSON'}, status=413)
+    
+    try:
+        counts = replay_records(request.device_user_id, records)
+    except IngestError as exc:
+        return JsonResponse({'error': str(exc), 'line': exc.line}, status=400)
+    
+    return JsonResponse(counts)
+
+
+def _json_object(request):
+    """Тело запроса как JSON-объект (пустое тело - пустой объект) или None"""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+@device_api
+@long_running
+async def api_device_commands(request):
+    """Долгий опрос команд контроллером (доступ по токену устройства).
+    
+    ``?wait=<секунды>``: без команд запрос ждёт до ``wait`` секунд и
+    отвечает сразу, как только команда поставлена в очередь. Асинхронное
+    представление, запросы к базе - через общий пул потоков
+    (``database_sync_to_async``): ожидающие контроллеры не держат
+    подключений к базе. Ответ ``{"commands": [...]}``, пустой список -
+    за время ожидания команд не было.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    form = CommandPollForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': 'Некорректные параметры запроса', 'fields': form.errors}, status=400)
+    
+    device_id = request.device_token_id
+    backend = get_backend()
+    # Подписка раньше первой выборки: команда, поставленная между ними, не потеряется
+    subscription = backend.subscribe(device_channel(device_id))
+    try:
+        commands = await database_sync_to_async(claim_commands)(device_id)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + form.cleaned_data['wait']
+        while not commands:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            event = await subscription.get(timeout=min(remaining, poll_interval()))
+            if event is None:
+                # Команды других процессов: один запрос на процесс за период
+                if command_watcher.due():
+                    await database_sync_to_async(command_watcher.check)()
+                continue
+            commands = await database_sync_to_async(claim_commands)(device_id)
+    finally:
+        backend.unsubscribe(subscription)
+    
+    return JsonResponse({'commands': commands})
+
+
+@device_api
+def api_device_command_ack(request, command_id):
+    """API подтверждения команды контроллером: ``{"status": "done"}``
+    или ``{"status": "failed", "error": "..."}``"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    data = _json_object(request)
+    if data is None:
+        return JsonResponse({'error': 'Ожидается JSON-объект'}, status=400)
+    form = CommandAckForm(data)
+    if not form.is_valid():
+        return JsonResponse({'error': 'Некорректные параметры запроса', 'fields': form.errors}, status=400)
+    
+    status = acknowledge_command(
+        request.device_token_id,
+        command_id,
+        ok=form.cleaned_data['status'] == DeviceCommand.STATUS_DONE,
+        error=form.cleaned_data['error'],
+    )
+    if status is None:
+        return JsonResponse({'error': 'Команда не найдена'}, status=404)
+    
+    return JsonResponse({'id': command_id, 'status': status})
+
+
+def metrics(request):
+    """Метрики запросов в текстовом формате Prometheus (см. main.metrics).
+    
+    Доступ - сотрудникам или по ``Authorization: Bearer <GARDEN_METRICS_TOKEN>``.
+    """
+    token = getattr(settings, 'GARDEN_METRICS_TOKEN', None)
+    scheme, _, supplied = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    authorized = bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(supplied.strip().encode(), token.encode())
+    if not (authorized or request.user.is_staff):
+        return HttpResponse(status=403)
+    
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,99 @@
+"""Запись поливов с учётом расхода воды в агрегатах пользователя.
+
+Одиночный полив (ручной запуск) пишется в одной транзакции с
+атомарным ``F()``-обновлением счётчиков ``SystemStatus`` (через сигнал
+``post_save``, см. ``main.signals``). Пакетный путь вставляет много
+записей через ``bulk_create`` и применяет к счётчикам одну дельту на
+пользователя, так что параллельные запуски не теряют обновлений и не
+перезаписывают строку статуса целиком.
+
+Расход воды считается по площади зоны и расходу на квадратный метр
+(``GARDEN_FLOW_RATE_PER_M2``), для зон без площади - по расходу на зону
+(``GARDEN_FLOW_RATE_LITERS_PER_MINUTE``).
+
+Каждый полив ставит контроллерам пользователя команду ``start_zone``
+(main.device_commands).
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import invalidate_user
+from .device_commands import enqueue_command, enqueue_commands
+from .events import publish_on_commit, watering_event
+from .models import DeviceCommand, WateringLog
+from .stats import add_daily_usage, add_waterings
+
+
+# Примерный расход воды на зону без указанной площади, литров в минуту
+FLOW_RATE_LITERS_PER_MINUTE = 5
+
+# Расход воды на квадратный метр зоны, литров в минуту
+FLOW_RATE_PER_M2 = 0.5
+
+
+def flow_rates():
+    """Действующие (расход на зону, расход на м²) с учётом настроек"""
+    return (
+        getattr(settings, 'GARDEN_FLOW_RATE_LITERS_PER_MINUTE', FLOW_RATE_LITERS_PER_MINUTE),
+        getattr(settings, 'GARDEN_FLOW_RATE_PER_M2', FLOW_RATE_PER_M2),
+    )
+
+
+def liters(value):
+    """Расход в литрах с точностью поля ``WateringLog.water_used``"""
+    return Decimal(f'{value:.2f}')
+
+
+def water_used_for(duration, area_size=None):
+    """Расход воды (л) за полив длительностью ``duration`` минут"""
+    per_zone, per_m2 = flow_rates()
+    rate = float(per_zone) if area_size is None else float(area_size) * float(per_m2)
+    return liters(duration * rate)
+
+
+def start_command(log):
+    """Команда контроллеру на полив по записи ``log``: (вид, id зоны, параметры)"""
+    return DeviceCommand.KIND_START_ZONE, log.zone_id, {'duration': log.duration, 'log_id': log.id}
+
+
+def start_zone_watering(zone, duration, is_manual=True):
+    """Записать полив зоны и поставить команду контроллерам.
+
+    Счётчики пользователя и команда - в той же транзакции, что и запись.
+    """
+    with transaction.atomic():
+        log = WateringLog.objects.create(
+            zone=zone,
+            duration=duration,
+            is_manual=is_manual,
+            water_used=water_used_for(duration, zone.area_size),
+        )
+        enqueue_command(zone.user_id, *start_command(log))
+    return log
+
+
+def create_watering_logs(logs_by_user, batch_size=1000):
+    """Пакетно записать поливы.
+
+    ``logs_by_user`` - словарь {user_id: [несохранённые WateringLog]}.
+    Все записи вставляются в одной транзакции, счётчики каждого
+    пользователя меняются одним UPDATE, команды контроллерам ставятся
+    одной вставкой. Возвращает число записей.
+    """
+    logs = [log for user_logs in logs_by_user.values() for log in user_logs]
+    if not logs:
+        return 0
+    with transaction.atomic():
+        WateringLog.objects.bulk_create(logs, batch_size=batch_size)
+        add_daily_usage(logs)
+        for user_id, user_logs in logs_by_user.items():
+            # bulk_create не отправляет сигналы: дельта применяется явно
+            add_waterings(user_id, len(user_logs), sum(log.water_used or 0 for log in user_logs))
+            invalidate_user(user_id)
+            publish_on_commit(user_id, (watering_event(log) for log in user_logs))
+        enqueue_commands({
+            user_id: [start_command(log) for log in user_logs] for user_id, user_logs in logs_by_user.items()
+        })
+    return len(logs)
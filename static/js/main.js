@@ -120,29 +120,97 @@ function showNotification(message, type = 'info') {
     }, 5000);
 }
 
-// Функция для обновления статуса зоны
-function updateZoneStatus(zoneId) {
-    fetch(`/api/zone/${zoneId}/status/`)
+// Обновить значение показания в бейдже и скрыть бейдж, если значения нет
+function setReadingBadge(element, value) {
+    if (!element) {
+        return;
+    }
+    const hasValue = value !== null && value !== undefined;
+    element.classList.toggle('d-none', !hasValue);
+    if (hasValue) {
+        element.querySelector('.value').textContent = value;
+    }
+}
+
+// Обновить показания зоны на странице
+function applyZoneStatus(zone) {
+    const zoneId = zone.zone_id;
+    setReadingBadge(document.querySelector(`#moisture-${zoneId}`), zone.soil_moisture);
+    setReadingBadge(document.querySelector(`#temp-${zoneId}`), zone.temperature);
+    setReadingBadge(document.querySelector(`#humidity-${zoneId}`), zone.humidity);
+
+    const readings = document.querySelector(`#readings-${zoneId}`);
+    if (readings) {
+        const hasReading = zone.soil_moisture !== null || zone.temperature !== null || zone.humidity !== null;
+        readings.classList.toggle('d-none', !hasReading);
+    }
+}
+
+// Функция для обновления статуса зон на странице.
+// Все зоны запрашиваются одним запросом; браузер сам отправляет
+// If-None-Match и получает 304, если данные не изменились.
+function updateZonesStatus() {
+    const zoneIds = Array.from(document.querySelectorAll('[data-zone-id]'))
+        .map(el => el.dataset.zoneId);
+    if (zoneIds.length === 0) {
+        return;
+    }
+
+    fetch(`/api/zones/status/?ids=${zoneIds.join(',')}`)
         .then(response => response.json())
-        .then(data => {
-            // Обновляем показания датчиков на странице
-            const moistureElement = document.querySelector(`#moisture-${zoneId}`);
-            const tempElement = document.querySelector(`#temp-${zoneId}`);
-            const humidityElement = document.querySelector(`#humidity-${zoneId}`);
-
-            if (moistureElement && data.soil_moisture !== null) {
-                moistureElement.textContent = `${data.soil_moisture}%`;
-            }
-            if (tempElement && data.temperature !== null) {
-                tempElement.textContent = `${data.temperature}°C`;
-            }
-            if (humidityElement && data.humidity !== null) {
-                humidityElement.textContent = `${data.humidity}%`;
-            }
-        })
+        .then(data => data.zones.forEach(applyZoneStatus))
         .catch(error => console.error('Error updating zone status:', error));
 }
 
+// Подписка на события зон через Server-Sent Events.
+// После каждого (пере)подключения статус загружается один раз,
+// дальше страница обновляется только по событиям сервера.
+// Опрос статуса зон, пока поток событий недоступен
+const ZONES_POLL_INTERVAL = 30000;
+// Сколько ждать события ready после подключения к потоку, мс
+const EVENTS_READY_TIMEOUT = 5000;
+let zonesPollTimer = null;
+
+function startZonesPolling() {
+    if (zonesPollTimer === null) {
+        updateZonesStatus();
+        zonesPollTimer = setInterval(updateZonesStatus, ZONES_POLL_INTERVAL);
+    }
+}
+
+function stopZonesPolling() {
+    if (zonesPollTimer !== null) {
+        clearInterval(zonesPollTimer);
+        zonesPollTimer = null;
+    }
+}
+
+function subscribeZoneEvents() {
+    if (!window.EventSource) {
+        startZonesPolling();
+        return;
+    }
+
+    const source = new EventSource('/api/events/');
+    // Сервер без ASGI отвечает ошибкой или не присылает ready
+    const readyTimer = setTimeout(() => {
+        source.close();
+        startZonesPolling();
+    }, EVENTS_READY_TIMEOUT);
+    source.addEventListener('ready', () => {
+        clearTimeout(readyTimer);
+        stopZonesPolling();
+        updateZonesStatus();
+    });
+    source.addEventListener('reading', event => applyZoneStatus(JSON.parse(event.data)));
+    // EventSource сам переподключается (и снова присылает ready), а на
+    // ответ с ошибкой закрывается; пока потока нет - опрос
+    source.addEventListener('error', () => {
+        clearTimeout(readyTimer);
+        startZonesPolling();
+    });
+}
+
 // Функция для запуска полива
 function startWatering(zoneId, duration) {
     fetch(`/zone/${zoneId}/water/`, {